@@ -7,23 +7,29 @@ from typing import Optional
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from sse_starlette.sse import EventSourceResponse
 
+from kits.kit_common import counters, timing
 from kits.kit_common.config import settings
 from kits.kit_common.errors import http_error_response, APIError
 from kits.kit_common.paths import (
     ensure_job_dirs,
     job_paths,
     read_json,
-    write_json,
+    write_json_atomic,
     within_data_dir,
 )
 from kits.utils.audio import (
     is_supported_ext,
-    normalize_audio,
-    probe_duration_sec,
+    StreamingNormalizer,
 )
+from kits.utils.audio_info import probe_audio_info, sniff_audio
+from kits.kit_export import word_store
 from kits.kit_pipeline.pipeline import run_pipeline
+from kits.kit_pipeline.status import StatusWriter
+from kits.kit_llm import limiter as llm_limiter
+from kits.kit_llm import response_cache as llm_response_cache
 
 try:
     import torch  # type: ignore
@@ -81,6 +87,15 @@ async def health():
     }
 
 
+async def _save_upload(file: UploadFile, dst: Path):
+    with open(dst, "wb") as f:
+        while True:
+            chunk = await file.read(settings.UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            await run_in_threadpool(f.write, chunk)
+
+
 @app.post("/transcribe")
 async def transcribe(
     request: Request,
@@ -108,29 +123,6 @@ async def transcribe(
     paths = ensure_job_dirs(job_id)
     input_path = paths["in_dir"] / f"input.{ext}"
     
-    logger.info(f"Сохранение файла: {input_path}")
-    with open(input_path, "wb") as f:
-        f.write(await file.read())
-
-    # Normalize audio
-    work_wav = paths["work_dir"] / "normalized.wav"
-    logger.info(f"Нормализация аудио: {work_wav}")
-    
-    try:
-        normalize_audio(input_path, work_wav)
-        duration = probe_duration_sec(work_wav)
-        logger.info(f"Длительность аудио: {duration:.1f} секунд")
-    except Exception as e:
-        logger.error(f"Ошибка при обработке аудио: {str(e)}", exc_info=True)
-        raise APIError(500, "audio_processing_error", f"Ошибка обработки аудио: {str(e)}")
-    
-    if duration > settings.MAX_AUDIO_MIN * 60:
-        raise APIError(413, "duration_limit", f"Audio too long: {duration:.1f}s")
-
-    # Persist initial status
-    status_path = paths["work_dir"] / "status.json"
-    write_json(status_path, {"job_id": job_id, "status": "queued", "progress": 0})
-
     # Effective overrides
     effective_fast = settings.FAST_MODE if fast_mode is None else bool(fast_mode)
     effective_lang = settings.ASR_LANGUAGE if not language else language
@@ -141,8 +133,28 @@ async def transcribe(
         "fast_mode": effective_fast,
         "language": effective_lang,
     }
+    status_path = paths["work_dir"] / "status.json"
 
     if settings.PROCESS_MODE == "async":
+        # Only save the upload and sniff its header here: normalization and
+        # probing are the worker's first stage, so latency does not depend on audio length
+        logger.info(f"Сохранение файла: {input_path}")
+        try:
+            await _save_upload(file, input_path)
+            sniff = await run_in_threadpool(sniff_audio, input_path)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении файла: {str(e)}", exc_info=True)
+            raise APIError(500, "audio_processing_error", f"Ошибка обработки аудио: {str(e)}")
+        logger.info(f"Сигнатура: {sniff['container']}, оценка длительности: {sniff['duration_estimate_sec']}")
+        # Отклоняем только то, что точно не аудио; нераспознанную сигнатуру ("unknown")
+        # ставим в очередь — декодирует ffmpeg, длительность проверит воркер
+        if sniff["not_audio"]:
+            raise APIError(415, "unsupported_media_type", f"File is not audio: {sniff['not_audio']}")
+        estimate = sniff["duration_estimate_sec"]
+        if estimate and estimate > settings.MAX_AUDIO_MIN * 60:
+            raise APIError(413, "duration_limit", f"Audio too long: ~{estimate:.1f}s")
+
+        write_json_atomic(status_path, {"job_id": job_id, "status": "queued", "progress": 0})
         # Enqueue RQ job
         try:
             from rq import Queue
@@ -156,13 +168,46 @@ async def transcribe(
             raise APIError(500, "queue_error", f"Failed to enqueue: {e}")
         return {"job_id": job_id, "status": "queued"}
     else:
+        # Starlette has already spooled the whole upload by the time the handler runs,
+        # so this does not overlap with the network transfer. It reads the spool in
+        # fixed-size chunks (bounded memory) and copies each chunk to input_path and
+        # into ffmpeg in the same pass, so decoding runs alongside the copy instead of
+        # after it. Blocking file/ffmpeg I/O runs in the threadpool, not on the event loop
+        work_wav = paths["work_dir"] / "normalized.wav"
+        logger.info(f"Сохранение файла и нормализация аудио: {input_path} -> {work_wav}")
+        
         try:
-            run_pipeline(payload)
-            write_json(status_path, {"job_id": job_id, "status": "done", "progress": 100})
+            normalizer = await run_in_threadpool(StreamingNormalizer, input_path, work_wav, ext)
+            try:
+                while True:
+                    chunk = await file.read(settings.UPLOAD_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    await run_in_threadpool(normalizer.write, chunk)
+            except Exception:
+                await run_in_threadpool(normalizer.abort)
+                raise
+            await run_in_threadpool(normalizer.finish)
+            audio_info = await run_in_threadpool(probe_audio_info, work_wav)
+            duration = audio_info["duration_sec"]
+            logger.info(f"Длительность аудио: {duration:.1f} секунд")
+        except Exception as e:
+            logger.error(f"Ошибка при обработке аудио: {str(e)}", exc_info=True)
+            raise APIError(500, "audio_processing_error", f"Ошибка обработки аудио: {str(e)}")
+        
+        if duration > settings.MAX_AUDIO_MIN * 60:
+            raise APIError(413, "duration_limit", f"Audio too long: {duration:.1f}s")
+
+        payload["audio_info"] = audio_info
+        writer = StatusWriter(status_path, job_id)
+        writer.set_state("queued", progress=0)
+        try:
+            await run_in_threadpool(run_pipeline, payload, writer)
+            writer.set_state("done", progress=100)
         except APIError:
             raise
         except Exception as e:
-            write_json(status_path, {"job_id": job_id, "status": "error", "error": str(e)})
+            writer.set_state("error", error=str(e))
             raise APIError(500, "processing_error", str(e))
         return {"job_id": job_id, "status": "done"}
 
@@ -177,14 +222,16 @@ async def status(job_id: str):
 
 
 @app.get("/result/{job_id}")
-async def result(job_id: str):
+async def result(job_id: str, words: bool = False):
     paths = job_paths(job_id)
     out_dir = paths["out_dir"]
     transcript_p = out_dir / "transcript.json"
     summary_p = out_dir / "summary.json"
     if not transcript_p.exists() or not summary_p.exists():
         raise APIError(404, "not_found", "Result not available")
-    t = read_json(transcript_p)
+    # По умолчанию без пословных таймкодов: сборка словарей всех слов дороже разбора
+    # прежнего JSON. Слова — ?words=true, по интервалу времени — /words/{job_id}
+    t = await run_in_threadpool(word_store.load_transcript, out_dir, read_json(transcript_p), words)
     s = read_json(summary_p)
     return {
         "job_id": t.get("job_id", job_id),
@@ -198,23 +245,28 @@ async def result(job_id: str):
 
 
 @app.post("/summary/stream")
-async def summary_stream(body: dict):
+async def summary_stream(body: dict, request: Request):
     job_id = body.get("job_id")
     if not job_id:
         raise APIError(400, "validation_error", "job_id required")
+    regenerate = bool(body.get("regenerate"))
     paths = job_paths(job_id)
     out_dir = paths["out_dir"]
     transcript_p = out_dir / "transcript.json"
     summary_p = out_dir / "summary.json"
+    tldr_p = out_dir / "tldr_stream.txt"
     if not transcript_p.exists() or not summary_p.exists():
         raise APIError(404, "not_found", "Result not available")
 
     transcript = read_json(transcript_p)
     base_summary = read_json(summary_p)
+    stored = None
+    if not regenerate and tldr_p.exists():
+        stored = tldr_p.read_text(encoding="utf-8")
 
-    from kits.kit_llm.openai_backend import stream_tldr
+    from kits.kit_llm.openai_backend import astream_tldr, split_cached_text
 
-    def event_gen():
+    async def event_gen():
         # 1) context
         context = {
             "language": transcript.get("language"),
@@ -228,11 +280,80 @@ async def summary_stream(body: dict):
             "event": "context",
             "data": context,
         }
-        # 2) token stream
-        for token in stream_tldr(transcript):
-            yield {"event": "token", "data": {"t": token}}
+        # 2) token stream: сохранённый TL;DR отдаём сразу, без запроса к LLM
+        if stored is not None:
+            for token in split_cached_text(stored):
+                yield {"event": "token", "data": {"t": token}}
+            yield {"event": "done", "data": {"finish_reason": "stop", "cached": True}}
+            return
+
+        parts = []
+        tokens = astream_tldr(transcript, use_cache=not regenerate)
+        try:
+            async for token in tokens:
+                if await request.is_disconnected():
+                    # Клиент ушёл — прекращаем генерацию, неполный TL;DR не сохраняем
+                    logger.info(f"SSE {job_id}: клиент отключился, генерация остановлена")
+                    return
+                parts.append(token)
+                yield {"event": "token", "data": {"t": token}}
+        finally:
+            await tokens.aclose()
+        # Свой временный файл у каждого запроса: параллельные regenerate не пишут в один .part
+        tmp = tldr_p.with_name(f"{tldr_p.name}.{uuid.uuid4().hex}.part")
+        tmp.write_text("".join(parts), encoding="utf-8")
+        os.replace(tmp, tldr_p)
         # 3) done
-        yield {"event": "done", "data": {"finish_reason": "stop"}}
+        yield {"event": "done", "data": {"finish_reason": "stop", "cached": False}}
+
+    return EventSourceResponse(event_gen())
+
+
+@app.post("/summary/stream/structured")
+async def summary_stream_structured(body: dict, request: Request):
+    """Структурированная сводка по SSE: пункты действий, решения и риски по мере генерации.
+    Работает сразу после ASR (нужен только transcript.json); готовый summary.json
+    отдаётся без обращения к LLM, если не передан regenerate.
+    """
+    job_id = body.get("job_id")
+    if not job_id:
+        raise APIError(400, "validation_error", "job_id required")
+    out_dir = job_paths(job_id)["out_dir"]
+    transcript_p = out_dir / "transcript.json"
+    summary_p = out_dir / "summary.json"
+    if not transcript_p.exists():
+        raise APIError(404, "not_found", "Transcript not available")
+    transcript = read_json(transcript_p)
+    ready = None
+    if not body.get("regenerate") and summary_p.exists():
+        ready = read_json(summary_p)
+
+    from kits.kit_llm.openai_backend import astream_summary
+
+    async def event_gen():
+        if ready is not None:
+            if ready.get("tldr"):
+                yield {"event": "tldr", "data": {"text": ready["tldr"]}}
+            for it in ready.get("action_items") or []:
+                yield {"event": "action_item", "data": it}
+            for d in ready.get("decisions") or []:
+                yield {"event": "decision", "data": {"text": d}}
+            for r in ready.get("risks") or []:
+                yield {"event": "risk", "data": {"text": r}}
+            yield {"event": "summary", "data": ready}
+            yield {"event": "done", "data": {"finish_reason": "stop", "cached": True}}
+            return
+
+        events = astream_summary(transcript)
+        try:
+            async for kind, data in events:
+                if await request.is_disconnected():
+                    logger.info(f"SSE {job_id}: клиент отключился, генерация сводки остановлена")
+                    return
+                yield {"event": kind, "data": data if isinstance(data, dict) else {"text": data}}
+        finally:
+            await events.aclose()
+        yield {"event": "done", "data": {"finish_reason": "stop", "cached": False}}
 
     return EventSourceResponse(event_gen())
 
@@ -255,12 +376,27 @@ async def export_json(job_id: str):
     if not transcript.exists() or not summary.exists():
         raise APIError(404, "not_found", "Files not found")
     merged = {
-        "transcript": read_json(transcript),
+        "transcript": await run_in_threadpool(word_store.load_transcript, out, read_json(transcript)),
         "summary": read_json(summary),
     }
     return JSONResponse(merged)
 
 
+@app.get("/words/{job_id}")
+async def words(job_id: str, start: float = 0.0, end: Optional[float] = None):
+    """Слова с таймкодами в интервале [start, end) из колоночного хранилища"""
+    paths = job_paths(job_id)
+    store = word_store.open_store(paths["out_dir"])
+    if store is None:
+        raise APIError(404, "not_found", "Word timings not available")
+    if end is None:
+        end = float("inf")
+    if end < start:
+        raise APIError(400, "validation_error", "end must be >= start")
+    items = await run_in_threadpool(store.range, start, end)
+    return {"job_id": job_id, "start": start, "end": None if end == float("inf") else end, "words": items}
+
+
 @app.get("/export/{job_id}.srt")
 async def export_srt(job_id: str):
     paths = job_paths(job_id)
@@ -300,6 +436,7 @@ async def metrics():
     data_dir = Path(settings.DATA_DIR) / "uploads"
     total = failed = 0
     durations = []
+    processing = []
     avg_conf_tokens = []
     speech_rates = []
     if data_dir.exists():
@@ -310,11 +447,16 @@ async def metrics():
                 st = read_json(status_path)
                 if st.get("status") == "error":
                     failed += 1
+            timings_path = job / "work" / "timings.json"
+            if timings_path.exists():
+                tm = read_json(timings_path)
+                if tm.get("status") == "done" and tm.get("total_sec") is not None:
+                    processing.append(tm["total_sec"])
             t_json = job / "out" / "transcript.json"
             if t_json.exists():
                 t = read_json(t_json)
                 if t.get("duration_sec"):
-                    durations.append(t["duration_sec"])  # not exactly processing time, placeholder
+                    durations.append(t["duration_sec"])
                 m = t.get("metrics", {})
                 if m.get("speech_rate_wpm"):
                     speech_rates.append(m["speech_rate_wpm"])
@@ -328,8 +470,16 @@ async def metrics():
     return {
         "jobs_total": total,
         "jobs_failed": failed,
-        "avg_processing_sec": _avg(durations),
+        "avg_processing_sec": _avg(processing),
+        "avg_audio_sec": _avg(durations),
         "avg_conf_tokens": _avg(avg_conf_tokens),
         "avg_speech_rate_wpm": _avg(speech_rates),
+        "llm_cache": await run_in_threadpool(llm_response_cache.stats),
+        "llm_queue": await run_in_threadpool(llm_limiter.stats),
+        "latency": await run_in_threadpool(timing.histograms),
+        "llm_json": {
+            name[len("llm_json_"):]: value
+            for name, value in (await run_in_threadpool(counters.snapshot, "llm_json_")).items()
+        },
     }
 
@@ -1,29 +1,38 @@
+import logging
+import time
+
 from kits.kit_common.config import settings
-from kits.kit_common.paths import write_json
 from kits.kit_pipeline.pipeline import run_pipeline
+from kits.kit_pipeline.status import StatusWriter
+
+logger = logging.getLogger(__name__)
 
 
 def worker_entry(payload: dict):
     job_id = payload.get("job_id")
     from kits.kit_common.paths import job_paths
     
+    t0 = time.perf_counter()
+    # Все записи status.json — через один StatusWriter: атомарно и под одним замком
+    # с прогрессом стадий, поэтому поздний отчёт прогресса не перепишет done/error
+    writer = StatusWriter(job_paths(job_id)["work_dir"] / "status.json", job_id)
     try:
         # Обновляем статус на "processing"
-        paths = job_paths(job_id)
-        write_json(paths["work_dir"] / "status.json", {"job_id": job_id, "status": "processing", "progress": 10})
+        writer.set_state("processing", progress=0)
         
-        # Запускаем pipeline
-        result = run_pipeline(payload)
+        # Запускаем pipeline; стадии сами пишут прогресс и ETA в status.json
+        result = run_pipeline(payload, on_progress=writer)
         
         # Обновляем статус на "done"
-        write_json(paths["work_dir"] / "status.json", {"job_id": job_id, "status": "done", "progress": 100})
+        writer.set_state("done", progress=100)
+        logger.info(f"Задача {job_id} выполнена за {time.perf_counter() - t0:.1f} с")
         
         return {"job_id": job_id, "status": "done", "result": result}
     except Exception as e:
+        logger.error(f"Задача {job_id} завершилась ошибкой через {time.perf_counter() - t0:.1f} с: {e}")
         # Best-effort update of status file
         try:
-            paths = job_paths(job_id)
-            write_json(paths["work_dir"] / "status.json", {"job_id": job_id, "status": "error", "error": str(e)})
+            writer.set_state("error", error=str(e))
         except Exception:
             pass
         raise
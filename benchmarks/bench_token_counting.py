@@ -0,0 +1,83 @@
+"""
+Token counting benchmark: per-line loop (as chunk_by_token_budget used to work)
+vs batched and memoized counting from token_utils.
+
+    python benchmarks/bench_token_counting.py [--lines 100000] [--budget 5000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from kits.kit_llm import token_utils  # noqa: E402
+from kits.kit_llm.chunking import chunk_by_token_budget  # noqa: E402
+
+WORDS = (
+    "нужно проверить бюджет проекта до пятницы и согласовать сроки с заказчиком "
+    "релиз задержится если не успеем исправить ошибки в модуле оплаты давайте обсудим риски"
+).split()
+SHORT = ["Да.", "Хорошо.", "Согласен.", "Понятно.", "Нет.", "Угу."]
+
+
+def synthetic_lines(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    speakers = [f"Speaker {i}" for i in range(1, 7)]
+    lines = []
+    for _ in range(n):
+        sp = rnd.choice(speakers)
+        if rnd.random() < 0.3:
+            text = rnd.choice(SHORT)
+        else:
+            text = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(4, 30))).capitalize() + "."
+        lines.append(f"{sp}: {text}")
+    return lines
+
+
+def per_line_chunking(lines, budget):
+    enc = token_utils._load_tiktoken()
+    chunks, cur, cur_tokens = [], [], 0
+    for ln in lines:
+        n = len(enc.encode(ln)) if enc is not None else token_utils._heuristic(ln)
+        if cur and cur_tokens + n + 1 > budget:
+            chunks.append("\n".join(cur))
+            cur, cur_tokens = [], 0
+        cur.append(ln)
+        cur_tokens += n + 1
+    if cur:
+        chunks.append("\n".join(cur))
+    return chunks
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=100_000)
+    ap.add_argument("--budget", type=int, default=5000)
+    args = ap.parse_args()
+
+    lines = synthetic_lines(args.lines)
+    backend = "tiktoken" if token_utils._load_tiktoken() is not None else "heuristic (tiktoken unavailable)"
+    print(f"{len(lines)} lines, budget {args.budget} tokens, counter: {backend}")
+
+    old, t_old = timed(per_line_chunking, lines, args.budget)
+    token_utils._MEMO.clear()
+    new, t_cold = timed(chunk_by_token_budget, lines, args.budget)
+    _, t_warm = timed(chunk_by_token_budget, lines, args.budget)
+    assert old == new, "chunk boundaries differ"
+
+    print(f"per-line loop:        {t_old:8.3f} s")
+    print(f"batched (cold memo):  {t_cold:8.3f} s  x{t_old / t_cold:.1f}")
+    print(f"batched (warm memo):  {t_warm:8.3f} s  x{t_old / t_warm:.1f}")
+    print(f"chunks: {len(new)}, memo entries: {len(token_utils._MEMO)}")
+
+
+if __name__ == "__main__":
+    main()
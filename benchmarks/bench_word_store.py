@@ -0,0 +1,104 @@
+"""
+Word timings benchmark: words inline in transcript.json (and again in minutes.json)
+vs the columnar word store (out/words).
+
+    python benchmarks/bench_word_store.py [--minutes 90] [--wpm 150]
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from kits.kit_export import word_store  # noqa: E402
+
+WORDS = (
+    "нужно проверить бюджет проекта до пятницы и согласовать сроки с заказчиком "
+    "релиз задержится если не успеем исправить ошибки в модуле оплаты давайте обсудим риски"
+).split()
+
+
+def synthetic_transcript(minutes: int, wpm: int, seed: int = 0):
+    rnd = random.Random(seed)
+    speakers = [f"Участник {i}" for i in range(1, 7)]
+    segments = []
+    t = 0.0
+    n_words = minutes * wpm
+    while n_words > 0:
+        sp = rnd.choice(speakers)
+        k = min(n_words, rnd.randint(5, 60))
+        words = []
+        for _ in range(k):
+            d = rnd.uniform(0.15, 0.6)
+            words.append({"word": rnd.choice(WORDS), "start": round(t, 3), "end": round(t + d, 3),
+                          "score": round(rnd.random(), 3), "speaker": sp})
+            t += d + rnd.uniform(0.0, 0.2)
+        segments.append({"start": words[0]["start"], "end": words[-1]["end"], "speaker": sp,
+                         "text": " ".join(w["word"] for w in words), "words": words})
+        n_words -= k
+        t += rnd.uniform(0.3, 2.0)
+    return {"job_id": "bench", "segments": segments}
+
+
+def dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--minutes", type=int, default=90)
+    ap.add_argument("--wpm", type=int, default=150)
+    args = ap.parse_args()
+
+    transcript = synthetic_transcript(args.minutes, args.wpm)
+    n = sum(len(s["words"]) for s in transcript["segments"])
+    with tempfile.TemporaryDirectory() as d:
+        out = Path(d)
+        inline = out / "inline"
+        inline.mkdir()
+        # Как раньше: слова в transcript.json и ещё раз в minutes.json
+        (inline / "transcript.json").write_text(json.dumps(transcript, ensure_ascii=False, indent=2), encoding="utf-8")
+        (inline / "minutes.json").write_text(json.dumps({"transcript": transcript}, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        col = out / "columnar"
+        col.mkdir()
+        compact = word_store.save_transcript(col, transcript)
+        (col / "transcript.json").write_text(json.dumps(compact, ensure_ascii=False, indent=2), encoding="utf-8")
+        (col / "minutes.json").write_text(json.dumps({"transcript": compact}, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        def load_inline():
+            json.loads((inline / "transcript.json").read_text(encoding="utf-8"))
+
+        def load_compact():
+            json.loads((col / "transcript.json").read_text(encoding="utf-8"))
+
+        def load_words():
+            word_store.open_store(col).words()
+
+        def load_range():
+            word_store.open_store(col).range(1800.0, 1860.0)
+
+        print(f"words: {n}")
+        print(f"artifacts, inline JSON:     {dir_size(inline) / 1e6:8.2f} MB")
+        print(f"artifacts, columnar store:  {dir_size(col) / 1e6:8.2f} MB")
+        print(f"load transcript.json, inline:        {best_of(load_inline) * 1000:8.1f} ms")
+        print(f"load transcript.json, without words: {best_of(load_compact) * 1000:8.1f} ms")
+        print(f"materialize all words from store:    {best_of(load_words) * 1000:8.1f} ms")
+        print(f"one minute of words from store:      {best_of(load_range) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
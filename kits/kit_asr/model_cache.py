@@ -0,0 +1,147 @@
+"""
+Процессный кэш моделей WhisperX (ASR, выравнивание, диаризация).
+
+Загрузка моделей занимает от секунд до минут, поэтому модели держим в памяти
+между задачами. Кэш ограничен по количеству (LRU), ключ — (вид, модель,
+compute_type, устройство, язык).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from kits.kit_common.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ModelCache:
+    def __init__(self, max_size: int):
+        self.max_size = max(1, int(max_size))
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time_sec = 0.0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Загружаем вне общего замка, но не даём двум потокам грузить одну модель
+        with key_lock:
+            with self._lock:
+                if key in self._items:
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return self._items[key]
+            t0 = time.perf_counter()
+            try:
+                value = loader()
+            except BaseException:
+                # Неудачная загрузка не оставляет замок ключа: иначе ключи, которые
+                # так и не загрузились, копятся в _key_locks
+                with self._lock:
+                    if self._key_locks.get(key) is key_lock:
+                        del self._key_locks[key]
+                raise
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                self.misses += 1
+                self.load_time_sec += elapsed
+                self._items[key] = value
+                self._items.move_to_end(key)
+                while len(self._items) > self.max_size:
+                    old_key, _ = self._items.popitem(last=False)
+                    self.evictions += 1
+                    logger.info(f"Модель выгружена из кэша: {old_key}")
+                self._key_locks.pop(key, None)
+            logger.info(f"Модель загружена за {elapsed:.1f} с: {key}")
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "load_time_sec": round(self.load_time_sec, 3),
+                "keys": [list(k) for k in self._items.keys()],
+            }
+
+
+_cache: Optional[ModelCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ModelCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ModelCache(settings.ASR_MODEL_CACHE_SIZE)
+        return _cache
+
+
+def cache_stats() -> Dict:
+    return get_cache().stats()
+
+
+def _lang(language: Optional[str]) -> Optional[str]:
+    if not language or language == "auto":
+        return None
+    return language
+
+
+def asr_key(model_name: str, compute_type: str, device: str, language: Optional[str]) -> Tuple:
+    return ("asr", model_name, compute_type, device, _lang(language))
+
+
+def get_asr_model(device: str, language: Optional[str] = None):
+    import whisperx  # type: ignore
+
+    lang = _lang(language)
+    key = asr_key(settings.ASR_MODEL, settings.ASR_COMPUTE, device, lang)
+    return get_cache().get_or_load(
+        key,
+        lambda: whisperx.load_model(
+            settings.ASR_MODEL,
+            device,
+            compute_type=settings.ASR_COMPUTE,
+            language=lang,
+        ),
+    )
+
+
+def get_align_model(language: str, device: str):
+    import whisperx  # type: ignore
+
+    key = ("align", "wav2vec2", "default", device, language)
+    return get_cache().get_or_load(
+        key,
+        lambda: whisperx.load_align_model(language_code=language, device=device),
+    )
+
+
+def get_diarize_model(device: str):
+    import whisperx  # type: ignore
+
+    key = ("diarize", "pyannote", "default", device, None)
+    return get_cache().get_or_load(
+        key,
+        lambda: whisperx.diarize.DiarizationPipeline(use_auth_token=settings.HF_TOKEN, device=device),
+    )
@@ -0,0 +1,121 @@
+"""
+Дисковый кэш результатов ASR, адресуемый по содержимому.
+
+Ключ — хэш нормализованного PCM плюс настройки, влияющие на результат
+(модель, язык, диаризация, compute type, VAD). Повторная загрузка той же записи
+возвращает выровненные сегменты сразу. Размер кэша ограничен ASR_CACHE_MAX_MB,
+вытесняются давно не использованные записи (по mtime).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+from kits.kit_common.config import settings
+from kits.utils.wav import open_pcm
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+_HASH_BLOCK = 4 * 1024 * 1024
+
+
+def cache_dir() -> Path:
+    d = Path(settings.ASR_CACHE_DIR) if settings.ASR_CACHE_DIR else Path(settings.DATA_DIR) / "cache" / "asr"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def pcm_fingerprint(wav_path: Path) -> str:
+    """Хэш аудиоданных (без заголовка WAV); для чужих форматов — хэш всего файла"""
+    h = hashlib.blake2b(digest_size=20)
+    pcm = open_pcm(Path(wav_path))
+    if pcm is not None:
+        raw = memoryview(pcm).cast("B") if len(pcm) else b""
+        for i in range(0, len(raw), _HASH_BLOCK):
+            h.update(raw[i:i + _HASH_BLOCK])
+    else:
+        with open(wav_path, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+def asr_settings(language: Optional[str]) -> Dict:
+    from .whisperx_asr import diarization_enabled
+
+    return {
+        "v": CACHE_VERSION,
+        "model": settings.ASR_MODEL,
+        "language": language or "auto",
+        "diarization": diarization_enabled(),
+        "compute": settings.ASR_COMPUTE,
+        "skip_silence_sec": settings.ASR_SKIP_SILENCE_SEC,
+        "silence_db": settings.ASR_SILENCE_DB,
+    }
+
+
+def cache_key(wav_path: Path, language: Optional[str], pcm_fp: Optional[str] = None) -> str:
+    """pcm_fp — уже посчитанный pcm_fingerprint(wav_path), чтобы не хэшировать файл повторно"""
+    params = json.dumps(asr_settings(language), sort_keys=True)
+    return hashlib.blake2b(f"{pcm_fp or pcm_fingerprint(wav_path)}|{params}".encode(), digest_size=20).hexdigest()
+
+
+def get(key: str) -> Optional[Dict]:
+    p = cache_dir() / f"{key}.json"
+    try:
+        with open(p, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(p)  # отметка использования для LRU
+    except OSError:
+        pass
+    return data
+
+
+def put(key: str, result: Dict):
+    d = cache_dir()
+    fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, d / f"{key}.json")
+    except Exception:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    evict(settings.ASR_CACHE_MAX_MB * 1024 * 1024)
+
+
+def evict(max_bytes: int) -> int:
+    """Удалять самые давно использованные записи, пока кэш больше бюджета"""
+    entries = []
+    for p in cache_dir().glob("*.json"):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+    total = sum(e[1] for e in entries)
+    removed = 0
+    for _, size, p in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        try:
+            p.unlink()
+            total -= size
+            removed += 1
+        except OSError:
+            pass
+    if removed:
+        logger.info(f"Кэш ASR: вытеснено записей {removed}")
+    return removed
@@ -0,0 +1,171 @@
+"""
+Энергетический анализ PCM на NumPy: поиск тишины для нарезки аудио на окна
+и вырезания длинных пауз перед ASR (с картой времени обратно на исходный таймлайн).
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+FRAME_SEC = 0.03
+_BLOCK_FRAMES = 8192  # считаем блоками, чтобы не держать лишние копии длинного аудио
+
+
+def frame_rms_db(audio: np.ndarray, sr: int = 16000, frame_sec: float = FRAME_SEC) -> np.ndarray:
+    """RMS каждого кадра в dBFS. Принимает float32 [-1, 1] или int16."""
+    hop = max(1, int(sr * frame_sec))
+    n = len(audio) // hop
+    out = np.empty(n, dtype=np.float32)
+    scale = 1.0 / 32768.0 if audio.dtype == np.int16 else 1.0
+    for i in range(0, n, _BLOCK_FRAMES):
+        j = min(n, i + _BLOCK_FRAMES)
+        frames = np.asarray(audio[i * hop:j * hop], dtype=np.float32).reshape(j - i, hop)
+        if scale != 1.0:
+            frames *= scale
+        power = np.einsum("ij,ij->i", frames, frames) / hop
+        out[i:j] = 10.0 * np.log10(power + 1e-10)
+    return out
+
+
+def _moving_average(x: np.ndarray, width: int) -> np.ndarray:
+    width = max(1, min(width, len(x)))
+    c = np.cumsum(np.concatenate(([0.0], x.astype(np.float64))))
+    return (c[width:] - c[:-width]) / width
+
+
+def plan_windows(
+    audio: np.ndarray,
+    sr: int = 16000,
+    window_sec: float = 600.0,
+    search_sec: float = 30.0,
+    min_silence_sec: float = 0.5,
+    frame_sec: float = FRAME_SEC,
+) -> List[Tuple[int, int]]:
+    """Разбить аудио на окна ~window_sec, резать в самом тихом месте около границы.
+
+    Возвращает список (start_sample, end_sample). Границы кратны длине кадра.
+    """
+    total = len(audio)
+    hop = max(1, int(sr * frame_sec))
+    window = int(window_sec * sr)
+    if window <= 0 or total <= int(window * 1.5):
+        return [(0, total)]
+
+    db = frame_rms_db(audio, sr, frame_sec)
+    smooth_w = max(1, int(min_silence_sec / frame_sec))
+    smooth = _moving_average(db, smooth_w)  # smooth[k] — средняя энергия кадров k..k+w-1
+
+    bounds = [0]
+    pos = 0
+    while total - pos > int(window * 1.5):
+        target = pos + window
+        lo = max(pos + window // 2, target - int(search_sec * sr)) // hop
+        hi = min(total - window // 2, target + int(search_sec * sr)) // hop
+        hi = min(hi, len(smooth))
+        if hi <= lo:
+            cut_frame = target // hop
+        else:
+            k = lo + int(np.argmin(smooth[lo:hi]))
+            cut_frame = k + smooth_w // 2  # середина самого тихого участка
+        cut = cut_frame * hop
+        if cut <= pos:
+            break
+        bounds.append(cut)
+        pos = cut
+    bounds.append(total)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+# --- VAD-проход: вырезание длинной тишины перед ASR ---
+
+def speech_intervals(
+    audio: np.ndarray,
+    sr: int = 16000,
+    threshold_db: float = -45.0,
+    min_silence_sec: float = 2.0,
+    pad_sec: float = 0.3,
+    frame_sec: float = FRAME_SEC,
+) -> List[Tuple[int, int]]:
+    """Интервалы (в сэмплах), которые нужно оставить: всё, кроме тишины длиннее min_silence_sec.
+
+    От каждой вырезаемой паузы оставляем pad_sec с обеих сторон, чтобы не
+    обрезать тихие начала и концы слов.
+    """
+    total = len(audio)
+    hop = max(1, int(sr * frame_sec))
+    db = frame_rms_db(audio, sr, frame_sec)
+    if len(db) == 0:
+        return [(0, total)] if total else []
+    silent = db <= threshold_db
+    # Границы серий тишины: diff по «рамке» из False
+    edges = np.diff(np.concatenate(([False], silent, [False])).astype(np.int8))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    min_frames = int(np.ceil(min_silence_sec / frame_sec))
+    pad = int(pad_sec * sr)
+
+    keep = []
+    pos = 0
+    for rs, re_ in zip(run_starts, run_ends):
+        if re_ - rs < min_frames:
+            continue
+        cut_start = rs * hop + (pad if rs > 0 else 0)
+        cut_end = re_ * hop - pad if re_ < len(db) else total
+        if cut_end <= cut_start:
+            continue
+        if cut_start > pos:
+            keep.append((pos, cut_start))
+        pos = cut_end
+    if pos < total:
+        keep.append((pos, total))
+    return keep
+
+
+def build_time_map(intervals: List[Tuple[int, int]], sr: int = 16000) -> Dict:
+    """Соответствие времени в «сжатом» аудио исходному таймлайну"""
+    lengths = np.array([e - s for s, e in intervals], dtype=np.int64)
+    compact_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(lengths) else np.zeros(0, np.int64)
+    return {
+        "compact_starts": compact_starts / sr,
+        "orig_starts": np.array([s for s, _ in intervals], dtype=np.float64) / sr,
+        "lengths": lengths / sr,
+    }
+
+
+def to_original(t: float, time_map: Dict, is_end: bool = False) -> float:
+    cs = time_map["compact_starts"]
+    if len(cs) == 0:
+        return t
+    # На стыке двух кусков начало относим к следующему, конец — к предыдущему
+    i = int(np.searchsorted(cs, t, side="left" if is_end else "right")) - 1
+    i = max(0, min(i, len(cs) - 1))
+    offset = min(max(t - cs[i], 0.0), time_map["lengths"][i])
+    return float(time_map["orig_starts"][i] + offset)
+
+
+def remap_segments(segments: List[Dict], time_map: Dict) -> List[Dict]:
+    out = []
+    for seg in segments:
+        seg = dict(seg)
+        if seg.get("start") is not None:
+            seg["start"] = to_original(float(seg["start"]), time_map)
+        if seg.get("end") is not None:
+            seg["end"] = to_original(float(seg["end"]), time_map, is_end=True)
+        if seg.get("words"):
+            words = []
+            for w in seg["words"]:
+                w = dict(w)
+                if w.get("start") is not None:
+                    w["start"] = to_original(float(w["start"]), time_map)
+                if w.get("end") is not None:
+                    w["end"] = to_original(float(w["end"]), time_map, is_end=True)
+                words.append(w)
+            seg["words"] = words
+        out.append(seg)
+    return out
+
+
+def compact_audio(audio: np.ndarray, intervals: List[Tuple[int, int]]) -> np.ndarray:
+    return np.concatenate([audio[s:e] for s, e in intervals]) if intervals else audio[:0]
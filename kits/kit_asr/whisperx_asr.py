@@ -1,58 +1,202 @@
 from typing import Dict, List
 from pathlib import Path
+from kits.kit_common import timing
 from kits.kit_common.config import settings
+from .model_cache import get_asr_model, get_align_model, get_diarize_model, cache_stats
 
 # Применяем патч для WhisperX
-from .whisperx_patch import patch_whisperx
+from .whisperx_patch import patch_whisperx, load_audio
 patch_whisperx()
 
 
-def transcribe_with_whisperx(wav_path: Path, language: str | None = None) -> Dict:
+def _device() -> str:
     import torch  # type: ignore
+
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def warm_up_models() -> Dict:
+    """Заранее загрузить в кэш модели ASR, выравнивания и диаризации из настроек"""
+    import logging
+
+    logger = logging.getLogger(__name__)
+    device = _device()
+    get_asr_model(device, settings.ASR_LANGUAGE)
+
+    languages = [x.strip() for x in settings.ASR_WARM_LANGUAGES.split(",") if x.strip()]
+    if settings.ASR_LANGUAGE and settings.ASR_LANGUAGE != "auto" and settings.ASR_LANGUAGE not in languages:
+        languages.append(settings.ASR_LANGUAGE)
+    for lang in languages:
+        try:
+            get_align_model(lang, device)
+        except Exception as e:
+            logger.warning(f"Не удалось прогреть модель выравнивания для '{lang}': {e}")
+
+    if diarization_enabled():
+        try:
+            get_diarize_model(device)
+        except Exception as e:
+            logger.warning(f"Не удалось прогреть модель диаризации: {e}")
+    return cache_stats()
+
+
+def skip_silence(audio) -> Dict:
+    """VAD-проход: вырезать паузы длиннее ASR_SKIP_SILENCE_SEC, вернуть сжатое аудио и карту времени"""
+    from . import silence
+
+    total_sec = len(audio) / 16000
+    intervals = silence.speech_intervals(
+        audio,
+        16000,
+        threshold_db=settings.ASR_SILENCE_DB,
+        min_silence_sec=settings.ASR_SKIP_SILENCE_SEC,
+    )
+    kept_sec = sum(e - s for s, e in intervals) / 16000
+    return {
+        "audio": silence.compact_audio(audio, intervals),
+        "time_map": silence.build_time_map(intervals, 16000),
+        "stats": {
+            "total_sec": round(total_sec, 3),
+            "skipped_sec": round(total_sec - kept_sec, 3),
+            "kept_intervals": len(intervals),
+        },
+    }
+
+
+def transcribe_and_align(audio, language: str | None = None, device: str | None = None) -> Dict:
+    """Транскрипция и выравнивание слов для массива аудио (16 кГц, float32).
+    Таймкоды — относительно начала переданного массива.
+    """
     import whisperx  # type: ignore
     import logging
+    from . import silence
+
+    logger = logging.getLogger(__name__)
+    device = device or _device()
+
+    # 0. Вырезаем длинную тишину: Whisper не тратит время на пустые участки
+    asr_audio, time_map, vad = audio, None, None
+    if settings.ASR_SKIP_SILENCE_SEC > 0:
+        cut = skip_silence(audio)
+        vad = cut["stats"]
+        if vad["skipped_sec"] > 0:
+            asr_audio, time_map = cut["audio"], cut["time_map"]
+            logger.info(f"VAD: пропущено {vad['skipped_sec']:.1f} с тишины из {vad['total_sec']:.1f} с")
+        if len(asr_audio) == 0:
+            return {"segments": [], "language": language if language and language != "auto" else None, "vad": vad}
+
+    # 1. Transcribe with original whisper (batched) - согласно документации
+    # Модели берём из процессного кэша: повторные задачи не платят за загрузку
+    model = get_asr_model(device, language)
+    logger.info("Начало транскрипции...")
+    with timing.span("transcribe"):
+        result = model.transcribe(asr_audio, batch_size=settings.ASR_BATCH_SIZE)
+    logger.info("Транскрипция завершена")
+    detected = result.get("language")
+    segments = result["segments"]
+    if time_map is not None:
+        # Возвращаем сегменты на исходный таймлайн и выравниваем по исходному аудио
+        segments = silence.remap_segments(segments, time_map)
+
+    # 2. Align whisper output - согласно документации
+    with timing.span("align"):
+        model_a, metadata = get_align_model(detected, device)
+        result = whisperx.align(segments, model_a, metadata, audio, device, return_char_alignments=False)
+    return {"segments": result["segments"], "language": detected, "vad": vad}
+
+
+def diarization_enabled() -> bool:
+    return settings.DIARIZATION == "on" and bool(settings.HF_TOKEN)
+
+
+_diarize_executor = None
+
+
+def _diarize(audio, device: str):
+    import time
+
+    t0 = time.perf_counter()
+    diarize_model = get_diarize_model(device)
+    return diarize_model(audio), time.perf_counter() - t0
+
+
+def start_diarization(audio, device: str | None = None):
+    """Запустить диаризацию в фоновом потоке; ей нужен только звук, а не текст.
+
+    Возвращает Future или None, если диаризация выключена.
+    """
+    global _diarize_executor
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not diarization_enabled():
+        return None
+    if _diarize_executor is None:
+        _diarize_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="diarize")
+    return _diarize_executor.submit(_diarize, audio, device or _device())
+
+
+def finish_diarization(future, result: Dict) -> Dict:
+    """Дождаться диаризации и назначить спикеров; статус пишется в result["diarization"]"""
+    import logging
+
+    logger = logging.getLogger(__name__)
+    # 3. Assign speaker labels - согласно документации
+    if future is None:
+        reason = "DIARIZATION=off" if settings.DIARIZATION != "on" else "HF_TOKEN не задан"
+        return {**result, "diarization": {"status": "disabled", "reason": reason}}
+    try:
+        diarize_segments, elapsed = future.result()
+        import whisperx  # type: ignore
+
+        assigned = whisperx.assign_word_speakers(diarize_segments, {"segments": result["segments"]})
+        status = {"status": "ok", "elapsed_sec": round(elapsed, 2)}
+        return {**result, "segments": assigned["segments"], "diarization": status}
+    except Exception as e:
+        logger.warning(f"Диаризация не удалась, будет псевдодиаризация: {e}", exc_info=True)
+        return {**result, "diarization": {"status": "failed", "error": str(e)}}
+
+
+def transcribe_with_whisperx(wav_path: Path, language: str | None = None) -> Dict:
+    import logging
     
     logger = logging.getLogger(__name__)
     
-    device = "cuda" if torch.cuda.is_available() else "cpu"
+    device = _device()
     audio_file = str(wav_path)
     batch_size = settings.ASR_BATCH_SIZE
     compute_type = settings.ASR_COMPUTE
     
-    logger.info(f"WhisperX: устройство={device}, модель={settings.ASR_MODEL}, batch_size={batch_size}")
+    logger.info(f"WhisperX: устройство={device}, модель={settings.ASR_MODEL}, compute={compute_type}, batch_size={batch_size}")
     logger.info(f"WhisperX: аудио файл={audio_file}")
     
-    # 1. Transcribe with original whisper (batched) - согласно документации
-    logger.info("Загрузка модели WhisperX...")
-    model = whisperx.load_model(settings.ASR_MODEL, device, compute_type=compute_type)
     logger.info("Загрузка аудио...")
-    audio = whisperx.load_audio(audio_file)
-    logger.info("Начало транскрипции...")
-    result = model.transcribe(audio, batch_size=batch_size)
-    logger.info("Транскрипция завершена")
-    
-    # 2. Align whisper output - согласно документации
-    model_a, metadata = whisperx.load_align_model(language_code=result["language"], device=device)
-    result = whisperx.align(result["segments"], model_a, metadata, audio, device, return_char_alignments=False)
-    
-    # 3. Assign speaker labels - согласно документации
-    if settings.DIARIZATION == "on" and settings.HF_TOKEN:
-        try:
-            diarize_model = whisperx.diarize.DiarizationPipeline(use_auth_token=settings.HF_TOKEN, device=device)
-            diarize_segments = diarize_model(audio)
-            result = whisperx.assign_word_speakers(diarize_segments, result)
-        except Exception:
-            # fall back silently
-            pass
+    with timing.span("load_audio"):
+        audio = load_audio(audio_file)
+    # Диаризация идёт параллельно с транскрипцией и выравниванием
+    diarization = start_diarization(audio, device)
+    result = transcribe_and_align(audio, language, device)
+    # Сколько ещё ждали диаризацию после выравнивания
+    with timing.span("diarize_wait"):
+        result = finish_diarization(diarization, result)
 
-    return {"segments": result["segments"], "language": result.get("language")}
+    logger.info(f"Кэш моделей: {cache_stats()}")
+    return {
+        "segments": result["segments"],
+        "language": result.get("language"),
+        "vad": result.get("vad"),
+        "diarization": result.get("diarization"),
+    }
 
 
-def pseudo_diarize(segments: List[Dict]) -> List[Dict]:
-    # If no diarization info, alternate speakers on pauses > 0.5s
+def pseudo_diarize(segments: List[Dict], carry: Dict | None = None) -> List[Dict]:
+    # If no diarization info, alternate speakers on pauses > 0.5s.
+    # carry — состояние между кусками одной записи ({"speaker_id", "prev_end"}):
+    # читается в начале и обновляется в конце, чтобы куски подряд давали ту же
+    # разметку, что и вся запись целиком
+    carry = {} if carry is None else carry
     out = []
-    speaker_id = 1
-    prev_end = 0.0
+    speaker_id = carry.get("speaker_id", 1)
+    prev_end = carry.get("prev_end", 0.0)
     for seg in segments:
         start = float(seg.get("start", 0))
         end = float(seg.get("end", start))
@@ -70,5 +214,7 @@ def pseudo_diarize(segments: List[Dict]) -> List[Dict]:
             "words": words,
         })
         prev_end = end
+    carry["speaker_id"] = speaker_id
+    carry["prev_end"] = prev_end
     return out
 
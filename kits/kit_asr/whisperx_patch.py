@@ -29,48 +29,58 @@ def find_ffmpeg_binary(name: str) -> str:
     raise RuntimeError(f"{name} не найден. Установите FFmpeg или добавьте его в PATH.")
 
 
+def load_audio(file: str, sr: int = 16000):
+    """Патченная версия load_audio с правильным поиском FFmpeg.
+
+    Наш нормализованный WAV (mono s16le, нужная частота) читается через
+    memory-map без повторного запуска ffmpeg и без копии stdout в памяти.
+    """
+    import numpy as np
+    from kits.utils.wav import open_pcm, pcm_to_float32
+
+    pcm = open_pcm(Path(file), sr)
+    if pcm is not None:
+        return pcm_to_float32(pcm)
+
+    try:
+        # Находим FFmpeg
+        ffmpeg_path = find_ffmpeg_binary("ffmpeg")
+        
+        # Launches a subprocess to decode audio while down-mixing and resampling as necessary.
+        cmd = [
+            ffmpeg_path,
+            "-nostdin",
+            "-threads",
+            "0",
+            "-i",
+            file,
+            "-f",
+            "s16le",
+            "-ac",
+            "1",
+            "-acodec",
+            "pcm_s16le",
+            "-ar",
+            str(sr),
+            "-",
+        ]
+        out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+
+    return pcm_to_float32(np.frombuffer(out, np.int16))
+
+
 def patch_whisperx():
     """Применить патч к WhisperX"""
     try:
+        import whisperx
         import whisperx.audio
         
-        # Сохраняем оригинальную функцию
-        original_load_audio = whisperx.audio.load_audio
-        
-        def patched_load_audio(file: str, sr: int = 16000):
-            """Патченная версия load_audio с правильным поиском FFmpeg"""
-            import numpy as np
-            
-            try:
-                # Находим FFmpeg
-                ffmpeg_path = find_ffmpeg_binary("ffmpeg")
-                
-                # Launches a subprocess to decode audio while down-mixing and resampling as necessary.
-                cmd = [
-                    ffmpeg_path,
-                    "-nostdin",
-                    "-threads",
-                    "0",
-                    "-i",
-                    file,
-                    "-f",
-                    "s16le",
-                    "-ac",
-                    "1",
-                    "-acodec",
-                    "pcm_s16le",
-                    "-ar",
-                    str(sr),
-                    "-",
-                ]
-                out = subprocess.run(cmd, capture_output=True, check=True).stdout
-            except subprocess.CalledProcessError as e:
-                raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
-
-            return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
-        
-        # Заменяем функцию
-        whisperx.audio.load_audio = patched_load_audio
+        # Заменяем функцию (и реэкспорт в пакете, если он есть)
+        whisperx.audio.load_audio = load_audio
+        if hasattr(whisperx, "load_audio"):
+            whisperx.load_audio = load_audio
         print("WhisperX успешно заплачен для использования правильного FFmpeg")
         
     except ImportError:
@@ -0,0 +1,198 @@
+"""
+Оконная параллельная транскрипция длинных записей.
+
+Аудио режется по тишине на окна, окна транскрибируются и выравниваются в пуле
+процессов (каждый процесс держит свои модели в кэше), затем результаты
+склеиваются со сдвигом таймкодов. Диаризация выполняется один раз по всему
+аудио (в фоне, параллельно с окнами), поэтому метки спикеров согласованы.
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing as mp
+import os
+import threading
+from collections import Counter
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from kits.kit_common.config import settings
+from kits.kit_asr import whisperx_asr
+from kits.utils.wav import open_pcm, pcm_to_float32
+from .silence import plan_windows
+from .whisperx_patch import load_audio
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def _init_pool_process(threads: int):
+    # Делим ядра между процессами, иначе каждый torch займёт все ядра сразу
+    try:
+        import torch  # type: ignore
+
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """Долгоживущий пул процессов: модели остаются загруженными между задачами"""
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn: CUDA и загруженные модели родителя не переживают fork
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_pool_process,
+                initargs=(threads,),
+            )
+            _pool_size = workers
+        return _pool
+
+
+def _load_audio(wav_path: Path):
+    # Нормализованный WAV — memmap int16 без копии; иначе полный декод через ffmpeg
+    pcm = open_pcm(Path(wav_path), SAMPLE_RATE)
+    if pcm is not None:
+        return pcm
+    return load_audio(str(wav_path), SAMPLE_RATE)
+
+
+def _window_audio(source, start: int, end: int) -> np.ndarray:
+    if isinstance(source, str):
+        # В процесс пула передаём путь: окно читается из memmap и конвертируется на месте
+        return pcm_to_float32(open_pcm(Path(source), SAMPLE_RATE), start, end)
+    if source.dtype == np.int16:
+        return pcm_to_float32(source, start, end)
+    return source[start:end]
+
+
+def _transcribe_window(source, start: int, end: int, language: Optional[str]) -> Dict:
+    return whisperx_asr.transcribe_and_align(_window_audio(source, start, end), language)
+
+
+def shift_segments(segments: List[Dict], offset: float) -> List[Dict]:
+    """Сдвинуть таймкоды сегментов и слов окна на offset секунд"""
+    out = []
+    for seg in segments:
+        seg = dict(seg)
+        for k in ("start", "end"):
+            if seg.get(k) is not None:
+                seg[k] = float(seg[k]) + offset
+        words = []
+        for w in seg.get("words") or []:
+            w = dict(w)
+            for k in ("start", "end"):
+                if w.get(k) is not None:
+                    w[k] = float(w[k]) + offset
+            words.append(w)
+        if "words" in seg:
+            seg["words"] = words
+        out.append(seg)
+    return out
+
+
+def stitch_windows(windows: List[Tuple[int, int]], results: List[Dict], sr: int = SAMPLE_RATE) -> Dict:
+    segments: List[Dict] = []
+    for (start, _), res in zip(windows, results):
+        segments.extend(shift_segments(res.get("segments", []), start / sr))
+    langs = Counter(r.get("language") for r in results if r.get("language"))
+    language = langs.most_common(1)[0][0] if langs else None
+    vads = [r["vad"] for r in results if r.get("vad")]
+    vad = None
+    if vads:
+        vad = {
+            "total_sec": round(sum(v["total_sec"] for v in vads), 3),
+            "skipped_sec": round(sum(v["skipped_sec"] for v in vads), 3),
+            "kept_intervals": sum(v["kept_intervals"] for v in vads),
+        }
+    return {"segments": segments, "language": language, "vad": vad}
+
+
+def transcribe_windowed(
+    wav_path: Path,
+    language: Optional[str] = None,
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    on_window: Optional[Callable[[int, int, Dict], None]] = None,
+) -> Dict:
+    """on_window(индекс, всего окон, результат) вызывается по мере готовности окон
+    (таймкоды уже на общей шкале, спикеров ещё нет). Окно, перезапущенное с другим
+    языком, приходит повторно — его прежний результат надо заменить.
+    """
+    workers = workers or settings.ASR_WORKERS
+    audio = _load_audio(wav_path)
+    windows = plan_windows(
+        audio,
+        SAMPLE_RATE,
+        window_sec=settings.ASR_WINDOW_SEC,
+        search_sec=settings.ASR_WINDOW_SEARCH_SEC,
+    )
+    lang = None if not language or language == "auto" else language
+    logger.info(f"Оконная транскрипция: окон={len(windows)}, процессов={workers}")
+
+    # Диаризации нужен весь сигнал: float32 копия создаётся только если она включена,
+    # и считается она в фоне, пока окна распознаются в пуле
+    diarization = None
+    if whisperx_asr.diarization_enabled():
+        full = pcm_to_float32(audio) if audio.dtype == np.int16 else audio
+        diarization = whisperx_asr.start_diarization(full)
+
+    pool = executor or get_pool(workers)
+
+    def submit(i: int, lang_i: Optional[str]):
+        s, e = windows[i]
+        if isinstance(audio, np.memmap):
+            return pool.submit(_transcribe_window, str(wav_path), s, e, lang_i)
+        return pool.submit(_transcribe_window, audio[s:e], 0, e - s, lang_i)
+
+    def collect(futures: Dict[int, Future], results: List[Optional[Dict]]):
+        if on_window is None:
+            for i, f in futures.items():
+                results[i] = f.result()
+            return
+        index = {f: i for i, f in futures.items()}
+        for f in as_completed(index):
+            i = index[f]
+            results[i] = f.result()
+            start = windows[i][0]
+            on_window(i, len(windows), {
+                "segments": shift_segments(results[i].get("segments", []), start / SAMPLE_RATE),
+                "language": results[i].get("language"),
+                "start_sec": start / SAMPLE_RATE,
+                "end_sec": windows[i][1] / SAMPLE_RATE,
+            })
+
+    results: List[Optional[Dict]] = [None] * len(windows)
+    collect({i: submit(i, lang) for i in range(len(windows))}, results)
+
+    if lang is None:
+        # Язык определяется по окнам независимо; окна с «чужим» языком
+        # перезапускаем с языком большинства, чтобы не смешивать выравнивание
+        major = stitch_windows(windows, results)["language"]
+        redo = [i for i, r in enumerate(results) if major and r.get("language") != major]
+        if redo:
+            logger.info(f"Повторная транскрипция {len(redo)} окон с языком '{major}'")
+            collect({i: submit(i, major) for i in redo}, results)
+
+    result = stitch_windows(windows, results)
+    result = whisperx_asr.finish_diarization(diarization, result)
+    return {
+        "segments": result["segments"],
+        "language": result.get("language"),
+        "vad": result.get("vad"),
+        "diarization": result.get("diarization"),
+    }
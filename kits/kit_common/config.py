@@ -15,10 +15,12 @@ class Settings(BaseSettings):
     DATA_DIR: str = "./data"
     MODELS_CACHE_DIR: str = "./models"
     PROCESS_MODE: str = "async"  # async | sync
+    PROGRESS_MIN_INTERVAL_SEC: float = 1.0  # не писать status.json с прогрессом чаще
 
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
     RQ_JOB_TIMEOUT: int = 1800  # 30 минут timeout для задач
+    WORKER_MODE: str = "preload"  # preload (модели в памяти, задачи в процессе) | fork
 
     # ASR
     ASR_MODEL: str = "base"  # Изменено с large-v3 на base для скорости
@@ -27,7 +29,18 @@ class Settings(BaseSettings):
     ASR_BEAM_SIZE: int = 1  # Уменьшено для скорости
     ASR_COMPUTE: str = "int8_float16"  # Более быстрый режим
     ASR_VAD: str = "whisperx"  # whisperx | webrtc
+    ASR_SKIP_SILENCE_SEC: float = 2.0  # вырезать паузы длиннее N секунд перед ASR (0 — выключено)
+    ASR_SILENCE_DB: float = -45.0  # порог тишины, dBFS
     MAX_AUDIO_MIN: int = 90
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024  # размер куска при приёме загрузки
+    ASR_MODEL_CACHE_SIZE: int = 4  # сколько моделей (ASR/align/diarize) держать в памяти процесса
+    ASR_WARM_LANGUAGES: str = "ru"  # языки моделей выравнивания для прогрева воркера, через запятую
+    ASR_WORKERS: int = 1  # >1 — длинные записи режутся на окна и распознаются в пуле процессов
+    ASR_WINDOW_SEC: int = 600  # целевая длина окна
+    ASR_WINDOW_SEARCH_SEC: int = 30  # где искать тишину вокруг границы окна
+    ASR_CACHE: bool = True  # кэш результатов ASR по хэшу аудио (повторные загрузки)
+    ASR_CACHE_DIR: str = ""  # по умолчанию DATA_DIR/cache/asr
+    ASR_CACHE_MAX_MB: int = 512
 
     # Diarization
     DIARIZATION: str = "on"  # on | off
@@ -40,6 +53,27 @@ class Settings(BaseSettings):
     LLM_MODEL: str = "qwen/qwen3-4b-thinking-2507"
     LLM_TEMPERATURE: float = 0.2
     LLM_MAX_TOKENS: int = 8096
+    LLM_LIMITER: str = "redis"  # redis (общий для всех воркеров и API) | local (на процесс) | off
+    LLM_MAX_INFLIGHT: int = 4  # одновременных запросов к OPENAI_BASE_URL (0 — без ограничения)
+    LLM_TOKENS_PER_SEC: float = 0.0  # лимит токенов в секунду (0 — без ограничения)
+    LLM_RETRIES: int = 4  # повторы на 429/5xx и сетевые ошибки
+    LLM_RETRY_BASE_SEC: float = 1.0
+    LLM_RETRY_MAX_SEC: float = 30.0
+    LLM_HTTP_POOL_SIZE: int = 16  # соединений в пуле общего клиента (не меньше LLM_CONCURRENCY)
+    LLM_HTTP_KEEPALIVE_SEC: float = 60.0  # сколько держать простаивающее соединение
+    LLM_HTTP_TIMEOUT_SEC: float = 600.0  # таймаут запроса (длинные ответы модели)
+    LLM_HTTP_CONNECT_TIMEOUT_SEC: float = 10.0
+    LLM_CACHE: bool = True  # кэшировать ответы LLM (одинаковый запрос — ответ из кэша)
+    LLM_CACHE_PATH: str = ""  # SQLite-файл кэша, по умолчанию DATA_DIR/cache/llm.sqlite3
+    LLM_CACHE_MAX_MB: int = 256
+    LLM_CACHE_MAX_AGE_DAYS: float = 30.0
+    LLM_COMPACT_TRANSCRIPT: bool = True  # алиасы участников, без слов-паразитов и повторов в промпте
+    LLM_CONTEXT_TOKENS: int = 32768  # контекст модели по умолчанию
+    LLM_CONTEXT_BUDGETS: str = ""  # контекст по моделям: "model-a=8192,model-b=131072"
+    LLM_ITERATIVE_MAX_CHUNKS: int = 3  # до стольких частей — итеративно, больше — map-reduce
+    LLM_CONCURRENCY: int = 4  # одновременных запросов к LLM в map-reduce резюмировании
+    LLM_REDUCE_FANIN: int = 4  # сколько частичных сводок объединять за один запрос
+    LLM_OVERLAP_ASR: bool = True  # при оконной ASR резюмировать готовые окна, не дожидаясь всей записи
 
     # Export / flags
     FAST_MODE: bool = True  # Включен быстрый режим по умолчанию
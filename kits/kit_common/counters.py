@@ -0,0 +1,69 @@
+"""
+Счётчики событий, общие для всех процессов (API, воркеры RQ, дочерние процессы задач).
+
+Хранятся в SQLite в DATA_DIR, поэтому /metrics видит попадания в кэши и прочие
+события, случившиеся в воркерах. Ошибки записи не должны ломать задачу — только лог.
+"""
+from __future__ import annotations
+
+import logging
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Dict
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _db_path() -> Path:
+    d = Path(settings.DATA_DIR)
+    d.mkdir(parents=True, exist_ok=True)
+    return d / "counters.sqlite3"
+
+
+def _connect() -> sqlite3.Connection:
+    con = sqlite3.connect(_db_path(), timeout=30, isolation_level=None)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    return con
+
+
+def incr(name: str, n: int = 1):
+    try:
+        with closing(_connect()) as con:
+            con.execute(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, int(n)),
+            )
+    except sqlite3.Error as e:
+        logger.warning(f"Не удалось обновить счётчик {name}: {e}")
+
+
+def incr_many(values: Dict[str, int]):
+    """Несколько счётчиков одной транзакцией"""
+    try:
+        with closing(_connect()) as con:
+            with con:
+                con.execute("BEGIN")
+                con.executemany(
+                    "INSERT INTO counters (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    [(name, int(n)) for name, n in values.items()],
+                )
+    except sqlite3.Error as e:
+        logger.warning(f"Не удалось обновить счётчики: {e}")
+
+
+def snapshot(prefix: str = "") -> Dict[str, int]:
+    try:
+        with closing(_connect()) as con:
+            rows = con.execute(
+                "SELECT name, value FROM counters WHERE name LIKE ? ORDER BY name", (prefix + "%",)
+            ).fetchall()
+    except sqlite3.Error as e:
+        logger.warning(f"Не удалось прочитать счётчики: {e}")
+        return {}
+    return {name: value for name, value in rows}
@@ -1,4 +1,6 @@
 import json
+import os
+import threading
 from pathlib import Path
 from typing import Dict
 
@@ -38,3 +40,12 @@ def write_json(path: Path, data):
     with open(path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
+
+
+def write_json_atomic(path: Path, data):
+    # Читатели (опрос статуса) видят либо старую, либо новую версию файла целиком.
+    # Временный файл свой у каждого потока и процесса: параллельные писатели не портят чужой
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.part")
+    write_json(tmp, data)
+    os.replace(tmp, path)
@@ -0,0 +1,82 @@
+"""
+Прогресс задачи изнутри pipeline.
+
+run_pipeline ставит колбэк через reporting(); стадии сообщают прогресс через
+report("asr", обработано, всего, "audio_sec"), не зная, куда он уходит. Колбэк
+хранится в contextvars, как спаны timing: в пулы потоков он попадает через
+timing.bind(). Без колбэка report() ничего не делает.
+
+Стадии, которые работают одним долгим вызовом без промежуточных отчётов
+(WhisperX без окон), оборачиваются в heartbeat(): он раз в interval сообщает
+оценку по прошедшему времени и средней скорости прошлых задач, а без истории
+(первая задача) — только что стадия жива, без оценки готовности.
+"""
+from __future__ import annotations
+
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# callback(stage, done, total, unit); total=None — объём стадии ещё неизвестен
+ProgressCallback = Callable[[str, float, Optional[float], str], None]
+
+_current: contextvars.ContextVar[Optional[ProgressCallback]] = contextvars.ContextVar("progress", default=None)
+
+
+@contextmanager
+def reporting(callback: Optional[ProgressCallback]):
+    token = _current.set(callback)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def _call(callback: ProgressCallback, stage: str, done: float, total: Optional[float], unit: str):
+    # Ошибка записи прогресса не должна ронять задачу
+    try:
+        callback(stage, done, total, unit)
+    except Exception as e:
+        logger.debug(f"Прогресс {stage}: {e}")
+
+
+def report(stage: str, done: float, total: Optional[float] = None, unit: str = ""):
+    callback = _current.get()
+    if callback is None:
+        return
+    _call(callback, stage, done, total, unit)
+
+
+# Оценка по времени не доходит до конца стадии: завершение сообщает сама стадия
+_HEARTBEAT_MAX_FRACTION = 0.95
+
+
+@contextmanager
+def heartbeat(stage: str, total: float, unit: str, rate: Optional[float], interval: float = 1.0):
+    """Пока блок выполняется, раз в interval сообщать done = прошедшее время × rate
+    (единиц в секунду, обычно средняя скорость прошлых задач). Без rate сообщает
+    done=0: статус обновляется (время в стадии), но без ETA. Без колбэка ничего не делает."""
+    callback = _current.get()
+    if callback is None or not total:
+        yield
+        return
+    stop = threading.Event()
+    t0 = time.monotonic()
+
+    def beat():
+        while not stop.wait(interval):
+            done = min((time.monotonic() - t0) * rate, total * _HEARTBEAT_MAX_FRACTION) if rate else 0.0
+            _call(callback, stage, done, total, unit)
+
+    thread = threading.Thread(target=beat, name=f"progress-{stage}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,248 @@
+"""
+Замеры стадий задачи: стенное и процессорное время, пиковый RSS, токены LLM.
+
+    with timing.recording() as rec:          # одна задача
+        with timing.span("asr", metric="stage_asr"):
+            ...
+            timing.add_tokens(prompt, completion)  # учитывается в текущем спане и его родителях
+    rec.to_dict()  # -> work_dir/timings.json
+
+Спаны с одинаковым путём (например, все запросы к LLM внутри summarize)
+суммируются. metric=... дополнительно кладёт длительность в гистограмму в
+counters — /metrics строит по ним распределения задержек по всем процессам.
+
+- cpu_sec — процессорное время всего процесса за время спана: параллельные спаны
+  видят и чужую нагрузку, а работа дочерних процессов (пул оконной ASR) не входит;
+- rss_peak_mb — наибольший RSS процесса за время спана: в начале, в конце и по
+  опросу раз в RSS_SAMPLE_SEC, пока спан открыт (Linux, /proc/self/statm);
+- rss_growth_mb — на сколько RSS вырос за спан относительно начала. В рабочем
+  процессе с заранее загруженными моделями пик включает их, а рост — только то,
+  что заняла сама стадия.
+
+Контекст спанов живёт в contextvars; пулы потоков его не наследуют, поэтому
+задачи в пулы отправляются через bind().
+"""
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+from . import counters
+
+# Границы корзин гистограмм, секунды (последняя корзина — +Inf)
+BUCKETS_SEC = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+# Период опроса RSS, пока открыт хотя бы один спан
+RSS_SAMPLE_SEC = 0.1
+
+_lock = threading.Lock()
+
+
+class Recorder:
+    """Спаны одной задачи, агрегированные по пути ("summarize.llm")"""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.spans: Dict[str, Dict] = {}
+
+    def add(self, path: str, wall: float, cpu: float, rss: Optional[Tuple[float, float]], tokens: Dict[str, int]):
+        """rss — (RSS в начале, пик за спан), МБ; None, если замерить нельзя"""
+        with _lock:
+            s = self.spans.setdefault(path, {
+                "count": 0, "wall_sec": 0.0, "cpu_sec": 0.0, "rss_peak_mb": None, "rss_growth_mb": None,
+                "tokens_prompt": 0, "tokens_completion": 0,
+            })
+            s["count"] += 1
+            s["wall_sec"] += wall
+            s["cpu_sec"] += cpu
+            if rss is not None:
+                start, peak = rss
+                s["rss_peak_mb"] = max(s["rss_peak_mb"] or 0.0, peak)
+                s["rss_growth_mb"] = max(s["rss_growth_mb"] or 0.0, peak - start)
+            s["tokens_prompt"] += tokens["prompt"]
+            s["tokens_completion"] += tokens["completion"]
+
+    def to_dict(self) -> Dict:
+        with _lock:
+            spans = {
+                path: {k: round(v, 3) if isinstance(v, float) else v for k, v in s.items()}
+                for path, s in self.spans.items()
+            }
+        return {"total_sec": round(time.perf_counter() - self.t0, 3), "spans": spans}
+
+
+class _Span:
+    __slots__ = ("recorder", "path", "parent", "tokens", "rss_peak")
+
+    def __init__(self, recorder: Optional[Recorder], path: str, parent: Optional["_Span"]):
+        self.recorder = recorder
+        self.path = path
+        self.parent = parent
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.rss_peak = 0.0
+
+
+_current: contextvars.ContextVar[Optional[_Span]] = contextvars.ContextVar("timing_span", default=None)
+
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):  # Windows
+    _PAGE_SIZE = 4096
+
+
+def rss_mb() -> Optional[float]:
+    """Текущий RSS процесса, МБ; None там, где нет /proc (macOS, Windows)"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * _PAGE_SIZE / (1024 * 1024)
+
+
+class _RssSampler:
+    """Фоновый опрос RSS для открытых спанов; пока спанов нет, поток спит"""
+
+    def __init__(self):
+        self._active = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, sp: _Span):
+        with self._lock:
+            self._active.add(sp)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="timing-rss", daemon=True)
+                self._thread.start()
+            self._wake.set()
+
+    def remove(self, sp: _Span):
+        with self._lock:
+            self._active.discard(sp)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(RSS_SAMPLE_SEC)
+            rss = rss_mb()
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+                    continue
+                if rss is not None:
+                    for sp in self._active:
+                        sp.rss_peak = max(sp.rss_peak, rss)
+
+
+_sampler = _RssSampler()
+
+
+@contextmanager
+def recording():
+    """Собирать спаны задачи в новый Recorder"""
+    rec = Recorder()
+    token = _current.set(_Span(rec, "", None))
+    try:
+        yield rec
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, metric: Optional[str] = None):
+    """Замерить блок; отдаёт dict, в котором после выхода лежит wall_sec"""
+    parent = _current.get()
+    recorder = parent.recorder if parent is not None else None
+    path = f"{parent.path}.{name}" if parent is not None and parent.path else name
+    sp = _Span(recorder, path, parent)
+    token = _current.set(sp)
+    result: Dict = {}
+    # RSS замеряем только для спанов задачи: вне recording() его некуда записать
+    rss0 = rss_mb() if recorder is not None else None
+    if rss0 is not None:
+        sp.rss_peak = rss0
+        _sampler.add(sp)
+    t0 = time.perf_counter()
+    c0 = time.process_time()
+    try:
+        yield result
+    finally:
+        wall = time.perf_counter() - t0
+        cpu = time.process_time() - c0
+        _current.reset(token)
+        result["wall_sec"] = wall
+        rss = None
+        if rss0 is not None:
+            _sampler.remove(sp)
+            rss = (rss0, max(sp.rss_peak, rss_mb() or 0.0))
+        if recorder is not None:
+            recorder.add(path, wall, cpu, rss, sp.tokens)
+        # Токены дочернего спана входят и в родителя
+        if parent is not None and parent.path:
+            with _lock:
+                parent.tokens["prompt"] += sp.tokens["prompt"]
+                parent.tokens["completion"] += sp.tokens["completion"]
+        if metric:
+            observe(metric, wall)
+
+
+def add_tokens(prompt: int = 0, completion: int = 0):
+    sp = _current.get()
+    if sp is None or not sp.path:
+        return
+    with _lock:
+        sp.tokens["prompt"] += int(prompt or 0)
+        sp.tokens["completion"] += int(completion or 0)
+
+
+def bind(fn: Callable) -> Callable:
+    """Обернуть fn для пула потоков: она выполнится в контексте спанов вызывающего"""
+    ctx = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # Копия на каждый вызов: один Context нельзя войти из двух потоков сразу
+        return ctx.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def _bucket(seconds: float) -> str:
+    for le in BUCKETS_SEC:
+        if seconds <= le:
+            return str(le)
+    return "inf"
+
+
+def observe(metric: str, seconds: float):
+    """Добавить наблюдение в гистограмму metric (счётчики в общей SQLite)"""
+    counters.incr_many({
+        f"latency_{metric}_count": 1,
+        f"latency_{metric}_sum_ms": int(seconds * 1000),
+        f"latency_{metric}_le_{_bucket(seconds)}": 1,
+    })
+
+
+def histograms() -> Dict[str, Dict]:
+    """Гистограммы из счётчиков: накопительные корзины, как в Prometheus"""
+    raw = counters.snapshot("latency_")
+    names = {k[len("latency_"):-len("_count")] for k in raw if k.endswith("_count")}
+    out: Dict[str, Dict] = {}
+    for name in sorted(names):
+        count = raw.get(f"latency_{name}_count", 0)
+        buckets = {}
+        total = 0
+        for le in [str(b) for b in BUCKETS_SEC] + ["inf"]:
+            total += raw.get(f"latency_{name}_le_{le}", 0)
+            buckets["+Inf" if le == "inf" else le] = total
+        out[name] = {
+            "count": count,
+            "avg_sec": round(raw.get(f"latency_{name}_sum_ms", 0) / count / 1000, 3) if count else 0,
+            "buckets": buckets,
+        }
+    return out
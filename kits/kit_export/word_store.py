@@ -0,0 +1,224 @@
+"""
+Колоночное хранилище слов задачи (out/words/).
+
+Слова с таймкодами — основной объём результата: в JSON каждое слово — словарь
+с повторяющимися ключами. Здесь они лежат параллельными колонками .npy, которые
+читаются через mmap без разбора:
+
+    start.npy, end.npy, score.npy   float32 (score = NaN — оценки нет)
+    segment.npy                     int32, номер сегмента transcript.json
+    text.npy, speaker.npy           int32, индекс в strings.json (-1 — нет)
+    strings.json                    таблица уникальных строк
+    meta.json                       версия формата и число слов
+
+transcript.json хранит сегменты без слов и ссылку "word_store"; load_transcript()
+возвращает их обратно тем, кому нужен прежний формат. Так же хранят слова
+контрольные точки стадий asr и postprocess (work_dir/stages/asr_words и out/words).
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+WORDS_DIR = "words"
+FORMAT_VERSION = 1
+
+_FLOAT_COLUMNS = ("start", "end", "score")
+_INT_COLUMNS = ("segment", "text", "speaker")
+
+
+def _word_text(w: Dict) -> str:
+    # WhisperX кладёт слово в "word", наши сегменты и субтитры — в "text"
+    return (w.get("text") or w.get("word") or "").strip()
+
+
+def write(out_dir: Path, segments: List[Dict], source: Optional[str] = None, name: str = WORDS_DIR) -> Dict:
+    """Записать слова всех сегментов в out_dir/<name>; возвращает meta"""
+    strings: Dict[str, int] = {}
+
+    def intern(s: Optional[str]) -> int:
+        if not s:
+            return -1
+        return strings.setdefault(s, len(strings))
+
+    cols: Dict[str, List] = {k: [] for k in _FLOAT_COLUMNS + _INT_COLUMNS}
+    for i, seg in enumerate(segments):
+        for w in seg.get("words") or []:
+            start = w.get("start")
+            end = w.get("end")
+            score = w.get("score")
+            cols["start"].append(np.nan if start is None else start)
+            cols["end"].append(np.nan if end is None else end)
+            cols["score"].append(np.nan if score is None else score)
+            cols["segment"].append(i)
+            cols["text"].append(intern(_word_text(w)))
+            cols["speaker"].append(intern(w.get("speaker")))
+
+    meta = {"version": FORMAT_VERSION, "count": len(cols["segment"]), "segments": len(segments), "source": source}
+    # Собираем во временном каталоге и подменяем целиком: читатель не увидит половину колонок
+    target = Path(out_dir) / name
+    tmp = Path(out_dir) / f"{name}.part"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for k in _FLOAT_COLUMNS:
+        np.save(tmp / f"{k}.npy", np.asarray(cols[k], dtype=np.float32))
+    for k in _INT_COLUMNS:
+        np.save(tmp / f"{k}.npy", np.asarray(cols[k], dtype=np.int32))
+    with open(tmp / "strings.json", "w", encoding="utf-8") as f:
+        json.dump(list(strings), f, ensure_ascii=False, separators=(",", ":"))
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    return meta
+
+
+class WordStore:
+    """Колонки слов через mmap; словари собираются только по запросу"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия хранилища слов: {self.meta.get('version')}")
+        with open(self.path / "strings.json", "r", encoding="utf-8") as f:
+            self.strings: List[str] = json.load(f)
+        self._cols: Dict[str, np.ndarray] = {}
+        self._offsets: Optional[np.ndarray] = None
+        self._search_key: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return int(self.meta.get("count", 0))
+
+    def column(self, name: str) -> np.ndarray:
+        col = self._cols.get(name)
+        if col is None:
+            # Пустой массив np.load не отображает в память — читаем как есть
+            col = np.load(self.path / f"{name}.npy", mmap_mode="r" if len(self) else None)
+            self._cols[name] = col
+        return col
+
+    def segment_offsets(self) -> np.ndarray:
+        """offsets[i]:offsets[i+1] — слова сегмента i (слова записаны по порядку сегментов)"""
+        if self._offsets is None:
+            n = int(self.meta.get("segments", 0))
+            self._offsets = np.searchsorted(self.column("segment"), np.arange(n + 1), side="left")
+        return self._offsets
+
+    def words(self, lo: int = 0, hi: Optional[int] = None) -> List[Dict]:
+        """Слова [lo, hi) в прежнем виде словарей"""
+        hi = len(self) if hi is None else min(hi, len(self))
+        if hi <= lo:
+            return []
+        start = self.column("start")[lo:hi].tolist()
+        end = self.column("end")[lo:hi].tolist()
+        score = self.column("score")[lo:hi].tolist()
+        text = self.column("text")[lo:hi].tolist()
+        speaker = self.column("speaker")[lo:hi].tolist()
+        strings = self.strings
+        out = []
+        for s, e, sc, t, sp in zip(start, end, score, text, speaker):
+            w = {
+                "start": None if s != s else round(s, 3),
+                "end": None if e != e else round(e, 3),
+                "text": strings[t] if t >= 0 else "",
+            }
+            if sp >= 0:
+                w["speaker"] = strings[sp]
+            if sc == sc:  # не NaN
+                w["score"] = round(sc, 3)
+            out.append(w)
+        return out
+
+    def segment_words(self, index: int) -> List[Dict]:
+        offsets = self.segment_offsets()
+        if index < 0 or index + 1 >= len(offsets):
+            return []
+        return self.words(int(offsets[index]), int(offsets[index + 1]))
+
+    def search_key(self) -> np.ndarray:
+        """Неубывающий ключ для бинарного поиска по времени.
+
+        У слов без таймкода (числа, невыровненные токены WhisperX) start = NaN, и
+        колонка start не отсортирована. Такое слово получает start предыдущего
+        слова (в начале записи — первого слова с таймкодом), а редкие откаты
+        времени между сегментами сглаживаются накопленным максимумом.
+        """
+        if self._search_key is None:
+            start = np.asarray(self.column("start"), dtype=np.float64)
+            timed = ~np.isnan(start)
+            if not timed.any():
+                key = np.zeros(len(start))
+            else:
+                idx = np.maximum.accumulate(np.where(timed, np.arange(len(start)), -1))
+                key = start[np.maximum(idx, int(np.argmax(timed)))]
+                key = np.maximum.accumulate(key)
+            self._search_key = key
+        return self._search_key
+
+    def range(self, t0: float, t1: float) -> List[Dict]:
+        """Слова, начинающиеся в [t0, t1); слова без таймкода идут вместе с предыдущим словом"""
+        key = self.search_key()
+        lo = int(np.searchsorted(key, t0, side="left"))
+        hi = int(np.searchsorted(key, t1, side="left"))
+        return self.words(lo, hi)
+
+
+def open_store(out_dir: Path, name: str = WORDS_DIR) -> Optional[WordStore]:
+    path = Path(out_dir) / name
+    if not (path / "meta.json").exists():
+        return None
+    try:
+        return WordStore(path)
+    except (OSError, ValueError):
+        return None
+
+
+def save_transcript(out_dir: Path, transcript: Dict, source: Optional[str] = None, name: str = WORDS_DIR) -> Dict:
+    """Слова — в колонки, в transcript.json — сегменты без слов. Возвращает компактный транскрипт.
+
+    source — отпечаток транскрипта: если хранилище уже записано для него (повторный
+    запуск задачи), колонки не переписываются. name — каталог хранилища в out_dir.
+    """
+    store = open_store(out_dir, name)
+    if store is not None and source is not None and store.meta.get("source") == source:
+        meta = store.meta
+    else:
+        meta = write(out_dir, transcript.get("segments", []), source, name)
+    compact = dict(transcript)
+    compact["segments"] = [{k: v for k, v in seg.items() if k != "words"} for seg in transcript.get("segments", [])]
+    compact["word_store"] = {"path": name, "count": meta["count"], "source": source}
+    return compact
+
+
+def store_matches(out_dir: Path, transcript: Dict) -> bool:
+    """Хранилище, на которое ссылается компактный транскрипт, на месте и записано для него"""
+    ref = transcript.get("word_store")
+    if ref is None:
+        return True
+    store = open_store(out_dir, ref.get("path", WORDS_DIR))
+    return store is not None and store.meta.get("source") == ref.get("source") and len(store) == ref.get("count")
+
+
+def load_transcript(out_dir: Path, transcript: Dict, with_words: bool = True) -> Dict:
+    """Транскрипт в прежнем формате: слова из хранилища возвращаются в сегменты"""
+    if not with_words or "word_store" not in transcript:
+        return transcript
+    store = open_store(out_dir, transcript["word_store"].get("path", WORDS_DIR))
+    if store is None:
+        return transcript
+    offsets = store.segment_offsets()
+    words = store.words()
+    out = dict(transcript)
+    out.pop("word_store", None)
+    out["segments"] = [
+        {**seg, "words": words[int(offsets[i]):int(offsets[i + 1])] if i + 1 < len(offsets) else []}
+        for i, seg in enumerate(transcript.get("segments", []))
+    ]
+    return out
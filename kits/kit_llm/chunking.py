@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import Dict, List
 
-from .token_utils import count_tokens_text
+from .token_utils import count_tokens_batch
 
 
 def segments_to_lines(segments: List[Dict]) -> List[str]:
@@ -22,8 +22,10 @@ def chunk_by_token_budget(lines: List[str], budget_tokens: int) -> List[str]:
     chunks: List[str] = []
     cur: List[str] = []
     cur_tokens = 0
-    for ln in lines:
-        ln_tokens = count_tokens_text(ln) + 1  # account for newline
+    # One batch encode for all lines instead of a tiktoken call per line
+    counts = count_tokens_batch(lines)
+    for ln, n in zip(lines, counts):
+        ln_tokens = n + 1  # account for newline
         if cur and cur_tokens + ln_tokens > budget_tokens:
             chunks.append("\n".join(cur))
             cur = []
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Tuple
+
+from .chunking import segments_to_lines
+from .token_utils import count_tokens_text
+
+
+# Compaction of the transcript before it goes into a prompt:
+#  - speakers get short aliases ([S1], [S2], ...) with a legend line instead of
+#    "Участник N: " on every line;
+#  - consecutive turns of the same speaker are merged;
+#  - interjections, stutters and repeated words/phrases are removed;
+#  - exact and near-duplicate turns of the same speaker (typical ASR loops) are
+#    dropped; the same words from another speaker are a separate turn ("Согласен").
+# Owners in the model's answer are mapped back from aliases with restore_aliases().
+
+_FILLER_RE = re.compile(
+    r"(?<!\w)(?:э+(?:-э+)*|эм+|мм+|хм+|ну(?=,)|так сказать|um+|uh+|erm|hmm+)(?!\w)[,.…]*\s*",
+    re.IGNORECASE,
+)
+# "про- проект" -> "проект"
+_FRAGMENT_RE = re.compile(r"(?<!\w)(\w{1,6})-\s+(?=\1)", re.IGNORECASE)
+# "я я я думаю", "давайте, давайте", "в общем в общем" -> one occurrence (up to 3 words)
+_REPEAT_RE = re.compile(r"(?<!\w)((?:\w+\s+){0,2}\w+)(?:[\s,]+\1(?![\w-]))+", re.IGNORECASE)
+_SPACES_RE = re.compile(r"\s+")
+_SPACE_PUNCT_RE = re.compile(r"\s+([,.!?;:…])")
+_NORM_RE = re.compile(r"[^\w]+")
+# Aliases are bracketed so that "S3" (a bucket, a model name) in normal text is never taken for a speaker
+_ALIAS_RE = re.compile(r"\[S\d+\]")
+
+_DEDUP_WINDOW = 5
+_NEAR_DUP_MIN_CHARS = 30
+_NEAR_DUP_RATIO = 0.95
+
+
+def clean_text(text: str) -> str:
+    t = _FILLER_RE.sub("", text or "")
+    t = _FRAGMENT_RE.sub("", t)
+    t = _REPEAT_RE.sub(r"\1", t)
+    t = _SPACE_PUNCT_RE.sub(r"\1", _SPACES_RE.sub(" ", t))
+    return t.strip(" ,;")
+
+
+def _is_duplicate(speaker: str, norm: str, recent: List[Tuple[str, str]]) -> bool:
+    for prev_speaker, prev in recent:
+        if prev_speaker != speaker:
+            continue
+        if norm == prev:
+            return True
+        # Near-duplicates only for long turns: short ones differ in a word or a number
+        if (
+            min(len(norm), len(prev)) >= _NEAR_DUP_MIN_CHARS
+            and SequenceMatcher(None, norm, prev).ratio() >= _NEAR_DUP_RATIO
+        ):
+            return True
+    return False
+
+
+def compact_transcript(segments: List[Dict], use_aliases: bool = True) -> Dict:
+    """Compacted prompt lines, speaker legend, alias map and token counts before/after.
+
+    use_aliases=False keeps full speaker names (for streamed text that can't be
+    post-processed, e.g. the TL;DR stream).
+    """
+    aliases: Dict[str, str] = {}  # speaker -> alias
+    turns: List[List] = []  # [alias, [texts]]
+    recent: List[Tuple[str, str]] = []  # (speaker, normalized text)
+    for seg in segments or []:
+        text = clean_text(seg.get("text", ""))
+        if not text:
+            continue
+        speaker = seg.get("speaker") or "Участник"
+        norm = _NORM_RE.sub(" ", text.lower()).strip()
+        if not norm or _is_duplicate(speaker, norm, recent):
+            continue
+        recent = (recent + [(speaker, norm)])[-_DEDUP_WINDOW:]
+
+        alias = aliases.setdefault(speaker, f"[S{len(aliases) + 1}]" if use_aliases else speaker)
+        if turns and turns[-1][0] == alias:
+            turns[-1][1].append(text)
+        else:
+            turns.append([alias, [text]])
+
+    lines = [f"{alias}: {' '.join(texts)}" for alias, texts in turns]
+    legend = ""
+    if aliases and use_aliases:
+        legend = "Участники: " + "; ".join(f"{a} — {sp}" for sp, a in aliases.items())
+
+    tokens_before = count_tokens_text("\n".join(segments_to_lines(segments))) if segments else 0
+    tokens_after = count_tokens_text("\n".join([legend] + lines)) if lines else 0
+    return {
+        "legend": legend,
+        "lines": lines,
+        "aliases": {a: sp for sp, a in aliases.items()} if use_aliases else {},
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+    }
+
+
+def restore_aliases(summary: Dict, aliases: Dict[str, str]) -> Dict:
+    """Replace [S1], [S2], ... in owners and texts with real speaker names.
+
+    Texts are rewritten only for the exact bracketed alias; owner is a name by
+    itself, so a bare "S2" there is accepted too.
+    """
+    if not aliases or not isinstance(summary, dict):
+        return summary
+    bare = {a.strip("[]"): sp for a, sp in aliases.items()}
+
+    def _sub(text):
+        if not isinstance(text, str):
+            return text
+        return _ALIAS_RE.sub(lambda m: aliases.get(m.group(0), m.group(0)), text)
+
+    def _owner(owner):
+        if not isinstance(owner, str):
+            return owner
+        key = owner.strip()
+        return aliases.get(key) or bare.get(key) or _sub(owner)
+
+    out = dict(summary)
+    if "tldr" in out:
+        out["tldr"] = _sub(out["tldr"])
+    items = []
+    for it in out.get("action_items") or []:
+        if isinstance(it, dict):
+            it = dict(it)
+            it["text"] = _sub(it.get("text"))
+            it["owner"] = _owner(it.get("owner"))
+        items.append(it)
+    if "action_items" in out:
+        out["action_items"] = items
+    for key in ("decisions", "risks"):
+        if isinstance(out.get(key), list):
+            out[key] = [_sub(x) for x in out[key]]
+    return out
+
+
+def legend_instruction(legend: str) -> str:
+    if not legend:
+        return ""
+    return (
+        f"\n{legend}. В стенограмме участники обозначены сокращениями в квадратных скобках; "
+        "в поле owner указывай имя участника из этого списка, в тексте сокращение пиши вместе со скобками."
+    )
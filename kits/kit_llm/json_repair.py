@@ -0,0 +1,221 @@
+"""
+Локальный ремонт «почти JSON» из ответов модели.
+
+Модели (особенно thinking) оборачивают JSON в ```-блоки, пишут рассуждения до него,
+ставят висячие запятые, одинарные кавычки, Python-литералы или обрываются на
+max_tokens посреди массива. Всё это чинится без повторного запроса к LLM;
+результат приводится к форме _schema(): tldr, action_items[{text, owner, due}],
+decisions[], risks[].
+"""
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+_THINK_RE = re.compile(r"<think>.*?</think>", re.DOTALL | re.IGNORECASE)
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _strip_wrappers(text: str) -> str:
+    text = _THINK_RE.sub("", text)
+    # Незакрытый <think> — рассуждения без ответа, либо ответ после последнего </think>
+    low = text.lower()
+    if "</think>" in low:
+        text = text[low.rindex("</think>") + len("</think>"):]
+    m = _FENCE_RE.search(text)
+    if m and "{" in m.group(1):
+        text = m.group(1)
+    return text
+
+
+def _scan(text: str):
+    """Переписать текст в строгий JSON посимвольно.
+
+    Возвращает (out, stack, cuts, complete): cuts — места, где можно обрезать
+    оборванный ответ (перед запятой или сразу после открывающей скобки) со
+    снимком стека скобок на этот момент.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    cuts = []
+    i, n = 0, len(text)
+    quote = None
+    while i < n:
+        ch = text[i]
+        if quote is not None:
+            if ch == "\\" and i + 1 < n:
+                # \' допустим только внутри строк в одинарных кавычках
+                out.append("'" if text[i + 1] == "'" else text[i:i + 2])
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+            cuts.append((len(out), list(stack)))
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            if stack and _CLOSERS[stack[-1]] == ch:
+                stack.pop()
+                out.append(ch)
+            if not stack:
+                return "".join(out), stack, cuts, True
+        elif ch == ",":
+            cuts.append((len(out), list(stack)))
+            out.append(ch)
+        elif ch.isdigit() or ch == "-":
+            j = i + 1
+            while j < n and (text[j].isdigit() or text[j] in ".eE+-"):
+                j += 1
+            out.append(text[i:j])
+            i = j
+            continue
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] in "_-"):
+                j += 1
+            word = text[i:j]
+            k = j
+            while k < n and text[k] in " \t\r\n":
+                k += 1
+            if word in _LITERALS and not (k < n and text[k] == ":"):
+                out.append(_LITERALS[word])
+            else:
+                out.append(json.dumps(word))  # ключ без кавычек
+            i = j
+            continue
+        elif ch == "/" and text[i:i + 2] == "//":
+            while i < n and text[i] != "\n":
+                i += 1
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if quote is not None:
+        out.append('"')
+    return "".join(out), stack, cuts, False
+
+
+def _drop_trailing_comma(out: List[str]):
+    k = len(out) - 1
+    while k >= 0 and out[k].isspace():
+        k -= 1
+    if k >= 0 and out[k] == ",":
+        del out[k]
+
+
+def _close(s: str, stack: List[str]) -> str:
+    s = s.rstrip()
+    if s.endswith(","):
+        s = s[:-1]
+    return s + "".join(_CLOSERS[c] for c in reversed(stack))
+
+
+def _loads(s: str) -> Optional[Any]:
+    try:
+        return json.loads(s, strict=False)
+    except ValueError:
+        return None
+
+
+def repair_json(text: str) -> Optional[Any]:
+    """Разобрать ответ модели как JSON, починив типичные поломки; None — не удалось"""
+    if not text:
+        return None
+    body = _strip_wrappers(text)
+    start = body.find("{")
+    if start < 0:
+        return None
+    out, stack, cuts, complete = _scan(body[start:])
+    if complete:
+        return _loads(out)
+    # Ответ оборван: закрываем скобки, при неудаче откатываемся к предыдущей точке среза
+    data = _loads(_close(out, stack))
+    if data is not None:
+        return data
+    for pos, snapshot in reversed(cuts):
+        data = _loads(_close(out[:pos], snapshot))
+        if data is not None:
+            return data
+    return None
+
+
+def _as_text(x: Any) -> str:
+    if isinstance(x, str):
+        return x.strip()
+    if isinstance(x, dict):
+        for k in ("text", "title", "description", "item"):
+            if isinstance(x.get(k), str):
+                return x[k].strip()
+    return "" if x is None else str(x).strip()
+
+
+def _as_list(x: Any) -> List:
+    if x is None:
+        return []
+    if isinstance(x, list):
+        return x
+    return [x]
+
+
+def _first(data: Dict, *keys: str) -> Any:
+    for k in keys:
+        if k in data and data[k] not in (None, ""):
+            return data[k]
+    return None
+
+
+def coerce_to_schema(data: Any) -> Dict:
+    """Привести разобранный JSON к форме _schema() (типы, синонимы ключей)"""
+    if isinstance(data, list):
+        data = next((d for d in data if isinstance(d, dict)), {})
+    if not isinstance(data, dict):
+        return {"tldr": _as_text(data), "action_items": [], "decisions": [], "risks": []}
+    lowered = {str(k).strip().lower().replace(" ", "_"): v for k, v in data.items()}
+
+    tldr = _first(lowered, "tldr", "tl;dr", "summary", "резюме")
+    if isinstance(tldr, list):
+        tldr = " ".join(_as_text(t) for t in tldr)
+
+    items = []
+    for it in _as_list(_first(lowered, "action_items", "actions", "tasks", "задачи")):
+        if isinstance(it, dict):
+            text = _as_text(it)
+            owner = it.get("owner") or it.get("assignee") or it.get("responsible")
+            due = it.get("due") or it.get("deadline") or it.get("due_date")
+        else:
+            text, owner, due = _as_text(it), None, None
+        if text:
+            items.append({
+                "text": text,
+                "owner": _as_text(owner) or None,
+                "due": _as_text(due) or None,
+            })
+
+    def _strings(*keys: str) -> List[str]:
+        return [s for s in (_as_text(x) for x in _as_list(_first(lowered, *keys))) if s]
+
+    return {
+        "tldr": _as_text(tldr),
+        "action_items": items,
+        "decisions": _strings("decisions", "решения"),
+        "risks": _strings("risks", "риски"),
+    }
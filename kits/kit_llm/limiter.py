@@ -0,0 +1,334 @@
+"""
+Общий ограничитель запросов к LLM (OPENAI_BASE_URL) для всех воркеров и API.
+
+- не больше LLM_MAX_INFLIGHT одновременных запросов (аренда слота с истечением,
+  чтобы упавший процесс не держал слот вечно);
+- не больше LLM_TOKENS_PER_SEC токенов в секунду (token bucket; промпт списывается
+  при входе, ответ — по факту через charge(), бакет может уйти в минус);
+- интерактивные запросы (SSE) имеют приоритет: пока такой запрос ждёт,
+  пакетные (резюмирование в воркерах) новые слоты не получают;
+- повтор с экспоненциальной задержкой и джиттером на 429/5xx и сетевые ошибки.
+
+Состояние хранится в Redis (LLM_LIMITER=redis). Если Redis недоступен — временно
+работаем с локальным ограничителем процесса (LLM_LIMITER=local делает так всегда).
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, Optional
+
+from openai import APIConnectionError, APIStatusError
+
+from kits.kit_common import counters
+from kits.kit_common.config import settings
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+_POLL_SEC = 0.05
+_POLL_MAX_SEC = 0.25
+_WAITER_TTL_SEC = 2.0
+_REDIS_RETRY_SEC = 30.0
+
+_ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local interactive = ARGV[3] == 'interactive'
+if interactive then
+  redis.call('ZADD', KEYS[2], now + tonumber(ARGV[5]), ARGV[4])
+elseif redis.call('ZCARD', KEYS[2]) > 0 then
+  return 0
+end
+local max_inflight = tonumber(ARGV[6])
+if max_inflight > 0 and redis.call('ZCARD', KEYS[1]) >= max_inflight then
+  return 0
+end
+local rate = tonumber(ARGV[7])
+if rate > 0 then
+  local burst = tonumber(ARGV[8])
+  local b = redis.call('HMGET', KEYS[3], 'tokens', 'ts')
+  local tokens = tonumber(b[1]) or burst
+  local ts = tonumber(b[2]) or now
+  tokens = math.min(burst, tokens + (now - ts) * rate)
+  if tokens <= 0 then
+    redis.call('HSET', KEYS[3], 'tokens', tostring(tokens), 'ts', tostring(now))
+    return 0
+  end
+  redis.call('HSET', KEYS[3], 'tokens', tostring(tokens - tonumber(ARGV[9])), 'ts', tostring(now))
+  redis.call('EXPIRE', KEYS[3], 3600)
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+if interactive then
+  redis.call('ZREM', KEYS[2], ARGV[4])
+end
+return 1
+"""
+
+
+def _lease_sec() -> float:
+    return settings.LLM_HTTP_TIMEOUT_SEC + 60.0
+
+
+def _burst() -> float:
+    # Запас бакета — две секунды лимита (но не меньше одного запроса средних размеров)
+    return max(settings.LLM_TOKENS_PER_SEC * 2.0, 1024.0)
+
+
+class RedisLimiter:
+    def __init__(self, url: str, base_url: str):
+        from redis import Redis
+
+        self.redis = Redis.from_url(url, socket_connect_timeout=1.0, socket_timeout=2.0)
+        self._acquire = self.redis.register_script(_ACQUIRE_LUA)
+        prefix = "llm:limiter:" + hashlib.blake2b(base_url.encode(), digest_size=6).hexdigest()
+        self.keys = [f"{prefix}:slots", f"{prefix}:waiters", f"{prefix}:bucket"]
+
+    def try_acquire(self, lease_id: str, priority: str, cost: int) -> bool:
+        return bool(self._acquire(keys=self.keys, args=[
+            lease_id, _lease_sec(), priority, lease_id, _WAITER_TTL_SEC,
+            settings.LLM_MAX_INFLIGHT, settings.LLM_TOKENS_PER_SEC, _burst(), cost,
+        ]))
+
+    def release(self, lease_id: str):
+        self.redis.zrem(self.keys[0], lease_id)
+
+    def cancel(self, lease_id: str):
+        self.redis.zrem(self.keys[1], lease_id)
+
+    def charge(self, tokens: int):
+        if settings.LLM_TOKENS_PER_SEC > 0:
+            self.redis.hincrbyfloat(self.keys[2], "tokens", -float(tokens))
+
+
+class LocalLimiter:
+    """Та же логика в пределах процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.slots: Dict[str, float] = {}
+        self.waiters: Dict[str, float] = {}
+        self.tokens: Optional[float] = None
+        self.ts = time.monotonic()
+
+    def try_acquire(self, lease_id: str, priority: str, cost: int) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self.slots = {k: v for k, v in self.slots.items() if v > now}
+            self.waiters = {k: v for k, v in self.waiters.items() if v > now}
+            if priority == INTERACTIVE:
+                self.waiters[lease_id] = now + _WAITER_TTL_SEC
+            elif self.waiters:
+                return False
+            if 0 < settings.LLM_MAX_INFLIGHT <= len(self.slots):
+                return False
+            rate = settings.LLM_TOKENS_PER_SEC
+            if rate > 0:
+                tokens = _burst() if self.tokens is None else self.tokens
+                tokens = min(_burst(), tokens + (now - self.ts) * rate)
+                self.ts = now
+                self.tokens = tokens
+                if tokens <= 0:
+                    return False
+                self.tokens = tokens - cost
+            self.slots[lease_id] = now + _lease_sec()
+            self.waiters.pop(lease_id, None)
+            return True
+
+    def release(self, lease_id: str):
+        with self._lock:
+            self.slots.pop(lease_id, None)
+
+    def cancel(self, lease_id: str):
+        with self._lock:
+            self.waiters.pop(lease_id, None)
+
+    def charge(self, tokens: int):
+        if settings.LLM_TOKENS_PER_SEC > 0:
+            with self._lock:
+                self.tokens = (_burst() if self.tokens is None else self.tokens) - tokens
+
+
+_state: Dict = {"redis": None, "redis_key": None, "redis_down_until": 0.0, "local": LocalLimiter()}
+
+
+def _reset():
+    _state["redis"] = None
+    _state["redis_key"] = None
+    _state["redis_down_until"] = 0.0
+    _state["local"] = LocalLimiter()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset)
+
+
+def _backend():
+    mode = settings.LLM_LIMITER
+    if mode == "off":
+        return None
+    if mode == "redis" and time.monotonic() >= _state["redis_down_until"]:
+        key = (settings.REDIS_URL, settings.OPENAI_BASE_URL)
+        if _state["redis"] is None or _state["redis_key"] != key:
+            _state["redis"] = RedisLimiter(settings.REDIS_URL, settings.OPENAI_BASE_URL)
+            _state["redis_key"] = key
+        return _state["redis"]
+    return _state["local"]
+
+
+def _redis_down(e: Exception):
+    logger.warning(f"Ограничитель LLM: Redis недоступен ({e}), {_REDIS_RETRY_SEC:.0f} с работаем локально")
+    _state["redis_down_until"] = time.monotonic() + _REDIS_RETRY_SEC
+
+
+def _try_acquire(lease_id: str, priority: str, cost: int):
+    """Бэкенд, выдавший слот, или None — слот пока не получен"""
+    backend = _backend()
+    try:
+        return backend if backend.try_acquire(lease_id, priority, cost) else None
+    except Exception as e:
+        if not isinstance(backend, RedisLimiter):
+            raise
+        _redis_down(e)
+        local = _state["local"]
+        return local if local.try_acquire(lease_id, priority, cost) else None
+
+
+def _safe(fn: Callable, *args):
+    # Ошибки Redis при освобождении не критичны: аренда истечёт сама
+    try:
+        fn(*args)
+    except Exception as e:
+        logger.debug(f"Ограничитель LLM: {e}")
+
+
+def _report(wait: float, priority: str):
+    counters.incr("llm_queue_calls")
+    counters.incr("llm_queue_wait_ms", int(wait * 1000))
+    if wait >= 1.0:
+        logger.info(f"Запрос к LLM ({priority}) ждал в очереди {wait:.1f} с")
+    else:
+        logger.debug(f"Запрос к LLM ({priority}) ждал в очереди {wait:.3f} с")
+
+
+def _poll_delay(attempt: int) -> float:
+    return min(_POLL_MAX_SEC, _POLL_SEC * (1.5 ** attempt)) * random.uniform(0.5, 1.0)
+
+
+@contextmanager
+def slot(priority: str = BATCH, cost: int = 0):
+    """Занять слот (блокирующе). Отдаёт {"wait_sec": ...}"""
+    if _backend() is None:
+        yield {"wait_sec": 0.0}
+        return
+    lease_id = uuid.uuid4().hex
+    t0 = time.monotonic()
+    polls = 0
+    while True:
+        backend = _try_acquire(lease_id, priority, cost)
+        if backend is not None:
+            break
+        time.sleep(_poll_delay(polls))
+        polls += 1
+    wait = time.monotonic() - t0
+    _report(wait, priority)
+    try:
+        yield {"wait_sec": wait}
+    finally:
+        _safe(backend.release, lease_id)
+
+
+@asynccontextmanager
+async def aslot(priority: str = INTERACTIVE, cost: int = 0):
+    """То же для event loop: ожидание не занимает поток"""
+    if _backend() is None:
+        yield {"wait_sec": 0.0}
+        return
+    lease_id = uuid.uuid4().hex
+    t0 = time.monotonic()
+    polls = 0
+    try:
+        while True:
+            backend = await asyncio.to_thread(_try_acquire, lease_id, priority, cost)
+            if backend is not None:
+                break
+            await asyncio.sleep(_poll_delay(polls))
+            polls += 1
+    except asyncio.CancelledError:
+        # Клиент ушёл, пока ждали: снимаем заявку интерактивного приоритета
+        backend = _backend()
+        if backend is not None:
+            _safe(backend.cancel, lease_id)
+        raise
+    wait = time.monotonic() - t0
+    await asyncio.to_thread(_report, wait, priority)
+    try:
+        yield {"wait_sec": wait}
+    finally:
+        await asyncio.to_thread(_safe, backend.release, lease_id)
+
+
+def charge(tokens: int):
+    """Списать из бакета фактически сгенерированные токены"""
+    backend = _backend()
+    if backend is not None and tokens > 0:
+        _safe(backend.charge, tokens)
+
+
+def retry_delay(exc: Exception, attempt: int) -> Optional[float]:
+    """Сколько ждать перед повтором, или None — не повторять (не та ошибка или попытки кончились)"""
+    if attempt >= settings.LLM_RETRIES:
+        return None
+    if isinstance(exc, APIStatusError):
+        if exc.status_code != 429 and exc.status_code < 500:
+            return None
+    elif not isinstance(exc, APIConnectionError):
+        return None
+    # Full jitter: случайно в [0, min(max, base * 2^attempt)], но не меньше Retry-After
+    delay = random.uniform(0, min(settings.LLM_RETRY_MAX_SEC, settings.LLM_RETRY_BASE_SEC * (2 ** attempt)))
+    response = getattr(exc, "response", None)
+    try:
+        retry_after = float(response.headers.get("retry-after")) if response is not None else None
+    except (TypeError, ValueError):
+        retry_after = None
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, settings.LLM_RETRY_MAX_SEC))
+    counters.incr("llm_retries")
+    return delay
+
+
+def call(fn: Callable, priority: str = BATCH, cost: int = 0):
+    """Выполнить запрос под ограничителем; на 429/5xx — повтор с задержкой (слот на время паузы отпускается)"""
+    attempt = 0
+    while True:
+        with slot(priority, cost):
+            try:
+                return fn()
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                logger.warning(f"LLM ответил ошибкой ({e.__class__.__name__}), повтор через {delay:.1f} с")
+        time.sleep(delay)
+        attempt += 1
+
+
+def stats() -> Dict:
+    c = counters.snapshot("llm_")
+    calls = c.get("llm_queue_calls", 0)
+    return {
+        "calls": calls,
+        "avg_wait_ms": round(c.get("llm_queue_wait_ms", 0) / calls, 1) if calls else 0,
+        "retries": c.get("llm_retries", 0),
+    }
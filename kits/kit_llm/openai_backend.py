@@ -1,22 +1,189 @@
-from typing import Dict, Generator, List
+from typing import AsyncGenerator, Dict, Generator, List, Tuple
+import asyncio
 import json
-from openai import OpenAI, BadRequestError
+import logging
+import math
+import os
+import re
+import threading
+import time
+import weakref
+from openai import (
+    AsyncOpenAI,
+    BadRequestError,
+    DEFAULT_CONNECTION_LIMITS,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    OpenAI,
+    Timeout,
+)
+from openai.types.chat import ChatCompletion
+from kits.kit_common import counters, progress, timing
 from kits.kit_common.config import settings
-from .token_utils import count_tokens_messages, count_tokens_text
+from . import compaction, json_repair, limiter, response_cache
+from .partial_json import SummaryStreamParser
+from .token_utils import count_tokens_json, count_tokens_messages, count_tokens_text
 from .chunking import segments_to_lines, chunk_by_token_budget
 
+logger = logging.getLogger(__name__)
+
+
+# Один клиент (и пул HTTP-соединений с keep-alive) на процесс; async-клиент — на event loop,
+# т.к. пул httpx.AsyncClient привязан к циклу, в котором открыты соединения.
+_Limits = type(DEFAULT_CONNECTION_LIMITS)  # Limits той HTTP-библиотеки, которую использует openai
+_client_lock = threading.Lock()
+_shared: Dict = {"key": None, "client": None}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+
+
+def _client_key() -> tuple:
+    return (
+        settings.OPENAI_BASE_URL,
+        settings.OPENAI_API_KEY,
+        settings.LLM_HTTP_POOL_SIZE,
+        settings.LLM_HTTP_KEEPALIVE_SEC,
+        settings.LLM_HTTP_TIMEOUT_SEC,
+        settings.LLM_HTTP_CONNECT_TIMEOUT_SEC,
+    )
+
+
+def _http_options() -> Dict:
+    pool = max(1, settings.LLM_HTTP_POOL_SIZE)
+    return {
+        "limits": _Limits(
+            max_connections=pool,
+            max_keepalive_connections=pool,
+            keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_SEC,
+        ),
+        "timeout": Timeout(settings.LLM_HTTP_TIMEOUT_SEC, connect=settings.LLM_HTTP_CONNECT_TIMEOUT_SEC),
+    }
+
 
 def _client() -> OpenAI:
-    return OpenAI(base_url=settings.OPENAI_BASE_URL, api_key=settings.OPENAI_API_KEY)
+    """Общий клиент процесса; потокобезопасен, используется и из пула map-reduce"""
+    key = _client_key()
+    client = _shared["client"]
+    if client is not None and _shared["key"] == key:
+        return client
+    with _client_lock:
+        if _shared["client"] is None or _shared["key"] != key:
+            opts = _http_options()
+            _shared["client"] = OpenAI(
+                base_url=settings.OPENAI_BASE_URL,
+                api_key=settings.OPENAI_API_KEY,
+                timeout=opts["timeout"],
+                max_retries=0,  # повторы делает limiter (с джиттером и с учётом общей очереди)
+                http_client=DefaultHttpxClient(**opts),
+            )
+            _shared["key"] = key
+        return _shared["client"]
+
+
+def _async_client() -> AsyncOpenAI:
+    """Async-клиент текущего event loop (для SSE и конкурентных запросов без потоков)"""
+    loop = asyncio.get_running_loop()
+    key = _client_key()
+    with _client_lock:
+        entry = _async_clients.get(loop)
+        if entry is None or entry[0] != key:
+            opts = _http_options()
+            client = AsyncOpenAI(
+                base_url=settings.OPENAI_BASE_URL,
+                api_key=settings.OPENAI_API_KEY,
+                timeout=opts["timeout"],
+                max_retries=0,
+                http_client=DefaultAsyncHttpxClient(**opts),
+            )
+            entry = (key, client)
+            _async_clients[loop] = entry
+        return entry[1]
+
+
+def _reset_clients():
+    # После fork (RQ запускает задачу в дочернем процессе) сокеты родителя использовать нельзя
+    global _client_lock
+    _client_lock = threading.Lock()
+    _shared["client"] = None
+    _shared["key"] = None
+    _async_clients.clear()
+
 
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_clients)
 
-def _build_messages_for_summary(chunks: List[str]) -> List[Dict[str, str]]:
+
+def _cache_params(kwargs: Dict) -> Dict:
+    params = {k: kwargs.get(k) for k in ("model", "messages", "temperature", "max_tokens", "response_format")}
+    # Одно имя модели на разных бэкендах — разные модели (как префикс ключей limiter)
+    params["base_url"] = settings.OPENAI_BASE_URL
+    return params
+
+
+def _limited_create(client: OpenAI, priority: str, kwargs: Dict):
+    # Общая очередь к LLM: слот, лимит токенов/с, повторы на 429/5xx
+    cost = count_tokens_messages(kwargs.get("messages") or [])
+    with timing.span("llm", metric="llm_request"):
+        resp = limiter.call(lambda: client.chat.completions.create(**kwargs), priority=priority, cost=cost)
+        try:
+            timing.add_tokens(resp.usage.prompt_tokens, resp.usage.completion_tokens)  # type: ignore[union-attr]
+            limiter.charge(int(resp.usage.completion_tokens))  # type: ignore[union-attr]
+        except Exception:
+            pass
+    return resp
+
+
+def _chat_create(client: OpenAI, priority: str = limiter.BATCH, **kwargs):
+    """client.chat.completions.create через кэш ответов: одинаковый запрос не идёт в модель"""
+    if not settings.LLM_CACHE:
+        return _limited_create(client, priority, kwargs)
+    key = response_cache.cache_key(_cache_params(kwargs))
+    cached = response_cache.get(key)
+    if cached is not None:
+        try:
+            resp = ChatCompletion.model_validate_json(cached)
+            resp.usage = None  # токены на этот ответ уже не тратились
+            return resp
+        except ValueError:
+            pass
+    resp = _limited_create(client, priority, kwargs)
+    if isinstance(resp, ChatCompletion):
+        response_cache.put(key, resp.model_dump_json())
+    return resp
+
+
+def split_cached_text(text: str) -> List[str]:
+    # Отдаём кэшированный стрим по словам, чтобы клиент SSE видел обычный поток токенов
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def _transcript_prompt(transcript: dict) -> Dict:
+    """Строки стенограммы для промпта: сжатые (алиасы, без слов-паразитов и повторов)
+    или как есть, если LLM_COMPACT_TRANSCRIPT выключен"""
+    segments = transcript.get("segments", []) or []
+    if not settings.LLM_COMPACT_TRANSCRIPT:
+        return {"legend": "", "lines": segments_to_lines(segments), "aliases": {}}
+    return compaction.compact_transcript(segments)
+
+
+def _finish_summary(data: Dict, prompt: Dict) -> Dict:
+    # Алиасы [S1], [S2]... обратно в имена участников + отчёт о сэкономленных токенах
+    data = compaction.restore_aliases(data, prompt.get("aliases") or {})
+    if isinstance(data, dict) and "tokens_before" in prompt:
+        data["_compaction"] = {
+            "tokens_before": prompt["tokens_before"],
+            "tokens_after": prompt["tokens_after"],
+            "tokens_saved": prompt["tokens_before"] - prompt["tokens_after"],
+        }
+    return data
+
+
+def _build_messages_for_summary(chunks: List[str], legend: str = "") -> List[Dict[str, str]]:
     sys = (
         "Ты эксперт по анализу и резюмированию встреч. Извлеки краткое резюме (5-7 предложений), "
         "пункты действий (с необязательным ответственным и сроком), решения и риски. "
         "Отвечай ТОЛЬКО на русском языке. "
         "Верни JSON поля: tldr, action_items[{text, owner, due}], decisions[], risks[]."
-    )
+    ) + compaction.legend_instruction(legend)
     # Assemble a single prompt from chunks
     content = "\n\n".join(chunks)
     return [
@@ -25,17 +192,15 @@ def _build_messages_for_summary(chunks: List[str]) -> List[Dict[str, str]]:
     ]
 
 
-def summarize_transcript(transcript: dict) -> dict:
+def summarize_transcript(transcript: dict, prompt: Dict | None = None) -> dict:
     # Simple strategy: single pass; callers can pre-chunk if needed
-    text = []
-    for seg in transcript.get("segments", []) or []:
-        sp = seg.get("speaker", "Участник")
-        tx = seg.get("text", "")
-        text.append(f"{sp}: {tx}")
-    joined = "\n".join(text)
-    msgs = _build_messages_for_summary([joined])
+    prompt = prompt or _transcript_prompt(transcript)
+    joined = "\n".join(prompt["lines"])
+    msgs = _build_messages_for_summary([joined], prompt["legend"])
     client = _client()
-    resp = client.chat.completions.create(
+    progress.report("summarize", 0, 1, "chunks")
+    resp = _chat_create(
+        client,
         model=settings.LLM_MODEL,
         messages=msgs,
         temperature=settings.LLM_TEMPERATURE,
@@ -67,16 +232,15 @@ def summarize_transcript(transcript: dict) -> dict:
         },
     )
     out = resp.choices[0].message.content or "{}"
-    try:
-        data = json.loads(out)
-    except Exception:
-        data = {"tldr": out}
+    # Однопроходная сводка без лишнего запроса: нераспознанный ответ — целиком в tldr, как раньше
+    data = _parse_summary_json(out, llm_fallback=False)
     # Best-effort token usage
     try:
         data["_tokens_used"] = resp.usage.total_tokens  # type: ignore[attr-defined]
     except Exception:
         pass
-    return data
+    progress.report("summarize", 1, 1, "chunks")
+    return _finish_summary(data, prompt)
 
 
 def _schema() -> Dict:
@@ -101,38 +265,83 @@ def _schema() -> Dict:
     }
 
 
-def summarize_transcript_iterative(transcript: dict) -> dict:
+def _request_summary_json(client: OpenAI, msgs: List[Dict[str, str]], schema: Dict | None = None, usage: List[int] | None = None) -> Dict:
+    """Запрос сводки в JSON по схеме; если бэкенд не принимает json_schema — json_object.
+    Токены ответа (если бэкенд их сообщает) добавляются в usage.
+    """
+    schema = schema or _schema()
+    try:
+        resp = _chat_create(
+            client,
+            model=settings.LLM_MODEL,
+            messages=msgs,
+            temperature=settings.LLM_TEMPERATURE,
+            max_tokens=settings.LLM_MAX_TOKENS,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": "meeting_summary", "schema": schema},
+            },
+        )
+    except BadRequestError:
+        # Try looser format if backend rejects json_schema
+        resp = _chat_create(
+            client,
+            model=settings.LLM_MODEL,
+            messages=msgs + [{"role": "system", "content": "Верни ТОЛЬКО валидный JSON без пояснений."}],
+            temperature=settings.LLM_TEMPERATURE,
+            max_tokens=settings.LLM_MAX_TOKENS,
+            response_format={"type": "json_object"},
+        )
+    if usage is not None:
+        try:
+            usage.append(int(resp.usage.total_tokens))  # type: ignore[attr-defined]
+        except Exception:
+            pass
+
+    txt = resp.choices[0].message.content or "{}"
+    return _parse_summary_json(txt)
+
+
+def summarize_transcript_iterative(transcript: dict, prompt: Dict | None = None) -> dict:
     # Map -> Reduce with rolling JSON state
-    lines = segments_to_lines(transcript.get("segments", []) or [])
+    prompt = prompt or _transcript_prompt(transcript)
+    lines = prompt["lines"]
 
-    # Budgets: keep chunks well below LLM_MAX_TOKENS to leave room for state/system
-    # Estimate dynamic budget: ~70% of LLM_MAX_TOKENS minus current state
     def build_system_prompt() -> str:
         return (
             "Ты эксперт по анализу и резюмированию встреч. Тебе даются: "
             "1) текущее состояние сводки (JSON по схеме), 2) новая часть стенограммы. "
             "Обнови и верни ПОЛНЫЙ JSON по схеме: tldr, action_items[{text, owner, due}], decisions[], risks[]. "
             "Отвечай ТОЛЬКО валидным JSON и ТОЛЬКО на русском языке."
-        )
+        ) + compaction.legend_instruction(prompt["legend"])
 
     state: Dict = {"tldr": "", "action_items": [], "decisions": [], "risks": []}
     system_prompt = build_system_prompt()
 
-    # Start with conservative chunk budget
-    base_budget = max(256, int(settings.LLM_MAX_TOKENS * 0.7))
-
-    chunks: List[str] = []
-    # Initial overhead estimate (system + empty state)
-    overhead = count_tokens_text(system_prompt) + count_tokens_text(json.dumps(state, ensure_ascii=False)) + 64
-    chunk_budget = max(128, base_budget - overhead)
-    chunks = chunk_by_token_budget(lines, chunk_budget)
+    # Тот же размер части, что в map-reduce и в оценке choose_summary_strategy;
+    # место под растущее состояние заложено в _map_budget()
+    chunks = chunk_by_token_budget(lines, _map_budget())
+    input_budget = _input_budget()
+    system_tokens = count_tokens_text(system_prompt)
 
     client = _client()
     schema = _schema()
-
-    for idx, chunk in enumerate(chunks):
-        # Recompute dynamic budget as state grows for safety (no direct use here, but we can rebuild system if needed)
-        overhead = count_tokens_text(system_prompt) + count_tokens_text(json.dumps(state, ensure_ascii=False)) + 64
+    # Части + финальный проход «причесать» сводку
+    total = len(chunks) + 1
+    progress.report("summarize", 0, total, "chunks")
+
+    done = 0
+    while chunks:
+        chunk = chunks.pop(0)
+        # Состояние растёт с каждой частью; если оно переросло запас в _map_budget(),
+        # часть режется мельче. count_tokens_json досчитывает только новые элементы состояния
+        room = input_budget - system_tokens - count_tokens_json(state) - 64
+        if count_tokens_text(chunk) > room and "\n" in chunk:
+            parts = chunk_by_token_budget(chunk.split("\n"), max(128, room))
+            if len(parts) > 1:
+                chunks[:0] = parts
+                total += len(parts) - 1
+                continue
         # Build messages
         msgs = [
             {"role": "system", "content": system_prompt},
@@ -140,34 +349,11 @@ def summarize_transcript_iterative(transcript: dict) -> dict:
             {"role": "user", "content": f"Новая часть стенограммы:\n{chunk}"},
         ]
 
-        try:
-            resp = client.chat.completions.create(
-                model=settings.LLM_MODEL,
-                messages=msgs,
-                temperature=settings.LLM_TEMPERATURE,
-                max_tokens=settings.LLM_MAX_TOKENS,
-                response_format={
-                    "type": "json_schema",
-                    "json_schema": {"name": "meeting_summary", "schema": schema},
-                },
-            )
-        except BadRequestError:
-            # Try looser format if backend rejects json_schema
-            resp = client.chat.completions.create(
-                model=settings.LLM_MODEL,
-                messages=msgs + [{"role": "system", "content": "Верни ТОЛЬКО валидный JSON без пояснений."}],
-                temperature=settings.LLM_TEMPERATURE,
-                max_tokens=settings.LLM_MAX_TOKENS,
-                response_format={"type": "json_object"},
-            )
-
-        txt = resp.choices[0].message.content or "{}"
-        try:
-            new_state = json.loads(txt)
-        except Exception:
-            new_state = _format_text_to_json(txt)
+        new_state = _request_summary_json(client, msgs, schema)
         if isinstance(new_state, dict):
             state = _merge_states(state, new_state)
+        done += 1
+        progress.report("summarize", done, total, "chunks")
 
     # Optional small refine pass: ask to tidy the JSON
     try:
@@ -178,7 +364,8 @@ def summarize_transcript_iterative(transcript: dict) -> dict:
             )},
             {"role": "user", "content": json.dumps(state, ensure_ascii=False)},
         ]
-        resp = client.chat.completions.create(
+        resp = _chat_create(
+            client,
             model=settings.LLM_MODEL,
             messages=refine_msgs,
             temperature=settings.LLM_TEMPERATURE,
@@ -186,16 +373,208 @@ def summarize_transcript_iterative(transcript: dict) -> dict:
             response_format={"type": "json_object"},
         )
         txt = resp.choices[0].message.content or "{}"
-        try:
-            new_state = json.loads(txt)
-        except Exception:
-            new_state = _format_text_to_json(txt)
+        new_state = _parse_summary_json(txt)
         if isinstance(new_state, dict):
             state = _merge_states(state, new_state)
     except Exception:
         pass
+    progress.report("summarize", total, total, "chunks")
+
+    return _finish_summary(_sanitize_state(state), prompt)
+
+
+def _map_messages(chunk: str, index: int, total: int, legend: str = "") -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": (
+            "Ты эксперт по анализу и резюмированию встреч. Тебе дана одна часть стенограммы "
+            f"(часть {index + 1} из {total}). Извлеки из неё JSON по схеме: "
+            "tldr (2-3 предложения об этой части), action_items[{text, owner, due}], decisions[], risks[]. "
+            "Не выдумывай то, чего нет в тексте. Отвечай ТОЛЬКО валидным JSON и ТОЛЬКО на русском языке."
+        ) + compaction.legend_instruction(legend)},
+        {"role": "user", "content": chunk},
+    ]
+
+
+def _map_chunk(client: OpenAI, chunk: str, index: int, total: int, usage: List[int], legend: str = "") -> Dict:
+    msgs = _map_messages(chunk, index, total, legend)
+    data = _request_summary_json(client, msgs, usage=usage)
+    return data if isinstance(data, dict) else {}
+
+
+def _reduce_group(client: OpenAI, states: List[Dict], usage: List[int]) -> Dict:
+    if len(states) == 1:
+        return states[0]
+    parts = "\n\n".join(
+        f"Сводка части {i + 1}:\n{json.dumps(st, ensure_ascii=False)}" for i, st in enumerate(states)
+    )
+    msgs = [
+        {"role": "system", "content": (
+            "Ты эксперт по анализу и резюмированию встреч. Тебе даны сводки последовательных частей "
+            "одной встречи (JSON). Объедини их в одну сводку по той же схеме: tldr (5-7 предложений), "
+            "action_items[{text, owner, due}], decisions[], risks[]. Убери дубликаты, сохрани ответственных и сроки. "
+            "Отвечай ТОЛЬКО валидным JSON и ТОЛЬКО на русском языке."
+        )},
+        {"role": "user", "content": parts},
+    ]
+    try:
+        data = _request_summary_json(client, msgs, usage=usage)
+        if isinstance(data, dict) and data:
+            return data
+    except Exception:
+        pass
+    # Локальное слияние, если модель не справилась
+    merged: Dict = {"tldr": "", "action_items": [], "decisions": [], "risks": []}
+    for st in states:
+        merged = _merge_states(merged, st)
+    merged["tldr"] = " ".join((st.get("tldr") or "").strip() for st in states).strip()
+    return merged
+
+
+def _input_budget(context_tokens: int | None = None) -> int:
+    """Токенов на вход запроса: контекст минус место под ответ (не больше половины контекста)"""
+    ctx = context_budget() if context_tokens is None else context_tokens
+    return ctx - min(settings.LLM_MAX_TOKENS, ctx // 2)
+
+
+def _map_budget(context_tokens: int | None = None) -> int:
+    """Токенов стенограммы в одной части — единое правило для map-reduce, iterative,
+    потоковой сводки и выбора стратегии. Кроме части во входе запроса системный
+    промпт с легендой участников и (в iterative) накопленное состояние сводки:
+    под них четверть входа, но не меньше 256 токенов."""
+    available = _input_budget(context_tokens)
+    return max(128, available - max(256, available // 4))
+
+
+def _reduce_tree(ex, client: OpenAI, states: List[Dict], usage: List[int]) -> Dict:
+    fanin = max(2, settings.LLM_REDUCE_FANIN)
+    while len(states) > 1:
+        groups = [states[i:i + fanin] for i in range(0, len(states), fanin)]
+        states = list(ex.map(timing.bind(lambda g: _reduce_group(client, g, usage)), groups))
+    return states[0]
+
+
+def summarize_transcript_mapreduce(transcript: dict, prompt: Dict | None = None) -> dict:
+    """Map -> иерархический Reduce: части резюмируются параллельно (не более LLM_CONCURRENCY
+    запросов одновременно), затем сводки объединяются группами по LLM_REDUCE_FANIN.
+    Время ~ ceil(частей / concurrency) + log(частей) запросов вместо числа частей.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    prompt = prompt or _transcript_prompt(transcript)
+    chunks = chunk_by_token_budget(prompt["lines"], _map_budget())
+    if not chunks:
+        return _sanitize_state({})
+
+    client = _client()
+    usage: List[int] = []
+    # Части map + reduce одной единицей
+    total = len(chunks) + 1
+    done = [0]
+    done_lock = threading.Lock()
+
+    def map_one(ic):
+        state = _map_chunk(client, ic[1], ic[0], len(chunks), usage, prompt["legend"])
+        with done_lock:
+            done[0] += 1
+            progress.report("summarize", done[0], total, "chunks")
+        return state
+
+    progress.report("summarize", 0, total, "chunks")
+    with ThreadPoolExecutor(max_workers=max(1, settings.LLM_CONCURRENCY)) as ex:
+        states = list(ex.map(timing.bind(map_one), enumerate(chunks)))
+        state = _reduce_tree(ex, client, states, usage)
+    progress.report("summarize", total, total, "chunks")
+
+    out = _sanitize_state(state)
+    if usage:
+        out["_tokens_used"] = sum(usage)
+    return _finish_summary(out, prompt)
+
+
+def map_segments(segments: List[Dict], index: int, total: int, usage: List[int]) -> Dict:
+    """Map для куска стенограммы (окна ASR): сводки его частей с уже восстановленными
+    именами участников — алиасы у каждого куска свои"""
+    prompt = _transcript_prompt({"segments": segments})
+    client = _client()
+    states = []
+    for chunk in chunk_by_token_budget(prompt["lines"], _map_budget()):
+        state = _map_chunk(client, chunk, index, total, usage, prompt["legend"])
+        states.append(compaction.restore_aliases(state, prompt.get("aliases") or {}))
+    return {
+        "states": states,
+        "tokens_before": prompt.get("tokens_before"),
+        "tokens_after": prompt.get("tokens_after"),
+    }
 
-    return _sanitize_state(state)
+
+def reduce_states(states: List[Dict], usage: List[int]) -> dict:
+    """Reduce готовых частичных сводок (деревом, как в map-reduce)"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not states:
+        return _sanitize_state({})
+    with ThreadPoolExecutor(max_workers=max(1, settings.LLM_CONCURRENCY)) as ex:
+        state = _reduce_tree(ex, _client(), states, usage)
+    out = _sanitize_state(state)
+    if usage:
+        out["_tokens_used"] = sum(usage)
+    return out
+
+
+def context_budget(model: str | None = None) -> int:
+    """Размер контекста модели: LLM_CONTEXT_BUDGETS ("модель=токены,...") или LLM_CONTEXT_TOKENS"""
+    model = model or settings.LLM_MODEL
+    for item in (settings.LLM_CONTEXT_BUDGETS or "").split(","):
+        name, _, value = item.strip().rpartition("=")
+        if name.strip() == model:
+            try:
+                return int(value)
+            except ValueError:
+                break
+    return settings.LLM_CONTEXT_TOKENS
+
+
+def choose_summary_strategy(prompt_tokens: int, context_tokens: int, chunks: int | None = None) -> str:
+    """single — всё помещается в один запрос; iterative — немного частей с накопительным
+    состоянием; map_reduce — много частей, параллельно и деревом.
+    chunks — число частей, на которое стенограмму разрежет исполнитель; без него — оценка
+    по тому же _map_budget()."""
+    if prompt_tokens <= _input_budget(context_tokens):
+        return "single"
+    if chunks is None:
+        chunks = math.ceil(prompt_tokens / _map_budget(context_tokens))
+    if chunks <= settings.LLM_ITERATIVE_MAX_CHUNKS:
+        return "iterative"
+    return "map_reduce"
+
+
+def summarize_auto(transcript: dict) -> dict:
+    """Выбрать стратегию резюмирования по размеру стенограммы и контексту модели"""
+    prompt = _transcript_prompt(transcript)
+    prompt_tokens = count_tokens_messages(_build_messages_for_summary(["\n".join(prompt["lines"])], prompt["legend"]))
+    ctx = context_budget()
+    chunks = None
+    if prompt_tokens > _input_budget(ctx):
+        # Число частей, которое получит исполнитель (тот же _map_budget); оценка по токенам
+        # не даёт занизить его, если сжатие склеило длинный монолог в одну строку
+        budget = _map_budget(ctx)
+        chunks = max(len(chunk_by_token_budget(prompt["lines"], budget)), math.ceil(prompt_tokens / budget))
+    strategy = choose_summary_strategy(prompt_tokens, ctx, chunks)
+    logger.info(f"Резюмирование: стратегия={strategy}, токенов в промпте={prompt_tokens}, частей={chunks or 1}, контекст={ctx}")
+    if "tokens_before" in prompt:
+        logger.info(f"Сжатие стенограммы: {prompt['tokens_before']} -> {prompt['tokens_after']} токенов")
+
+    if strategy == "single":
+        out = summarize_transcript(transcript, prompt=prompt)
+    elif strategy == "iterative":
+        out = summarize_transcript_iterative(transcript, prompt=prompt)
+    else:
+        out = summarize_transcript_mapreduce(transcript, prompt=prompt)
+    out = dict(out)
+    out["_strategy"] = strategy
+    out["_prompt_tokens"] = prompt_tokens
+    out["_context_tokens"] = ctx
+    return out
 
 
 def _merge_states(a: Dict, b: Dict) -> Dict:
@@ -238,8 +617,33 @@ def _merge_states(a: Dict, b: Dict) -> Dict:
     }
 
 
+def _parse_summary_json(text: str, llm_fallback: bool = True) -> Dict:
+    """Строгий JSON -> локальный ремонт -> (в крайнем случае) переформатирование моделью.
+    llm_fallback=False — без дополнительного запроса: текст ответа становится tldr.
+    Какой путь сработал — в счётчиках llm_json_* (/metrics).
+    """
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            counters.incr("llm_json_strict")
+            return data
+    except ValueError:
+        data = None
+    if data is None:
+        data = json_repair.repair_json(text)
+    if data is not None:
+        counters.incr("llm_json_local_repair")
+        return json_repair.coerce_to_schema(data)
+    if not llm_fallback:
+        counters.incr("llm_json_as_text")
+        return {"tldr": text}
+    counters.incr("llm_json_llm_repair")
+    return _format_text_to_json(text)
+
+
 def _format_text_to_json(text: str) -> Dict:
     """Best-effort conversion of free-form text into our JSON schema using the same model.
+    Last resort after local repair (see _parse_summary_json).
     If model still returns non-JSON, fallback to minimal JSON with tldr trimmed.
     """
     client = _client()
@@ -253,7 +657,8 @@ def _format_text_to_json(text: str) -> Dict:
         {"role": "user", "content": text},
     ]
     try:
-        resp = client.chat.completions.create(
+        resp = _chat_create(
+            client,
             model=settings.LLM_MODEL,
             messages=msgs,
             temperature=settings.LLM_TEMPERATURE,
@@ -261,7 +666,9 @@ def _format_text_to_json(text: str) -> Dict:
             response_format={"type": "json_object"},
         )
         out = resp.choices[0].message.content or "{}"
-        return json.loads(out)
+        data = json_repair.repair_json(out)
+        if data is not None:
+            return json_repair.coerce_to_schema(data)
     except Exception:
         pass
 
@@ -305,27 +712,156 @@ def _limit_sentences(text: str, max_sentences: int = 7) -> str:
     return " ".join(parts[:max_sentences])
 
 
-def stream_tldr(transcript: dict) -> Generator[str, None, None]:
-    # Stream only TL;DR tokens
-    text = []
-    for seg in transcript.get("segments", []) or []:
-        sp = seg.get("speaker", "Участник")
-        tx = seg.get("text", "")
-        text.append(f"{sp}: {tx}")
-    joined = "\n".join(text)
+def _tldr_messages(transcript: dict) -> List[Dict[str, str]]:
+    segments = transcript.get("segments", []) or []
+    if settings.LLM_COMPACT_TRANSCRIPT:
+        # Без алиасов: потоковый ответ уже не поправить после генерации
+        lines = compaction.compact_transcript(segments, use_aliases=False)["lines"]
+    else:
+        lines = [f"{seg.get('speaker', 'Участник')}: {seg.get('text', '')}" for seg in segments]
+    joined = "\n".join(lines)
 
     system = "Ты эксперт по анализу и резюмированию встреч. Отвечай ТОЛЬКО на русском языке. Верни только краткое резюме (TL;DR) текста."
-    msgs = [
+    return [
         {"role": "system", "content": system},
         {"role": "user", "content": joined},
     ]
+
+
+def _tldr_request(transcript: dict) -> Dict:
+    return {
+        "model": settings.LLM_MODEL,
+        "messages": _tldr_messages(transcript),
+        "temperature": settings.LLM_TEMPERATURE,
+        "max_tokens": settings.LLM_MAX_TOKENS,
+    }
+
+
+def stream_tldr(transcript: dict) -> Generator[str, None, None]:
+    # Stream only TL;DR tokens
+    request = _tldr_request(transcript)
+    key = response_cache.cache_key({**_cache_params(request), "stream": True})
+    cached = response_cache.get(key)
+    if cached is not None:
+        yield from split_cached_text(cached)
+        return
     client = _client()
-    with client.chat.completions.stream(
-        model=settings.LLM_MODEL,
-        messages=msgs,
-        temperature=settings.LLM_TEMPERATURE,
-        max_tokens=settings.LLM_MAX_TOKENS,
-    ) as stream:
-        for event in stream:
-            if event.type == "token":
-                yield event.token
+    parts: List[str] = []
+    with limiter.slot(limiter.INTERACTIVE, count_tokens_messages(request["messages"])):
+        with client.chat.completions.stream(**request) as stream:
+            for event in stream:
+                if event.type == "token":
+                    parts.append(event.token)
+                    yield event.token
+    limiter.charge(count_tokens_text("".join(parts)))
+    response_cache.put(key, "".join(parts))
+
+
+async def _astream_chat(request: Dict, priority: str = limiter.INTERACTIVE) -> AsyncGenerator[str, None]:
+    """Стрим текста ответа через async-клиент под общим ограничителем (повтор на 429/5xx)"""
+    client = _async_client()
+    cost = count_tokens_messages(request["messages"])
+    attempt = 0
+    while True:
+        # Интерактивный приоритет: пакетные запросы воркеров пропускают SSE вперёд
+        async with limiter.aslot(priority, cost):
+            try:
+                stream = await client.chat.completions.create(**request, stream=True)
+            except Exception as e:
+                delay = limiter.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                produced = 0
+                t0 = time.perf_counter()
+                try:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            text = chunk.choices[0].delta.content
+                            produced += count_tokens_text(text)
+                            yield text
+                finally:
+                    await stream.close()
+                    await asyncio.to_thread(limiter.charge, produced)
+                    # Время стрима от первого запроса до конца ответа (гистограмма /metrics)
+                    await asyncio.to_thread(timing.observe, "llm_stream", time.perf_counter() - t0)
+                return
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def astream_tldr(transcript: dict, use_cache: bool = True) -> AsyncGenerator[str, None]:
+    """То же, что stream_tldr, но без потока на соединение — для SSE в API.
+    use_cache=False — сгенерировать заново (ответ всё равно запишется в кэш).
+    """
+    request = _tldr_request(transcript)
+    key = response_cache.cache_key({**_cache_params(request), "stream": True})
+    cached = await asyncio.to_thread(response_cache.get, key) if use_cache else None
+    if cached is not None:
+        for token in split_cached_text(cached):
+            yield token
+        return
+    parts: List[str] = []
+    async for token in _astream_chat(request):
+        parts.append(token)
+        yield token
+    # Только полный ответ: оборванный клиентом стрим не кэшируем
+    await asyncio.to_thread(response_cache.put, key, "".join(parts))
+
+
+def _restore_event(kind: str, data, aliases: Dict[str, str]):
+    if not aliases:
+        return data
+    if kind == "action_item":
+        return compaction.restore_aliases({"action_items": [data]}, aliases)["action_items"][0]
+    if kind == "tldr":
+        return compaction.restore_aliases({"tldr": data}, aliases)["tldr"]
+    return compaction.restore_aliases({"decisions": [data]}, aliases)["decisions"][0]
+
+
+async def astream_summary(transcript: dict) -> AsyncGenerator[Tuple[str, object], None]:
+    """Сводка meeting_summary по мере генерации: события tldr / action_item / decision / risk
+    сразу, как только элемент дописан моделью, в конце — summary (итоговый JSON).
+    Длинная стенограмма идёт частями (как map в map-reduce), события приходят по каждой части.
+    """
+    prompt = _transcript_prompt(transcript)
+    aliases = prompt.get("aliases") or {}
+    joined = "\n".join(prompt["lines"])
+    msgs = _build_messages_for_summary([joined], prompt["legend"])
+    if choose_summary_strategy(count_tokens_messages(msgs), context_budget()) == "single":
+        requests = [msgs]
+    else:
+        chunks = chunk_by_token_budget(prompt["lines"], _map_budget())
+        requests = [_map_messages(c, i, len(chunks), prompt["legend"]) for i, c in enumerate(chunks)]
+
+    formats = [
+        {"type": "json_schema", "json_schema": {"name": "meeting_summary", "schema": _schema()}},
+        {"type": "json_object"},
+    ]
+    states: List[Dict] = []
+    for msgs in requests:
+        parser = SummaryStreamParser()
+        for i, fmt in enumerate(formats):
+            request = {
+                "model": settings.LLM_MODEL,
+                "messages": msgs,
+                "temperature": settings.LLM_TEMPERATURE,
+                "max_tokens": settings.LLM_MAX_TOKENS,
+                "response_format": fmt,
+            }
+            try:
+                async for delta in _astream_chat(request):
+                    for kind, data in parser.feed(delta):
+                        yield kind, _restore_event(kind, data, aliases)
+                break
+            except BadRequestError:
+                # Бэкенд не принимает json_schema — пробуем json_object (до первых токенов)
+                if i == len(formats) - 1 or parser.buf:
+                    raise
+        states.append(parser.result())
+
+    merged: Dict = {"tldr": "", "action_items": [], "decisions": [], "risks": []}
+    for st in states:
+        merged = _merge_states(merged, st)
+    merged["tldr"] = " ".join((st.get("tldr") or "").strip() for st in states).strip()
+    yield "summary", compaction.restore_aliases(_sanitize_state(merged), aliases)
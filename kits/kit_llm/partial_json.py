@@ -0,0 +1,157 @@
+"""
+Инкрементальный разбор сводки meeting_summary, пока модель её генерирует.
+
+Парсер получает куски текста по мере стрима и сразу отдаёт события о каждом
+завершённом элементе: пункт действия, решение, риск, готовое резюме. Полный JSON
+ждать не нужно. Текст до первой «{» (рассуждения thinking-модели, ```json)
+пропускается.
+"""
+from __future__ import annotations
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+from . import json_repair
+
+# Ключ массива -> тип события для его элементов
+ARRAY_EVENTS = {"action_items": "action_item", "decisions": "decision", "risks": "risk"}
+
+
+class SummaryStreamParser:
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.started = False
+        self.done = False
+        self.stack: List[str] = []
+        self.in_str = False
+        self.esc = False
+        self.str_start = 0
+        self.expect_key = False
+        self.key: Optional[str] = None  # текущий ключ верхнего уровня
+        self.elem_start: Optional[int] = None  # начало текущего элемента массива
+        self.tldr_sent = False
+
+    def feed(self, text: str) -> List[Tuple[str, object]]:
+        """Добавить кусок ответа, вернуть события [(тип, данные)]"""
+        self.buf += text
+        events: List[Tuple[str, object]] = []
+        if not self.started and not self._find_start():
+            return events
+        buf = self.buf
+        i = self.pos
+        while i < len(buf) and not self.done:
+            c = buf[i]
+            if self.in_str:
+                if self.esc:
+                    self.esc = False
+                elif c == "\\":
+                    self.esc = True
+                elif c == '"':
+                    self.in_str = False
+                    self._string_closed(i, events)
+            elif c == '"':
+                self.in_str = True
+                self.str_start = i
+                self._element_begins(i)
+            elif c in "{[":
+                self._element_begins(i)
+                self.stack.append(c)
+            elif c in "}]":
+                if c == "]" and self._in_array() and self.elem_start is not None:
+                    self._emit_element(buf[self.elem_start:i], events)  # число/литерал перед ]
+                if self.stack:
+                    self.stack.pop()
+                if self._in_array() and self.elem_start is not None:
+                    self._emit_element(buf[self.elem_start:i + 1], events)
+                elif len(self.stack) == 1:
+                    self.key = None
+                if not self.stack:
+                    self.done = True
+            elif c == ",":
+                if len(self.stack) == 1:
+                    self.expect_key = True
+                    self.key = None
+                elif self._in_array() and self.elem_start is not None:
+                    self._emit_element(buf[self.elem_start:i], events)
+            elif c == ":":
+                pass
+            elif not c.isspace():
+                self._element_begins(i)  # число или литерал внутри массива
+            i += 1
+        self.pos = i
+        return events
+
+    def _find_start(self) -> bool:
+        buf = self.buf
+        low = buf.lower()
+        think = low.find("<think>")
+        brace = buf.find("{")
+        if think >= 0 and (brace < 0 or think < brace):
+            end = low.find("</think>", think)
+            if end < 0:
+                return False
+            brace = buf.find("{", end)
+        if brace < 0:
+            return False
+        self.started = True
+        self.stack = ["{"]
+        self.expect_key = True
+        self.pos = brace + 1
+        return True
+
+    def _in_array(self) -> bool:
+        # Элементы интересующих массивов лежат на глубине 2: {"risks": [ ... ]}
+        return len(self.stack) == 2 and self.stack[1] == "[" and self.key in ARRAY_EVENTS
+
+    def _element_begins(self, i: int):
+        if self._in_array() and self.elem_start is None:
+            self.elem_start = i
+
+    def _string_closed(self, i: int, events):
+        raw = self.buf[self.str_start:i + 1]
+        if len(self.stack) == 1:
+            if self.expect_key:
+                key = _loads(raw)
+                self.key = key if isinstance(key, str) else None
+                self.expect_key = False
+            elif self.key in ("tldr", "summary") and not self.tldr_sent:
+                value = _loads(raw)
+                if isinstance(value, str) and value.strip():
+                    self.tldr_sent = True
+                    events.append(("tldr", value))
+        elif self._in_array() and self.elem_start == self.str_start:
+            self._emit_element(raw, events)
+
+    def _emit_element(self, raw: str, events):
+        self.elem_start = None
+        raw = raw.strip()
+        if not raw:
+            return
+        value = _loads(raw)
+        if value is _INVALID:
+            value = json_repair.repair_json(raw) if raw.startswith("{") else raw.strip('"')
+        kind = ARRAY_EVENTS[self.key]
+        if kind == "action_item":
+            items = json_repair.coerce_to_schema({"action_items": [value]})["action_items"]
+            if items:
+                events.append((kind, items[0]))
+        else:
+            text = json_repair.coerce_to_schema({"decisions": [value]})["decisions"]
+            if text:
+                events.append((kind, text[0]))
+
+    def result(self) -> Dict:
+        """Итоговая сводка по всему накопленному тексту (с локальным ремонтом JSON)"""
+        data = json_repair.repair_json(self.buf)
+        return json_repair.coerce_to_schema(data if data is not None else {"tldr": self.buf.strip()})
+
+
+_INVALID = object()
+
+
+def _loads(raw: str):
+    try:
+        return json.loads(raw, strict=False)
+    except ValueError:
+        return _INVALID
@@ -0,0 +1,113 @@
+"""
+Кэш ответов LLM в SQLite.
+
+Ключ — хэш параметров запроса (модель, сообщения, температура, max_tokens,
+response_format): повторный прогон задачи, повторный стрим TL;DR или refine
+с тем же текстом не идут в модель. Записи старше LLM_CACHE_MAX_AGE_DAYS удаляются,
+при превышении LLM_CACHE_MAX_MB вытесняются давно не использованные.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Optional
+
+from kits.kit_common import counters
+from kits.kit_common.config import settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+
+def cache_path() -> Path:
+    p = Path(settings.LLM_CACHE_PATH) if settings.LLM_CACHE_PATH else Path(settings.DATA_DIR) / "cache" / "llm.sqlite3"
+    p.parent.mkdir(parents=True, exist_ok=True)
+    return p
+
+
+def _connect() -> sqlite3.Connection:
+    con = sqlite3.connect(cache_path(), timeout=30, isolation_level=None)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "key TEXT PRIMARY KEY, body TEXT NOT NULL, size INTEGER NOT NULL, "
+        "created REAL NOT NULL, accessed REAL NOT NULL)"
+    )
+    return con
+
+
+def cache_key(params: Dict) -> str:
+    raw = json.dumps({"v": CACHE_VERSION, **params}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=20).hexdigest()
+
+
+def get(key: str) -> Optional[str]:
+    if not settings.LLM_CACHE:
+        return None
+    now = time.time()
+    max_age = settings.LLM_CACHE_MAX_AGE_DAYS * 86400
+    try:
+        with closing(_connect()) as con:
+            row = con.execute("SELECT body, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > max_age:
+                con.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                con.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+    except sqlite3.Error as e:
+        logger.warning(f"Кэш LLM недоступен: {e}")
+        return None
+    counters.incr("llm_cache_hits" if row is not None else "llm_cache_misses")
+    return row[0] if row is not None else None
+
+
+def put(key: str, body: str):
+    if not settings.LLM_CACHE:
+        return
+    now = time.time()
+    try:
+        with closing(_connect()) as con:
+            con.execute(
+                "INSERT OR REPLACE INTO responses (key, body, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, body, len(body.encode("utf-8")), now, now),
+            )
+            evict(con, settings.LLM_CACHE_MAX_MB * 1024 * 1024, settings.LLM_CACHE_MAX_AGE_DAYS * 86400)
+    except sqlite3.Error as e:
+        logger.warning(f"Не удалось записать ответ в кэш LLM: {e}")
+
+
+def evict(con: sqlite3.Connection, max_bytes: int, max_age_sec: float) -> int:
+    """Удалить устаревшие записи, затем самые давно использованные — пока кэш больше бюджета"""
+    removed = con.execute("DELETE FROM responses WHERE created < ?", (time.time() - max_age_sec,)).rowcount
+    total = con.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total > max_bytes:
+        for key, size in con.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if total <= max_bytes:
+                break
+            con.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+    if removed:
+        counters.incr("llm_cache_evictions", removed)
+        logger.info(f"Кэш LLM: вытеснено записей {removed}")
+    return removed
+
+
+def stats() -> Dict:
+    out = {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "size_mb": 0.0}
+    for name, value in counters.snapshot("llm_cache_").items():
+        out[name[len("llm_cache_"):]] = value
+    try:
+        with closing(_connect()) as con:
+            entries, size = con.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        out["entries"] = entries
+        out["size_mb"] = round(size / (1024 * 1024), 3)
+    except sqlite3.Error:
+        pass
+    return out
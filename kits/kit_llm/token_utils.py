@@ -1,15 +1,24 @@
 from __future__ import annotations
 
-import re
-from typing import List, Dict
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
 
 
 _ENC = None
+_ENC_FAILED = False
+
+# Memo for repeated strings: system prompts, state items, short replies like "Speaker 1: Да."
+_MEMO: "OrderedDict[str, int]" = OrderedDict()
+_MEMO_SIZE = 32768
+_MEMO_MAX_CHARS = 4096
+_memo_lock = threading.Lock()
 
 
 def _load_tiktoken():
-    global _ENC
-    if _ENC is not None:
+    global _ENC, _ENC_FAILED
+    if _ENC is not None or _ENC_FAILED:
         return _ENC
     try:
         import tiktoken  # type: ignore
@@ -17,28 +26,86 @@ def _load_tiktoken():
         # Generic encoding; accuracy is not critical, we just need a budget guardrail.
         _ENC = tiktoken.get_encoding("cl100k_base")
     except Exception:
+        # Don't retry on every call (offline, get_encoding tries to download the BPE file each time)
         _ENC = None
+        _ENC_FAILED = True
     return _ENC
 
 
-def count_tokens_text(text: str) -> int:
+def _heuristic(text: str) -> int:
+    # Fallback heuristic: ~4 chars per token
+    # Add a bit of penalty for punctuation/whitespace variety
+    return max(1, int(len(text) / 4))
+
+
+def _encode_counts(texts: List[str]) -> List[int]:
     enc = _load_tiktoken()
     if enc is not None:
         try:
-            return len(enc.encode(text))
+            return [len(t) for t in enc.encode_ordinary_batch(texts)]
         except Exception:
             pass
-    # Fallback heuristic: ~4 chars per token
-    # Add a bit of penalty for punctuation/whitespace variety
-    return max(1, int(len(text) / 4))
+    return [_heuristic(t) for t in texts]
+
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """Token counts for many strings: one tiktoken batch call for unique unseen strings,
+    memoized counts for the rest."""
+    if _load_tiktoken() is None:
+        return [_heuristic(t) for t in texts]  # cheaper than a memo lookup
+    out: List[int] = [0] * len(texts)
+    missing: Dict[str, List[int]] = {}
+    with _memo_lock:
+        for i, t in enumerate(texts):
+            n = _MEMO.get(t)
+            if n is not None:
+                _MEMO.move_to_end(t)
+                out[i] = n
+            else:
+                missing.setdefault(t, []).append(i)
+    if not missing:
+        return out
+    uniq = list(missing)
+    counts = _encode_counts(uniq)
+    with _memo_lock:
+        for t, n in zip(uniq, counts):
+            for i in missing[t]:
+                out[i] = n
+            if len(t) <= _MEMO_MAX_CHARS:
+                _MEMO[t] = n
+        while len(_MEMO) > _MEMO_SIZE:
+            _MEMO.popitem(last=False)
+    return out
+
+
+def count_tokens_text(text: str) -> int:
+    return count_tokens_batch([text])[0]
 
 
 def count_tokens_messages(messages: List[Dict[str, str]]) -> int:
     # Very rough: sum of content + role labels overhead
-    total = 0
+    texts: List[str] = []
     for m in messages:
-        role = m.get("role", "")
-        content = m.get("content", "")
-        total += count_tokens_text(role) + count_tokens_text(content) + 4
-    return total
+        texts.append(m.get("role", ""))
+        texts.append(m.get("content", ""))
+    return sum(count_tokens_batch(texts)) + 4 * len(messages)
+
+
+def count_tokens_json(obj: Any) -> int:
+    """Approximate size of json.dumps(obj, ensure_ascii=False) in tokens.
 
+    Top-level list values are counted item by item, so a growing summary state
+    only encodes the items that changed since the previous call; the rest come
+    from the memo.
+    """
+    if not isinstance(obj, dict):
+        return count_tokens_text(json.dumps(obj, ensure_ascii=False))
+    parts: List[str] = []
+    for k, v in obj.items():
+        if isinstance(v, list):
+            parts.append(json.dumps(k, ensure_ascii=False))
+            parts.extend(json.dumps(x, ensure_ascii=False) for x in v)
+        else:
+            parts.append(json.dumps({k: v}, ensure_ascii=False))
+    # +1 per part for separators/brackets between the separately counted pieces
+    return sum(count_tokens_batch(parts)) + len(parts) + 1
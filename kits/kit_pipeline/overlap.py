@@ -0,0 +1,105 @@
+"""
+Резюмирование параллельно с оконной ASR.
+
+Пока длинная запись распознаётся окнами, готовые окна сразу уходят в map-стадию
+LLM (не более LLM_CONCURRENCY запросов одновременно). После последнего окна
+остаётся только reduce, поэтому время до сводки ближе к max(ASR, LLM), чем к их сумме.
+
+Работает только без диаризации: метки спикеров появляются лишь после диаризации
+всей записи, а без них ответственные в сводке окон были бы случайными. Спикеры
+расставляются псевдодиаризацией по общей шкале времени: окна размечаются строго
+по порядку, с последним спикером и концом предыдущего окна, поэтому «Участник N»
+в сводках окон совпадает с итоговой стенограммой. Окно, готовое раньше
+предыдущих, ждёт их разметки.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from kits.kit_common import progress, timing
+from kits.kit_common.config import settings
+from kits.kit_asr.whisperx_asr import diarization_enabled, pseudo_diarize
+from kits.kit_llm import openai_backend as llm
+
+logger = logging.getLogger(__name__)
+
+
+def overlap_enabled(windowed: bool) -> bool:
+    return settings.LLM_OVERLAP_ASR and windowed and not diarization_enabled()
+
+
+def _copy_segments(segments: List[Dict]) -> List[Dict]:
+    # pseudo_diarize проставляет спикеров словам на месте — не трогаем результат ASR
+    return [dict(s, words=[dict(w) for w in s.get("words") or []]) for s in segments]
+
+
+class WindowSummarizer:
+    """Map по окнам ASR по мере готовности; finish() — reduce после последнего окна"""
+
+    def __init__(self):
+        self.ex = ThreadPoolExecutor(max_workers=max(1, settings.LLM_CONCURRENCY), thread_name_prefix="llm-map")
+        self.futures: Dict[int, Future] = {}
+        self.total: Optional[int] = None
+        self._segments: Dict[int, List[Dict]] = {}  # распознанные окна, ещё без спикеров
+        self._carry: Dict[int, Dict] = {0: {}}  # состояние pseudo_diarize на начало окна
+        self._next = 0  # первое неразмеченное окно
+        self.usage: List[int] = []
+        self._lock = threading.Lock()
+        # Окна приходят во время стадии asr, но запросы к LLM учитываем отдельным спаном задачи
+        self._map = timing.bind(self._map_window)
+
+    def _map_window(self, segments: List[Dict], index: int, total: int) -> Dict:
+        with timing.span("overlap_map"):
+            return llm.map_segments(segments, index, total, self.usage)
+
+    def on_window(self, index: int, total: int, result: Dict):
+        with self._lock:
+            self.total = total
+            self._segments[index] = result.get("segments", [])
+            # Окно перезапущено с другим языком: разметка с него и дальше пересчитывается
+            self._next = min(self._next, index)
+            while self._next in self._segments:
+                i = self._next
+                carry = dict(self._carry[i])
+                segments = pseudo_diarize(_copy_segments(self._segments[i]), carry)
+                self._carry[i + 1] = carry
+                prev = self.futures.get(i)
+                if prev is not None:
+                    prev.cancel()
+                self.futures[i] = self.ex.submit(self._map, segments, i, total)
+                self._next += 1
+                logger.info(f"Окно {i + 1}/{total} распознано, отправлено на резюмирование")
+
+    def finish(self) -> Optional[Dict]:
+        """Итоговая сводка или None, если окна не приходили (например, ASR из кэша)"""
+        with self._lock:
+            futures = dict(self.futures)
+            total = self.total
+        if total is None or len(futures) != total:
+            return None
+        t0 = time.perf_counter()
+        # Окна + reduce; прогресс стадии summarize начинается только здесь, чтобы не
+        # перебивать прогресс ASR, пока окна ещё распознаются
+        mapped = []
+        for i in sorted(futures):
+            mapped.append(futures[i].result())
+            progress.report("summarize", len(mapped), total + 1, "chunks")
+        states = [st for m in mapped for st in m["states"]]
+        with timing.span("overlap_reduce"):
+            out = llm.reduce_states(states, self.usage)
+        progress.report("summarize", total + 1, total + 1, "chunks")
+        logger.info(f"Резюмирование по окнам: частей={len(states)}, ожидание после ASR {time.perf_counter() - t0:.1f} с")
+        out = dict(out)
+        out["_strategy"] = "overlap_map_reduce"
+        if all(m.get("tokens_before") is not None for m in mapped):
+            before = sum(m["tokens_before"] for m in mapped)
+            after = sum(m["tokens_after"] for m in mapped)
+            out["_compaction"] = {"tokens_before": before, "tokens_after": after, "tokens_saved": before - after}
+        return out
+
+    def close(self):
+        self.ex.shutdown(wait=False, cancel_futures=True)
@@ -1,17 +1,25 @@
 from __future__ import annotations
 
 import math
+import os
 from collections import Counter, defaultdict
 from pathlib import Path
 from typing import Dict, List
 
+from kits.kit_common import progress, timing
 from kits.kit_common.config import settings
 from kits.kit_common.paths import ensure_job_dirs, write_json
-from kits.utils.audio import probe_duration_sec
-from kits.kit_asr.whisperx_asr import transcribe_with_whisperx, pseudo_diarize
-from kits.kit_llm.openai_backend import summarize_transcript
+from kits.utils import audio as audio_utils
+from kits.utils import audio_info as audio_info_utils
+from kits.kit_asr import whisperx_asr
+from kits.kit_asr import result_cache as asr_cache
+from kits.kit_asr.whisperx_asr import pseudo_diarize
+from kits.kit_llm import openai_backend as llm
 from kits.kit_export.subtitles import build_srt, build_vtt
 from kits.kit_export.minutes import build_minutes_md
+from kits.kit_export import word_store
+from kits.kit_pipeline import overlap, stages
+from kits.kit_pipeline.status import history_rate
 
 
 def build_paragraphs(segments: List[Dict]) -> List[Dict]:
@@ -79,33 +87,83 @@ def extract_keywords(paragraphs: List[Dict], top_k: int = 20) -> List[str]:
     return [w for w, _ in freq.most_common(top_k)]
 
 
-def run_pipeline(payload: Dict):
+def prepare_audio(payload: Dict, work_dir: Path):
+    """Первая стадия: нормализация загрузки в 16 кГц mono WAV и проверка длительности.
+
+    В sync-режиме API уже нормализовал файл при загрузке — тогда стадия только
+    берёт параметры аудио из payload.
+    """
     import logging
     logger = logging.getLogger(__name__)
-    
-    job_id = payload["job_id"]
-    input_path = Path(payload["input_path"])  # original
-    fast_mode = bool(payload.get("fast_mode", False))
-    language = payload.get("language")
 
-    logger.info(f"Запуск pipeline для задачи {job_id}")
-    logger.info(f"Входной файл: {input_path}")
-    logger.info(f"Быстрый режим: {fast_mode}")
-    logger.info(f"Язык: {language}")
+    work_wav = work_dir / "normalized.wav"
+    audio_info = payload.get("audio_info")
+    if not work_wav.exists():
+        input_path = Path(payload["input_path"])
+        logger.info(f"Нормализация аудио: {input_path} -> {work_wav}")
+        # Пишем во временный файл: прерванная попытка не оставит «готовый» обрезанный WAV
+        tmp_wav = work_dir / "normalized.part.wav"
+        audio_utils.normalize_audio(input_path, tmp_wav)
+        os.replace(tmp_wav, work_wav)
+        audio_info = None
+    if not audio_info:
+        audio_info = audio_info_utils.probe_audio_info(work_wav)
+    duration = float(audio_info.get("duration_sec") or 0.0)
+    if duration > settings.MAX_AUDIO_MIN * 60:
+        raise ValueError(f"Audio too long: {duration:.1f}s")
+    return work_wav, audio_info
 
-    paths = ensure_job_dirs(job_id)
-    work_wav = paths["work_dir"] / "normalized.wav"
-    duration = probe_duration_sec(work_wav)
-    logger.info(f"Длительность аудио: {duration:.1f} секунд")
 
-    # ASR + alignment (+ diarization)
-    logger.info("Начало транскрипции с WhisperX")
-    try:
-        asr = transcribe_with_whisperx(work_wav, language=language)
-        logger.info("Транскрипция завершена успешно")
-    except Exception as e:
-        logger.error(f"Ошибка при транскрипции: {str(e)}", exc_info=True)
-        raise
+def use_windows(duration: float) -> bool:
+    return settings.ASR_WORKERS > 1 and duration > settings.ASR_WINDOW_SEC * 1.5
+
+
+def transcribe_audio(
+    work_wav: Path,
+    language: str | None,
+    duration: float,
+    pcm_fp: str | None = None,
+    on_window=None,
+) -> Dict:
+    """on_window — колбэк готовых окон оконной ASR (см. transcribe_windowed)"""
+    import logging
+    logger = logging.getLogger(__name__)
+
+    # Повторная загрузка той же записи с теми же настройками — результат из кэша
+    key = asr_cache.cache_key(work_wav, language, pcm_fp) if settings.ASR_CACHE else None
+    if key:
+        cached = asr_cache.get(key)
+        if cached is not None:
+            logger.info(f"Результат ASR взят из кэша: {key}")
+            progress.report("asr", 1, 1)  # без единиц: в скорость ASR для ETA не идёт
+            return cached
+    progress.report("asr", 0, duration, "audio_sec")
+
+    # Длинные записи — оконная транскрипция в пуле процессов
+    if use_windows(duration):
+        from kits.kit_asr.windowed import transcribe_windowed
+
+        asr = transcribe_windowed(work_wav, language=language, workers=settings.ASR_WORKERS, on_window=on_window)
+    else:
+        # Один долгий вызов без промежуточных отчётов: прогресс и ETA — по времени
+        # и средней скорости ASR прошлых задач
+        rate = history_rate("asr", "audio_sec")
+        with progress.heartbeat("asr", duration, "audio_sec", rate, max(0.5, settings.PROGRESS_MIN_INTERVAL_SEC)):
+            asr = whisperx_asr.transcribe_with_whisperx(work_wav, language=language)
+
+    progress.report("asr", duration, duration, "audio_sec")
+
+    # Не кэшируем результат с упавшей диаризацией — следующая попытка может пройти
+    if key and (asr.get("diarization") or {}).get("status") != "failed":
+        try:
+            asr_cache.put(key, asr)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить результат ASR в кэш: {e}")
+    return asr
+
+
+def build_transcript(asr: Dict, job_id: str, duration: float, fast_mode: bool) -> Dict:
+    """Постобработка ASR: спикеры, абзацы, метрики, ключевые слова"""
     segments = asr.get("segments", [])
     # If diarization disabled or missing speaker tags, apply pseudo
     if fast_mode or not any(s.get("speaker") for s in segments):
@@ -114,17 +172,20 @@ def run_pipeline(payload: Dict):
     # Paragraphs and metrics
     paragraphs = build_paragraphs(segments)
     metrics = compute_metrics(paragraphs)
+    vad = asr.get("vad") or {}
+    metrics["silence_skipped_sec"] = round(float(vad.get("skipped_sec") or 0.0), 1)
     speakers = sorted(list({p["speaker"] for p in paragraphs}))
 
     # Topics (optional, fast_mode skip). Placeholder: none
     topics = [] if fast_mode else []
 
-    transcript = {
+    return {
         "job_id": job_id,
         "language": asr.get("language"),
         "duration_sec": duration,
         "speakers": speakers,
         "metrics": metrics,
+        "diarization": asr.get("diarization"),
         "segments": [
             {
                 "start": p["start"],
@@ -139,33 +200,194 @@ def run_pipeline(payload: Dict):
         "topics": topics,
     }
 
-    # Summarize via LLM
-    summary = summarize_transcript(transcript)
 
-    out_dir = paths["out_dir"]
-    out_dir.mkdir(parents=True, exist_ok=True)
-    write_json(out_dir / "transcript.json", transcript)
-    write_json(out_dir / "summary.json", summary)
+def export_outputs(transcript: Dict, summary: Dict, out_dir: Path) -> List[str]:
+    """Субтитры и протокол; возвращает имена записанных файлов.
 
+    transcript — компактный (без слов), слова читаются из out/words.
+    """
+    written = []
     # Subtitles from words
-    all_words = []
-    for p in paragraphs:
-        all_words.extend(p.get("words", []))
+    store = word_store.open_store(out_dir)
+    all_words = store.words() if store is not None else []
     if all_words:
         (out_dir / "subs.srt").write_text(build_srt(all_words), encoding="utf-8")
         (out_dir / "subs.vtt").write_text(build_vtt(all_words), encoding="utf-8")
+        written += ["subs.srt", "subs.vtt"]
 
     # Minutes MD + JSON
     md = build_minutes_md(transcript, summary)
     (out_dir / "minutes.md").write_text(md, encoding="utf-8")
     write_json(out_dir / "minutes.json", {"transcript": transcript, "summary": summary})
+    return written + ["minutes.md", "minutes.json"]
+
+
+def llm_settings() -> Dict:
+    """Настройки, от которых зависит сводка (входят в отпечаток стадии summarize)"""
+    return {
+        "base_url": settings.OPENAI_BASE_URL,
+        "model": settings.LLM_MODEL,
+        "temperature": settings.LLM_TEMPERATURE,
+        "max_tokens": settings.LLM_MAX_TOKENS,
+        "context": llm.context_budget(),
+        "compact": settings.LLM_COMPACT_TRANSCRIPT,
+        "iterative_max_chunks": settings.LLM_ITERATIVE_MAX_CHUNKS,
+        "reduce_fanin": settings.LLM_REDUCE_FANIN,
+    }
+
+
+def run_pipeline(payload: Dict, on_progress: progress.ProgressCallback | None = None):
+    """Стадии normalize -> asr -> postprocess -> summarize -> export с контрольными
+    точками в work_dir: повторный запуск продолжает с первой стадии, чьи входы изменились.
+
+    Выравнивание и диаризация входят в стадию asr: диаризация идёт параллельно
+    с транскрипцией, а окна длинных записей выравниваются в процессах пула.
+    Замеры стадий (время, CPU, RSS, токены) пишутся в work_dir/timings.json.
+    on_progress(стадия, сделано, всего, единицы) получает прогресс стадий
+    (см. kits.kit_pipeline.status.StatusWriter).
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    job_id = payload["job_id"]
+    input_path = Path(payload["input_path"])  # original
+    fast_mode = bool(payload.get("fast_mode", False))
+    language = payload.get("language")
+
+    logger.info(f"Запуск pipeline для задачи {job_id}")
+    logger.info(f"Входной файл: {input_path}")
+    logger.info(f"Быстрый режим: {fast_mode}")
+    logger.info(f"Язык: {language}")
+
+    paths = ensure_job_dirs(job_id)
+    status = "error"
+    with timing.recording() as rec, progress.reporting(on_progress):
+        try:
+            result = _run_pipeline(payload, paths)
+            status = "done"
+            return result
+        finally:
+            timings = {"job_id": job_id, "status": status, **rec.to_dict()}
+            timing.observe("pipeline", timings["total_sec"])
+            try:
+                write_json(paths["work_dir"] / "timings.json", timings)
+            except OSError as e:
+                logger.warning(f"Не удалось записать timings.json: {e}")
+
+
+def _run_pipeline(payload: Dict, paths: Dict) -> Dict:
+    import logging
+    logger = logging.getLogger(__name__)
+
+    input_path = Path(payload["input_path"])
+    work_dir = paths["work_dir"]
+    work_wav = work_dir / "normalized.wav"
+
+    def _normalize():
+        wav, audio_info = prepare_audio(payload, work_dir)
+        return {"audio_info": audio_info, "wav": stages.file_stat(wav), "pcm": asr_cache.pcm_fingerprint(wav)}
+
+    norm, norm_fp = stages.run_stage(
+        work_dir, "normalize",
+        {"input": stages.file_stat(input_path), "max_audio_min": settings.MAX_AUDIO_MIN},
+        _normalize,
+        # normalized.wav удалён или перезаписан — нормализуем заново
+        valid=lambda out: out.get("wav") is not None and out.get("wav") == stages.file_stat(work_wav),
+    )
+    duration = float(norm["audio_info"].get("duration_sec") or 0.0)
+    logger.info(f"Длительность аудио: {duration:.1f} секунд")
+
+    # Длинная запись без диаризации: окна резюмируются, пока распознаются следующие
+    windows = overlap.WindowSummarizer() if overlap.overlap_enabled(use_windows(duration)) else None
+    try:
+        return _run_stages(payload, paths, norm, norm_fp, duration, windows)
+    finally:
+        if windows is not None:
+            windows.close()
+
+
+def _run_stages(payload: Dict, paths: Dict, norm: Dict, norm_fp: str, duration: float, windows) -> Dict:
+    import logging
+    logger = logging.getLogger(__name__)
+
+    job_id = payload["job_id"]
+    fast_mode = bool(payload.get("fast_mode", False))
+    language = payload.get("language")
+    work_dir = paths["work_dir"]
+    work_wav = work_dir / "normalized.wav"
+
+    # Готовые окна оконной ASR: прогресс в секундах аудио и резюмирование параллельно с ASR
+    windows_done: Dict[int, float] = {}
+
+    def on_window(index: int, total: int, result: Dict):
+        windows_done[index] = result["end_sec"] - result["start_sec"]
+        progress.report("asr", min(duration, sum(windows_done.values())), duration, "audio_sec")
+        if windows is not None:
+            windows.on_window(index, total, result)
+
+    # Контрольные точки asr и postprocess хранят сегменты без слов: слова лежат
+    # колонками рядом (stages/asr_words и out/words), а в JSON — только ссылка на них
+    stages_dir = work_dir / "stages"
+    out_dir = paths["out_dir"]
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    def _asr():
+        result = transcribe_audio(work_wav, language, duration, norm["pcm"], on_window=on_window)
+        return word_store.save_transcript(stages_dir, result, source=stages.fingerprint(result), name="asr_words")
+
+    # ASR + alignment (+ diarization)
+    logger.info("Начало транскрипции с WhisperX")
+    try:
+        asr, asr_fp = stages.run_stage(
+            work_dir, "asr",
+            {"audio": norm_fp, "asr": asr_cache.asr_settings(language)},
+            _asr,
+            valid=lambda out: word_store.store_matches(stages_dir, out),
+            # Упавшую диаризацию не фиксируем: повтор задачи попробует ещё раз
+            persist=lambda out: (out.get("diarization") or {}).get("status") != "failed",
+        )
+        logger.info("Транскрипция завершена успешно")
+    except Exception as e:
+        logger.error(f"Ошибка при транскрипции: {str(e)}", exc_info=True)
+        raise
+
+    def _postprocess():
+        transcript = build_transcript(word_store.load_transcript(stages_dir, asr), job_id, duration, fast_mode)
+        return word_store.save_transcript(out_dir, transcript, source=stages.fingerprint(transcript))
+
+    # Слова — в колоночное хранилище out/words, в transcript.json только сегменты
+    compact, transcript_fp = stages.run_stage(
+        work_dir, "postprocess",
+        {"asr": asr_fp, "job_id": job_id, "duration": duration, "fast_mode": fast_mode},
+        _postprocess,
+        valid=lambda out: word_store.store_matches(out_dir, out),
+    )
+
+    # Transcript first: /summary/stream/structured can start streaming while we summarize.
+    write_json(out_dir / "transcript.json", compact)
+
+    # Summarize via LLM: single pass / iterative / map-reduce by transcript size,
+    # или reduce сводок окон, если они резюмировались вместе с ASR
+    summary, summary_fp = stages.run_stage(
+        work_dir, "summarize",
+        {"transcript": transcript_fp, "llm": llm_settings()},
+        lambda: (windows.finish() if windows else None) or llm.summarize_auto(compact),
+    )
+    write_json(out_dir / "summary.json", summary)
+
+    stages.run_stage(
+        work_dir, "export",
+        {"transcript": transcript_fp, "summary": summary_fp},
+        lambda: export_outputs(compact, summary, out_dir),
+        valid=lambda files: all((out_dir / f).exists() for f in files),
+    )
 
     return {
         "job_id": job_id,
-        "language": transcript.get("language"),
-        "duration_sec": transcript.get("duration_sec"),
-        "speakers": speakers,
-        "metrics": metrics,
+        "language": compact.get("language"),
+        "duration_sec": compact.get("duration_sec"),
+        "speakers": compact["speakers"],
+        "metrics": compact["metrics"],
         "out": {
             "transcript_json": str((out_dir / "transcript.json").resolve()),
             "summary_json": str((out_dir / "summary.json").resolve()),
@@ -175,4 +397,3 @@ def run_pipeline(payload: Dict):
             "vtt": str((out_dir / "subs.vtt").resolve()),
         },
     }
-
@@ -0,0 +1,110 @@
+"""
+Контрольные точки стадий pipeline в work_dir задачи.
+
+Каждая стадия сохраняет work_dir/stages/<стадия>.json: отпечаток входов и свой
+результат. Отпечаток входов строится из отпечатка результата предыдущей стадии
+и настроек, влияющих на результат. Повтор задачи (retry RQ после таймаута LLM,
+ручной перезапуск) пропускает стадии, чьи входы не изменились, и продолжает с
+первой изменившейся или не завершённой стадии.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from kits.kit_common import progress, timing
+
+logger = logging.getLogger(__name__)
+
+# Версия формата контрольных точек: смена сбрасывает все сохранённые стадии
+STAGES_VERSION = 1
+
+STAGES = ("normalize", "asr", "postprocess", "summarize", "export")
+
+
+def fingerprint(data: Any) -> str:
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def file_stat(path: Path) -> Optional[Dict]:
+    """Дешёвый отпечаток файла (размер и mtime) или None, если файла нет"""
+    try:
+        st = Path(path).stat()
+    except OSError:
+        return None
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _path(work_dir: Path, name: str) -> Path:
+    return Path(work_dir) / "stages" / f"{name}.json"
+
+
+def load(work_dir: Path, name: str, input_fp: str) -> Optional[Dict]:
+    """Сохранённая точка стадии, если она сделана для тех же входов"""
+    try:
+        with open(_path(work_dir, name), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("v") != STAGES_VERSION or data.get("input") != input_fp:
+        return None
+    return data
+
+
+def save(work_dir: Path, name: str, input_fp: str, output: Any) -> Dict:
+    p = _path(work_dir, name)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    data = {"v": STAGES_VERSION, "input": input_fp, "output_fp": fingerprint(output), "output": output}
+    # Через временный файл: прерванная запись не оставит битую точку
+    tmp = p.with_suffix(".part")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, p)
+    return data
+
+
+def invalidate(work_dir: Path, name: str):
+    try:
+        _path(work_dir, name).unlink()
+    except OSError:
+        pass
+
+
+def run_stage(
+    work_dir: Path,
+    name: str,
+    inputs: Dict,
+    fn: Callable[[], Any],
+    valid: Optional[Callable[[Any], bool]] = None,
+    persist: Optional[Callable[[Any], bool]] = None,
+) -> Tuple[Any, str]:
+    """Выполнить стадию или взять её результат из контрольной точки.
+
+    inputs — всё, от чего зависит результат (JSON-сериализуемое);
+    valid(output) — дополнительная проверка сохранённого результата (например, что
+    файлы на месте); persist(output) — сохранять ли результат (False — стадия
+    повторится при следующем запуске). Возвращает (результат, отпечаток результата).
+    """
+    input_fp = fingerprint(inputs)
+    saved = load(work_dir, name, input_fp)
+    if saved is not None and (valid is None or valid(saved["output"])):
+        logger.info(f"Стадия {name}: входы не изменились, результат из контрольной точки")
+        return saved["output"], saved["output_fp"]
+
+    progress.report(name, 0)
+    with timing.span(name, metric=f"stage_{name}") as measured:
+        output = fn()
+    logger.info(f"Стадия {name} выполнена за {measured['wall_sec']:.1f} с")
+    if persist is not None and not persist(output):
+        invalidate(work_dir, name)
+        return output, fingerprint(output)
+    try:
+        return output, save(work_dir, name, input_fp, output)["output_fp"]
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"Не удалось сохранить контрольную точку стадии {name}: {e}")
+        return output, fingerprint(output)
@@ -0,0 +1,141 @@
+"""
+status.json задачи с прогрессом по стадиям и оценкой оставшегося времени.
+
+StatusWriter — колбэк для progress.reporting(): переводит прогресс стадии в
+общий процент (по диапазонам STAGE_RANGES) и считает ETA:
+- текущая стадия — по измеренной скорости (секунд аудио/с, частей сводки/с),
+  а до первых данных — по средней скорости прошлых задач;
+- оставшиеся стадии — по средней длительности из гистограмм timing.
+
+Запись не чаще PROGRESS_MIN_INTERVAL_SEC (смена стадии и её завершение — сразу),
+атомарно: опрос /status не видит недописанный файл. Переходы задачи (processing,
+done, error) пишутся через set_state() того же объекта: после done/error поздние
+отчёты прогресса (heartbeat, окна ASR) статус уже не перезапишут.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from kits.kit_common import counters, timing
+from kits.kit_common.config import settings
+from kits.kit_common.paths import write_json_atomic
+
+# Доля общего прогресса по стадиям, %
+STAGE_RANGES = {
+    "normalize": (0, 5),
+    "asr": (5, 70),
+    "postprocess": (70, 72),
+    "summarize": (72, 97),
+    "export": (97, 99),
+}
+_ORDER = list(STAGE_RANGES)
+
+
+def history_rate(stage: str, unit: str) -> Optional[float]:
+    """Средняя скорость стадии по прошлым задачам (единиц в секунду) или None"""
+    if not unit:
+        return None
+    key = f"{stage}_{unit}"
+    c = counters.snapshot(f"progress_{key}_")
+    wall_ms = c.get(f"progress_{key}_wall_ms", 0)
+    units = c.get(f"progress_{key}_milli", 0) / 1000
+    return units / (wall_ms / 1000) if wall_ms > 0 and units > 0 else None
+
+
+class StatusWriter:
+    def __init__(self, status_path: Path, job_id: str, min_interval_sec: Optional[float] = None):
+        self.path = Path(status_path)
+        self.job_id = job_id
+        self.min_interval = settings.PROGRESS_MIN_INTERVAL_SEC if min_interval_sec is None else min_interval_sec
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+        self._stage: Optional[str] = None
+        self._stage_t0 = 0.0
+        self._history: Dict[str, Optional[float]] = {}
+        self._recorded = set()
+        self._stage_avg: Optional[Dict[str, float]] = None
+        self._closed = False
+
+    def set_state(self, status: str, **fields):
+        """Записать переход задачи сразу, без троттлинга; done и error — последняя запись"""
+        with self._lock:
+            if self._closed:
+                return
+            if status in ("done", "error"):
+                self._closed = True
+            write_json_atomic(self.path, {"job_id": self.job_id, "status": status, **fields})
+
+    def __call__(self, stage: str, done: float, total: Optional[float] = None, unit: str = ""):
+        now = time.monotonic()
+        with self._lock:
+            if self._closed:
+                return
+            force = stage != self._stage
+            if force:
+                self._stage, self._stage_t0 = stage, now
+            finished = bool(total) and done >= total
+            if finished:
+                self._record(stage, unit, total, now - self._stage_t0)
+                force = True
+            # Троттлинг: частые отчёты (окна, части сводки) не превращаются в поток записей
+            if not force and now - self._last_write < self.min_interval:
+                return
+            self._last_write = now
+            status = self._status(stage, done, total, unit, now - self._stage_t0)
+            # Под блокировкой: отчёт из другого потока (heartbeat, окна ASR) не
+            # перезапишет более свежий статус старым
+            write_json_atomic(self.path, status)
+
+    def _status(self, stage: str, done: float, total: Optional[float], unit: str, elapsed: float) -> Dict:
+        lo, hi = STAGE_RANGES.get(stage, (0, 99))
+        frac = min(1.0, done / total) if total else 0.0
+        status = {
+            "job_id": self.job_id,
+            "status": "processing",
+            "progress": int(lo + (hi - lo) * frac),
+            "stage": stage,
+            "stage_done": round(float(done), 1),
+            "stage_total": round(float(total), 1) if total else None,
+            "unit": unit or None,
+            "stage_elapsed_sec": round(elapsed),
+        }
+        stage_eta = self._stage_eta(stage, done, total, unit, elapsed)
+        if stage_eta is not None:
+            status["stage_eta_sec"] = round(stage_eta)
+            status["eta_sec"] = round(stage_eta + self._later_stages_sec(stage))
+        return status
+
+    def _stage_eta(self, stage: str, done: float, total: Optional[float], unit: str, elapsed: float) -> Optional[float]:
+        if not total:
+            return None
+        if done >= total:
+            return 0.0
+        rate = done / elapsed if done > 0 and elapsed >= 1.0 else self._history_rate(stage, unit)
+        return (total - done) / rate if rate else None
+
+    def _history_rate(self, stage: str, unit: str) -> Optional[float]:
+        key = f"{stage}_{unit}"
+        if key not in self._history:
+            self._history[key] = history_rate(stage, unit)
+        return self._history[key]
+
+    def _record(self, stage: str, unit: str, total: float, elapsed: float):
+        # Скорость завершённой стадии — для ETA будущих задач до первых измерений
+        if not unit or stage in self._recorded or elapsed <= 0:
+            return
+        self._recorded.add(stage)
+        counters.incr_many({
+            f"progress_{stage}_{unit}_milli": int(total * 1000),
+            f"progress_{stage}_{unit}_wall_ms": int(elapsed * 1000),
+        })
+
+    def _later_stages_sec(self, stage: str) -> float:
+        if self._stage_avg is None:
+            self._stage_avg = {
+                name[len("stage_"):]: h["avg_sec"] for name, h in timing.histograms().items() if name.startswith("stage_")
+            }
+        later = _ORDER[_ORDER.index(stage) + 1:] if stage in _ORDER else []
+        return sum(self._stage_avg.get(s, 0.0) for s in later)
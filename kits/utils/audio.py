@@ -1,8 +1,14 @@
+import logging
 import subprocess
 import shutil
+import tempfile
 from pathlib import Path
 
 SUPPORTED_EXTS = {"mp3", "m4a", "aac", "wav", "ogg", "opus", "webm"}
+# Контейнеры, которые ffmpeg не может читать из пайпа (moov-атом в конце файла)
+SEEKABLE_ONLY_EXTS = {"m4a"}
+
+logger = logging.getLogger(__name__)
 
 
 def is_supported_ext(ext: str) -> bool:
@@ -39,14 +45,12 @@ def run_cmd(cmd: list[str]):
     return proc.stdout
 
 
-def normalize_audio(src: Path, dst: Path):
-    dst.parent.mkdir(parents=True, exist_ok=True)
-    ffmpeg_path = find_ffmpeg_binary("ffmpeg")
-    cmd = [
+def _normalize_cmd(ffmpeg_path: str, src: str, dst: Path) -> list[str]:
+    return [
         ffmpeg_path,
         "-y",
         "-i",
-        str(src),
+        src,
         "-ac",
         "1",
         "-ar",
@@ -55,24 +59,96 @@ def normalize_audio(src: Path, dst: Path):
         "pcm_s16le",
         str(dst),
     ]
-    run_cmd(cmd)
+
+
+def normalize_audio(src: Path, dst: Path):
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    ffmpeg_path = find_ffmpeg_binary("ffmpeg")
+    run_cmd(_normalize_cmd(ffmpeg_path, str(src), dst))
+
+
+class StreamingNormalizer:
+    """Сохраняет загрузку на диск и одновременно подаёт те же байты в ffmpeg.
+
+    Методы блокирующие — в async-коде вызывать через пул потоков. Если ffmpeg
+    не смог читать из пайпа (формат требует seek, ошибка декодера), finish()
+    нормализует уже сохранённый файл обычным способом.
+    """
+
+    def __init__(self, src: Path, dst: Path, ext: str = ""):
+        self.src = src
+        self.dst = dst
+        self.bytes_written = 0
+        self._file = open(src, "wb")
+        self._proc = None
+        self._stderr = None
+        if ext.lower() in SEEKABLE_ONLY_EXTS:
+            return
+        try:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            ffmpeg_path = find_ffmpeg_binary("ffmpeg")
+            # stderr во временный файл: пайп без читателя может заблокировать ffmpeg
+            self._stderr = tempfile.TemporaryFile()
+            self._proc = subprocess.Popen(
+                _normalize_cmd(ffmpeg_path, "pipe:0", dst),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=self._stderr,
+            )
+        except Exception as e:
+            logger.warning(f"Потоковая нормализация недоступна, будет обычная: {e}")
+            self._close_proc()
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+        self.bytes_written += len(chunk)
+        if self._proc is not None:
+            try:
+                self._proc.stdin.write(chunk)
+            except (BrokenPipeError, OSError):
+                # ffmpeg завершился раньше времени — доделаем из файла в finish()
+                self._close_proc()
+
+    def finish(self):
+        self._file.close()
+        ok = False
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+            except OSError:
+                pass
+            ok = self._proc.wait() == 0
+            if not ok:
+                self._stderr.seek(0)
+                err = self._stderr.read().decode(errors="replace").strip()[-500:]
+                logger.warning(f"ffmpeg не смог нормализовать поток, повтор из файла: {err}")
+            self._close_proc()
+        if not ok:
+            normalize_audio(self.src, self.dst)
+
+    def abort(self):
+        self._file.close()
+        self._close_proc()
+
+    def _close_proc(self):
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                self._proc.kill()
+                self._proc.wait()
+            try:
+                self._proc.stdin.close()
+            except OSError:
+                pass
+        if self._stderr is not None:
+            self._stderr.close()
+        self._proc = None
+        self._stderr = None
 
 
 def probe_duration_sec(path: Path) -> float:
-    ffprobe_path = find_ffmpeg_binary("ffprobe")
-    cmd = [
-        ffprobe_path,
-        "-v",
-        "error",
-        "-show_entries",
-        "format=duration",
-        "-of",
-        "default=noprint_wrappers=1:nokey=1",
-        str(path),
-    ]
-    out = run_cmd(cmd)
+    from .audio_info import probe_audio_info
+
     try:
-        return float(out.strip())
+        return float(probe_audio_info(path)["duration_sec"])
     except Exception:
         return 0.0
-
@@ -0,0 +1,238 @@
+"""
+Параметры аудиофайла: длительность, частота, каналы, число сэмплов.
+
+Для WAV (в том числе нашего normalized.wav) читаем только RIFF-заголовок,
+ffprobe запускается лишь для остальных форматов.
+"""
+from __future__ import annotations
+
+import json
+import struct
+from pathlib import Path
+from typing import Dict
+
+from .audio import find_ffmpeg_binary, run_cmd
+from .wav import WAVE_FORMAT_PCM, read_wav_header
+
+
+def wav_info(header: Dict) -> Dict:
+    sr = header["sample_rate"]
+    return {
+        "duration_sec": header["num_samples"] / sr if sr else 0.0,
+        "sample_rate": sr,
+        "channels": header["channels"],
+        "num_samples": header["num_samples"],
+        "codec": f"pcm_s{header['bits_per_sample']}le",
+        "source": "header",
+    }
+
+
+def ffprobe_info(path: Path) -> Dict:
+    ffprobe_path = find_ffmpeg_binary("ffprobe")
+    cmd = [
+        ffprobe_path,
+        "-v",
+        "error",
+        "-select_streams",
+        "a:0",
+        "-show_entries",
+        "format=duration:stream=sample_rate,channels,codec_name",
+        "-of",
+        "json",
+        str(path),
+    ]
+    data = json.loads(run_cmd(cmd) or "{}")
+    stream = (data.get("streams") or [{}])[0]
+    try:
+        duration = float((data.get("format") or {}).get("duration") or 0.0)
+    except (TypeError, ValueError):
+        duration = 0.0
+    sr = int(stream.get("sample_rate") or 0)
+    return {
+        "duration_sec": duration,
+        "sample_rate": sr,
+        "channels": int(stream.get("channels") or 0),
+        "num_samples": int(round(duration * sr)),
+        "codec": stream.get("codec_name"),
+        "source": "ffprobe",
+    }
+
+
+def probe_audio_info(path: Path) -> Dict:
+    header = read_wav_header(Path(path))
+    if header and header["audio_format"] == WAVE_FORMAT_PCM and header["sample_rate"]:
+        return wav_info(header)
+    return ffprobe_info(Path(path))
+
+
+# --- Быстрый «нюх» загрузки: контейнер и оценка длительности без ffmpeg ---
+
+_SNIFF_BYTES = 64 * 1024
+
+_MP3_BITRATES = {
+    # (version_bits, layer_bits) -> kbps по индексу
+    "v1l3": [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0],
+    "v2l3": [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0],
+}
+_MP3_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _mp3_frame(buf: bytes, i: int):
+    if i + 4 > len(buf) or buf[i] != 0xFF or (buf[i + 1] & 0xE0) != 0xE0:
+        return None
+    version = (buf[i + 1] >> 3) & 0x03  # 3 = MPEG1, 2 = MPEG2, 0 = MPEG2.5
+    layer = (buf[i + 1] >> 1) & 0x03  # 1 = Layer III
+    br_idx = (buf[i + 2] >> 4) & 0x0F
+    sr_idx = (buf[i + 2] >> 2) & 0x03
+    if version == 1 or layer != 1 or sr_idx == 3 or br_idx in (0, 15):
+        return None
+    kbps = _MP3_BITRATES["v1l3" if version == 3 else "v2l3"][br_idx]
+    sr = _MP3_RATES[version][sr_idx]
+    mono = (buf[i + 3] >> 6) == 3
+    return {"version": version, "kbps": kbps, "sample_rate": sr, "mono": mono}
+
+
+def _sniff_mp3(buf: bytes, file_size: int):
+    i = 0
+    if buf[:3] == b"ID3" and len(buf) >= 10:
+        tag = buf[6:10]
+        i = 10 + ((tag[0] << 21) | (tag[1] << 14) | (tag[2] << 7) | tag[3])
+    limit = min(len(buf) - 4, i + 8192)
+    while i < limit:
+        fr = _mp3_frame(buf, i)
+        if fr is not None:
+            break
+        i += 1
+    else:
+        return None
+    samples_per_frame = 1152 if fr["version"] == 3 else 576
+    # Xing/Info (VBR) заголовок хранит число кадров
+    side = (17 if fr["mono"] else 32) if fr["version"] == 3 else (9 if fr["mono"] else 17)
+    x = i + 4 + side
+    if buf[x:x + 4] in (b"Xing", b"Info") and len(buf) >= x + 12:
+        flags = struct.unpack(">I", buf[x + 4:x + 8])[0]
+        if flags & 0x1:
+            frames = struct.unpack(">I", buf[x + 8:x + 12])[0]
+            return frames * samples_per_frame / fr["sample_rate"]
+    return (file_size - i) * 8 / (fr["kbps"] * 1000)
+
+
+def _sniff_ogg(path: Path, head: bytes, file_size: int):
+    # Длительность = granule position последней страницы / частота
+    if b"OpusHead" in head[:256]:
+        rate = 48000
+    else:
+        k = head.find(b"\x01vorbis")
+        if k < 0 or len(head) < k + 16:
+            return None
+        rate = struct.unpack("<I", head[k + 12:k + 16])[0]
+    with open(path, "rb") as f:
+        f.seek(max(0, file_size - _SNIFF_BYTES))
+        tail = f.read()
+    k = tail.rfind(b"OggS")
+    if k < 0 or len(tail) < k + 14 or not rate:
+        return None
+    granule = struct.unpack("<q", tail[k + 6:k + 14])[0]
+    return granule / rate if granule > 0 else None
+
+
+def _sniff_mp4(path: Path, file_size: int):
+    # Ищем moov/mvhd среди атомов верхнего уровня (moov бывает в конце файла)
+    with open(path, "rb") as f:
+        pos = 0
+        while pos + 8 <= file_size:
+            f.seek(pos)
+            hdr = f.read(16)
+            size, kind = struct.unpack(">I4s", hdr[:8])
+            if size == 1:
+                size = struct.unpack(">Q", hdr[8:16])[0]
+            elif size == 0:
+                size = file_size - pos
+            if size < 8:
+                return None
+            if kind == b"moov":
+                f.seek(pos + 8)
+                body = f.read(min(size - 8, _SNIFF_BYTES))
+                k = body.find(b"mvhd")
+                if k < 0:
+                    return None
+                v = body[k + 4]
+                if v == 1:
+                    timescale, duration = struct.unpack(">IQ", body[k + 24:k + 36])
+                else:
+                    timescale, duration = struct.unpack(">II", body[k + 16:k + 24])
+                return duration / timescale if timescale else None
+            pos += size
+    return None
+
+
+# Сигнатуры файлов, которые точно не аудио (загрузка с чужим расширением)
+_NON_AUDIO_SIGNATURES = (
+    (b"%PDF", "pdf"),
+    (b"PK\x03\x04", "zip"),
+    (b"\x89PNG", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF8", "gif"),
+    (b"\x1f\x8b", "gzip"),
+    (b"\x7fELF", "elf"),
+    (b"MZ", "exe"),
+)
+
+
+def _non_audio_kind(head: bytes):
+    for magic, kind in _NON_AUDIO_SIGNATURES:
+        if head.startswith(magic):
+            return kind
+    # Обычный текст: аудиокадры почти сразу дают байты, невалидные для UTF-8
+    sample = head[:512]
+    try:
+        text = sample.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    if sample and all(ch.isprintable() or ch in "\r\n\t" for ch in text):
+        return "text"
+    return None
+
+
+def sniff_audio(path: Path) -> Dict:
+    """Определить контейнер по сигнатуре и оценить длительность (O(1) по размеру файла).
+
+    container="unknown" — сигнатура не распознана (например, MP3 с мусором в начале
+    без ID3): такой файл не отклоняем, его проверит ffmpeg в воркере;
+    container=None и not_audio — файл точно не аудио (PDF, архив, картинка, текст).
+    duration_estimate_sec=None — оценить без декодирования не удалось (длительность
+    проверит воркер после нормализации).
+    """
+    path = Path(path)
+    file_size = path.stat().st_size
+    with open(path, "rb") as f:
+        head = f.read(_SNIFF_BYTES)
+    container = "unknown"
+    duration = None
+    not_audio = None
+    try:
+        if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+            container = "wav"
+            header = read_wav_header(path)
+            if header and header["byte_rate"]:
+                duration = header["data_size"] / header["byte_rate"]
+        elif head[:4] == b"OggS":
+            container = "ogg"
+            duration = _sniff_ogg(path, head, file_size)
+        elif head[4:8] == b"ftyp":
+            container = "mp4"
+            duration = _sniff_mp4(path, file_size)
+        elif head[:4] == b"\x1a\x45\xdf\xa3":
+            container = "webm"
+        elif head[:3] == b"ID3" or _mp3_frame(head, 0) is not None:
+            container = "mp3"
+            duration = _sniff_mp3(head, file_size)
+        elif len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xF6) == 0xF0:
+            container = "aac"
+        else:
+            not_audio = _non_audio_kind(head)
+            if not_audio:
+                container = None
+    except (struct.error, IndexError, OSError):
+        duration = None
+    return {"container": container, "not_audio": not_audio, "duration_estimate_sec": duration, "size_bytes": file_size}
@@ -0,0 +1,103 @@
+"""
+Чтение WAV без ffmpeg: разбор RIFF-заголовка и memory-map PCM данных.
+
+Наш normalize_audio пишет 16 кГц mono s16le, такой файл можно отобразить в
+память и конвертировать в float32 по кускам, не запуская ffmpeg повторно.
+"""
+from __future__ import annotations
+
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+_MAX_CHUNKS = 64
+
+
+def read_wav_header(path: Path) -> Optional[Dict]:
+    """Разобрать RIFF/WAVE заголовок. None — если это не WAV или он повреждён."""
+    try:
+        file_size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            head = f.read(12)
+            if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+                return None
+            fmt = None
+            for _ in range(_MAX_CHUNKS):
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    return None
+                cid, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+                if cid == b"fmt ":
+                    body = f.read(size)
+                    if len(body) < 16:
+                        return None
+                    audio_format, channels, sample_rate, byte_rate, block_align, bits = struct.unpack(
+                        "<HHIIHH", body[:16]
+                    )
+                    if audio_format == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                        audio_format = struct.unpack("<H", body[24:26])[0]
+                    fmt = {
+                        "audio_format": audio_format,
+                        "channels": channels,
+                        "sample_rate": sample_rate,
+                        "byte_rate": byte_rate,
+                        "block_align": block_align,
+                        "bits_per_sample": bits,
+                    }
+                    if size % 2:
+                        f.seek(1, os.SEEK_CUR)
+                elif cid == b"data":
+                    if fmt is None:
+                        return None
+                    offset = f.tell()
+                    # ffmpeg при записи в пайп оставляет размер 0/0xFFFFFFFF — берём по файлу
+                    available = file_size - offset
+                    if size == 0 or size == 0xFFFFFFFF or size > available:
+                        size = available
+                    block = fmt["block_align"] or 1
+                    size -= size % block
+                    return {
+                        **fmt,
+                        "data_offset": offset,
+                        "data_size": size,
+                        "num_samples": size // block,
+                    }
+                else:
+                    f.seek(size + (size % 2), os.SEEK_CUR)
+    except (OSError, struct.error):
+        return None
+    return None
+
+
+def is_normalized_wav(header: Optional[Dict], sr: int = 16000) -> bool:
+    """Формат normalize_audio: PCM s16le, mono, заданная частота"""
+    return bool(
+        header
+        and header["audio_format"] == WAVE_FORMAT_PCM
+        and header["channels"] == 1
+        and header["bits_per_sample"] == 16
+        and header["sample_rate"] == sr
+    )
+
+
+def open_pcm(path: Path, sr: int = 16000) -> Optional[np.ndarray]:
+    """Read-only memmap int16 сэмплов нормализованного WAV (или None для других форматов)"""
+    header = read_wav_header(path)
+    if not is_normalized_wav(header, sr):
+        return None
+    if header["num_samples"] == 0:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(path, dtype="<i2", mode="r", offset=header["data_offset"], shape=(header["num_samples"],))
+
+
+def pcm_to_float32(pcm: np.ndarray, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+    """Конвертировать кусок int16 PCM в float32 [-1, 1) одной аллокацией"""
+    view = pcm[start:end]
+    out = np.empty(len(view), dtype=np.float32)
+    np.multiply(view, np.float32(1.0 / 32768.0), out=out, casting="unsafe")
+    return out
@@ -4,6 +4,8 @@
 """
 import os
 import sys
+import time
+import logging
 from pathlib import Path
 import platform
 
@@ -17,20 +19,39 @@ from kits.kit_common.config import settings
 from apps.worker.worker import worker_entry  # оставляем импорт, чтобы функции были загружены
 
 def main():
+    # Логи pipeline (время прогрева и время каждой задачи)
+    logging.basicConfig(
+        level=settings.LOG_LEVEL,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
     print("Запуск MeetingSummarizer Worker...")
     print(f"Redis URL: {settings.REDIS_URL}")
 
     # Подключение к Redis
     redis_conn = Redis.from_url(settings.REDIS_URL)
 
-    # Для Windows используем SimpleWorker (без fork)
+    # Для Windows используем SimpleWorker (без fork).
+    # В режиме preload модели загружаются один раз и задачи выполняются в этом же
+    # процессе, иначе форкнутый потомок каждый раз стартует с пустым кэшем моделей.
     is_windows = os.name == "nt" or platform.system().lower().startswith("win")
-    worker_cls = SimpleWorker if is_windows else Worker
+    preload = settings.WORKER_MODE == "preload"
+    worker_cls = SimpleWorker if (is_windows or preload) else Worker
+
+    if preload:
+        print("Прогрев моделей ASR/выравнивания/диаризации...")
+        from kits.kit_asr.whisperx_asr import warm_up_models
+
+        t0 = time.perf_counter()
+        try:
+            stats = warm_up_models()
+            print(f"Модели прогреты за {time.perf_counter() - t0:.1f} с: {stats['keys']}")
+        except Exception as e:
+            print(f"Прогрев моделей не удался ({time.perf_counter() - t0:.1f} с): {e}")
 
     # Создание worker для очереди 'meeting_summarizer'
     worker = worker_cls(['meeting_summarizer'], connection=redis_conn)
 
-    print(f"Worker класс: {worker_cls.__name__}")
+    print(f"Worker класс: {worker_cls.__name__}, режим: {settings.WORKER_MODE}")
     print("Worker запущен. Ожидание задач...")
     print("Нажмите Ctrl+C для остановки")
 
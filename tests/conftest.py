@@ -16,6 +16,8 @@ def patch_settings(tmp_data_dir, monkeypatch):
     # Point DATA_DIR to temp and use sync mode for tests
     monkeypatch.setattr("kits.kit_common.config.settings.DATA_DIR", str(tmp_data_dir))
     monkeypatch.setattr("kits.kit_common.config.settings.PROCESS_MODE", "sync")
+    # No Redis in tests: process-local LLM limiter
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_LIMITER", "local")
     # Ensure folders exist
     (Path(tmp_data_dir) / "uploads").mkdir(parents=True, exist_ok=True)
 
@@ -26,11 +28,17 @@ def test_app_client(monkeypatch):
     from kits.utils import audio as audio_utils
     monkeypatch.setattr(audio_utils, "normalize_audio", lambda src, dst: Path(dst).write_bytes(b"RIFF"))
     monkeypatch.setattr(audio_utils, "probe_duration_sec", lambda p: 5.0)
+    from kits.utils import audio_info
+    monkeypatch.setattr(
+        audio_info,
+        "probe_audio_info",
+        lambda p: {"duration_sec": 5.0, "sample_rate": 16000, "channels": 1, "num_samples": 80000},
+    )
 
     # Patch run_pipeline to write minimal outputs
     from kits.kit_pipeline import pipeline as pipe
 
-    def fake_run(payload: dict):
+    def fake_run(payload: dict, on_progress=None):
         from kits.kit_common.paths import ensure_job_dirs
         paths = ensure_job_dirs(payload["job_id"])
         out = paths["out_dir"]
@@ -71,6 +79,12 @@ def test_app_client(monkeypatch):
     from kits.kit_llm import openai_backend as llm
     monkeypatch.setattr(llm, "stream_tldr", lambda transcript: iter(["Short ", "summary."]))
 
+    async def fake_astream(transcript, use_cache=True):
+        for t in ["Short ", "summary."]:
+            yield t
+
+    monkeypatch.setattr(llm, "astream_tldr", fake_astream)
+
     from fastapi.testclient import TestClient
     from apps.api.main import app
     client = TestClient(app)
@@ -48,3 +48,131 @@ def test_exports_and_sse(test_app_client):
         assert "event: token" in content
         assert "event: done" in content
 
+
+
+def test_transcribe_async_only_saves_and_enqueues(test_app_client, monkeypatch):
+    import rq
+    from kits.utils import audio as audio_utils
+
+    enqueued = []
+
+    class FakeQueue:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def enqueue(self, fn, payload, **kwargs):
+            enqueued.append(payload)
+
+    def no_ffmpeg(*args, **kwargs):
+        raise AssertionError("API must not run ffmpeg in async mode")
+
+    monkeypatch.setattr(rq, "Queue", FakeQueue)
+    monkeypatch.setattr(audio_utils, "find_ffmpeg_binary", no_ffmpeg)
+    monkeypatch.setattr("kits.kit_common.config.settings.PROCESS_MODE", "async")
+
+    wav = b"RIFF\x24\x00\x00\x00WAVEfmt \x10\x00\x00\x00\x01\x00\x01\x00\x80\x3e\x00\x00\x00\x7d\x00\x00\x02\x00\x10\x00data\x00\x00\x00\x00"
+    r = test_app_client.post("/transcribe", files={"file": ("test.wav", wav, "audio/wav")})
+    assert r.status_code == 200
+    assert r.json()["status"] == "queued"
+    assert enqueued and "audio_info" not in enqueued[0]
+
+    r = test_app_client.post("/transcribe", files={"file": ("test.wav", b"garbage", "audio/wav")})
+    assert r.status_code == 415
+
+    # MP3 с мусором перед первым кадром: сигнатура не распознана, но задача ставится в очередь
+    frame = b"\xff\xfb\x90\x00" + b"\x00" * 413
+    mp3 = b"\x00\x13\x8a\xc4\xff\x02" * 50 + frame * 20
+    r = test_app_client.post("/transcribe", files={"file": ("test.mp3", mp3, "audio/mpeg")})
+    assert r.status_code == 200 and r.json()["status"] == "queued"
+    assert len(enqueued) == 2
+
+
+def test_metrics_include_llm_cache(test_app_client):
+    r = test_app_client.get("/metrics")
+    assert r.status_code == 200
+    cache = r.json()["llm_cache"]
+    assert {"hits", "misses", "evictions", "entries", "size_mb"} <= set(cache)
+
+
+def test_sse_replays_stored_tldr(test_app_client, monkeypatch):
+    from pathlib import Path
+    from kits.kit_common.config import settings
+    from kits.kit_llm import openai_backend as llm
+
+    files = {"file": ("test.wav", b"RIFFDATA", "audio/wav")}
+    job_id = test_app_client.post("/transcribe", files=files).json()["job_id"]
+
+    def stream(body):
+        with test_app_client.stream("POST", "/summary/stream", json=body) as resp:
+            assert resp.status_code == 200
+            return "".join(resp.iter_text())
+
+    first = stream({"job_id": job_id})
+    assert "'cached': False" in first
+    tldr_p = Path(settings.DATA_DIR) / "uploads" / job_id / "out" / "tldr_stream.txt"
+    assert tldr_p.read_text(encoding="utf-8") == "Short summary."
+
+    calls = []
+
+    async def fresh(transcript, use_cache=True):
+        calls.append(use_cache)
+        yield "New."
+
+    monkeypatch.setattr(llm, "astream_tldr", fresh)
+    replay = stream({"job_id": job_id})
+    assert "'cached': True" in replay and "summary." in replay and calls == []
+
+    stream({"job_id": job_id, "regenerate": True})
+    assert calls == [False]
+    assert tldr_p.read_text(encoding="utf-8") == "New."
+
+
+def test_structured_sse(test_app_client, monkeypatch):
+    from pathlib import Path
+    from kits.kit_common.config import settings
+    from kits.kit_llm import openai_backend as llm
+
+    files = {"file": ("test.wav", b"RIFFDATA", "audio/wav")}
+    job_id = test_app_client.post("/transcribe", files=files).json()["job_id"]
+
+    # Finished job: summary.json is replayed without the LLM
+    with test_app_client.stream("POST", "/summary/stream/structured", json={"job_id": job_id}) as resp:
+        content = "".join(resp.iter_text())
+    assert "event: action_item" in content and "Do X" in content and "'cached': True" in content
+
+    # Summary still being generated: events come from the model stream
+    (Path(settings.DATA_DIR) / "uploads" / job_id / "out" / "summary.json").unlink()
+
+    async def fake_summary(transcript):
+        yield "action_item", {"text": "Stream item", "owner": None, "due": None}
+        yield "decision", "Go"
+
+    monkeypatch.setattr(llm, "astream_summary", fake_summary)
+    with test_app_client.stream("POST", "/summary/stream/structured", json={"job_id": job_id}) as resp:
+        content = "".join(resp.iter_text())
+    assert "Stream item" in content and "event: decision" in content and "'cached': False" in content
+
+
+def test_words_are_served_from_word_store(test_app_client):
+    from kits.kit_common.paths import ensure_job_dirs
+    from kits.kit_export import word_store
+
+    paths = ensure_job_dirs("job-words")
+    transcript = {"job_id": "job-words", "segments": [
+        {"start": 0.0, "end": 2.0, "speaker": "Участник 1", "text": "Раз два", "words": [
+            {"start": 0.0, "end": 1.0, "text": "Раз"}, {"start": 1.0, "end": 2.0, "text": "два"},
+        ]},
+    ]}
+    compact = word_store.save_transcript(paths["out_dir"], transcript)
+    (paths["out_dir"] / "transcript.json").write_text(json.dumps(compact), encoding="utf-8")
+    (paths["out_dir"] / "summary.json").write_text(json.dumps({"tldr": "x"}), encoding="utf-8")
+
+    r = test_app_client.get("/result/job-words", params={"words": "true"})
+    assert r.status_code == 200
+    assert [w["text"] for w in r.json()["transcript"]["segments"][0]["words"]] == ["Раз", "два"]
+    r = test_app_client.get("/result/job-words")
+    assert "words" not in r.json()["transcript"]["segments"][0]
+
+    r = test_app_client.get("/words/job-words", params={"start": 0.5, "end": 5})
+    assert [w["text"] for w in r.json()["words"]] == ["два"]
+    assert test_app_client.get("/words/missing-job").status_code == 404
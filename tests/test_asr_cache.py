@@ -0,0 +1,45 @@
+import os
+import wave
+
+import numpy as np
+
+from kits.kit_asr import result_cache
+
+
+def _write_wav(path, samples):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes(samples.astype("<i2").tobytes())
+
+
+def test_key_depends_on_pcm_and_settings(tmp_path, monkeypatch):
+    a, b, c = tmp_path / "a.wav", tmp_path / "b.wav", tmp_path / "c.wav"
+    _write_wav(a, np.arange(1000))
+    _write_wav(b, np.arange(1000))
+    _write_wav(c, np.arange(1000) + 1)
+
+    assert result_cache.cache_key(a, "ru") == result_cache.cache_key(b, "ru")
+    assert result_cache.cache_key(a, "ru") != result_cache.cache_key(c, "ru")
+    assert result_cache.cache_key(a, "ru") != result_cache.cache_key(a, "en")
+    k = result_cache.cache_key(a, "ru")
+    monkeypatch.setattr("kits.kit_common.config.settings.ASR_MODEL", "large-v3")
+    assert result_cache.cache_key(a, "ru") != k
+
+
+def test_put_get_and_lru_eviction(tmp_path, monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.ASR_CACHE_DIR", str(tmp_path / "asr"))
+    result = {"language": "ru", "segments": [{"start": 0.0, "end": 1.0, "text": "привет " * 50}]}
+
+    result_cache.put("k1", result)
+    result_cache.put("k2", result)
+    assert result_cache.get("k1") == result
+    assert result_cache.get("missing") is None
+
+    d = result_cache.cache_dir()
+    os.utime(d / "k2.json", (1, 1))  # k2 — давно не использовался
+    size = (d / "k1.json").stat().st_size
+    assert result_cache.evict(size + 10) == 1
+    assert result_cache.get("k1") == result
+    assert result_cache.get("k2") is None
@@ -0,0 +1,52 @@
+import sys
+
+from kits.utils import audio as audio_utils
+
+
+def _fake_ffmpeg(tmp_path, exit_code=0):
+    # Copies stdin ("-i pipe:0") to the output path given as the last argument
+    script = tmp_path / "ffmpeg"
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys, shutil\n"
+        "with open(sys.argv[-1], 'wb') as out:\n"
+        "    shutil.copyfileobj(sys.stdin.buffer, out)\n"
+        f"sys.exit({exit_code})\n"
+    )
+    script.chmod(0o755)
+    return str(script)
+
+
+def test_streaming_normalizer_pipes_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_utils, "find_ffmpeg_binary", lambda name: _fake_ffmpeg(tmp_path))
+    fallback = []
+    monkeypatch.setattr(audio_utils, "normalize_audio", lambda src, dst: fallback.append(src))
+
+    src, dst = tmp_path / "input.mp3", tmp_path / "work" / "normalized.wav"
+    n = audio_utils.StreamingNormalizer(src, dst, "mp3")
+    for i in range(5):
+        n.write(bytes([i]) * 1000)
+    n.finish()
+
+    assert src.read_bytes() == dst.read_bytes()
+    assert n.bytes_written == 5000
+    assert fallback == []
+
+
+def test_streaming_normalizer_falls_back_to_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_utils, "find_ffmpeg_binary", lambda name: _fake_ffmpeg(tmp_path, exit_code=1))
+    fallback = []
+    monkeypatch.setattr(audio_utils, "normalize_audio", lambda src, dst: fallback.append(src))
+
+    src, dst = tmp_path / "input.ogg", tmp_path / "normalized.wav"
+    n = audio_utils.StreamingNormalizer(src, dst, "ogg")
+    n.write(b"OggS" + b"\x00" * 100)
+    n.finish()
+    assert fallback == [src]
+
+    # m4a needs a seekable input and is normalized from the saved file
+    src = tmp_path / "input.m4a"
+    n = audio_utils.StreamingNormalizer(src, dst, "m4a")
+    n.write(b"\x00\x00\x00\x20ftypM4A ")
+    n.finish()
+    assert fallback == [tmp_path / "input.ogg", src]
@@ -0,0 +1,89 @@
+import json
+from types import SimpleNamespace
+
+from kits.kit_llm import compaction
+from kits.kit_llm import openai_backend as llm
+
+
+def test_clean_text_removes_disfluencies():
+    assert compaction.clean_text("Э-э, ну, я я я думаю, что про- проект надо, мм, закрыть") == "я думаю, что проект надо, закрыть"
+    assert compaction.clean_text("Давайте, давайте начнём") == "Давайте начнём"
+    assert compaction.clean_text("что что-то пошло не так") == "что что-то пошло не так"
+    assert compaction.clean_text("Эээ...") == ""
+
+
+def test_compact_transcript_aliases_merges_and_dedups():
+    segments = [
+        {"speaker": "Участник 1", "text": "Всем привет."},
+        {"speaker": "Участник 1", "text": "Начнём с бюджета."},
+        {"speaker": "Анна Петрова", "text": "Мм."},
+        {"speaker": "Анна Петрова", "text": "Я подготовлю отчёт к пятнице по всем расходам проекта."},
+        {"speaker": "Анна Петрова", "text": "Я подготовлю отчёт к пятнице по всем расходам проекта!"},
+        {"speaker": "Участник 1", "text": "Реплика номер 1"},
+        {"speaker": "Участник 1", "text": "Реплика номер 2"},
+    ]
+    out = compaction.compact_transcript(segments)
+    assert out["lines"] == [
+        "[S1]: Всем привет. Начнём с бюджета.",
+        "[S2]: Я подготовлю отчёт к пятнице по всем расходам проекта.",
+        "[S1]: Реплика номер 1 Реплика номер 2",
+    ]
+    assert out["legend"] == "Участники: [S1] — Участник 1; [S2] — Анна Петрова"
+    assert out["aliases"] == {"[S1]": "Участник 1", "[S2]": "Анна Петрова"}
+    assert 0 < out["tokens_after"] < out["tokens_before"]
+
+    plain = compaction.compact_transcript(segments, use_aliases=False)
+    assert plain["legend"] == "" and plain["lines"][1].startswith("Анна Петрова: ")
+
+
+def test_same_words_from_another_speaker_are_kept():
+    segments = [
+        {"speaker": "Анна", "text": "Согласен, делаем релиз в пятницу."},
+        {"speaker": "Борис", "text": "Согласен, делаем релиз в пятницу."},
+        {"speaker": "Борис", "text": "Согласен, делаем релиз в пятницу."},
+    ]
+    out = compaction.compact_transcript(segments)
+    assert out["lines"] == ["[S1]: Согласен, делаем релиз в пятницу.", "[S2]: Согласен, делаем релиз в пятницу."]
+
+
+def test_restore_aliases_keeps_owner_attribution():
+    aliases = {"[S1]": "Участник 1", "[S2]": "Анна Петрова", "[S3]": "Иван"}
+    summary = {
+        "tldr": "[S1] предложил план, [S2] согласилась. Перенести бэкапы в S3.",
+        "action_items": [{"text": "Отчёт по расходам", "owner": "S2", "due": "пятница"},
+                         {"text": "[S1] созывает встречу", "owner": "Борис", "due": None},
+                         {"text": "Настроить S3", "owner": "[S3]", "due": None}],
+        "decisions": ["Принят план [S1]"],
+        "risks": [],
+    }
+    out = compaction.restore_aliases(summary, aliases)
+    assert out["tldr"] == "Участник 1 предложил план, Анна Петрова согласилась. Перенести бэкапы в S3."
+    assert out["action_items"][0]["owner"] == "Анна Петрова"
+    assert out["action_items"][1] == {"text": "Участник 1 созывает встречу", "owner": "Борис", "due": None}
+    assert out["action_items"][2] == {"text": "Настроить S3", "owner": "Иван", "due": None}
+    assert out["decisions"] == ["Принят план Участник 1"]
+
+
+def test_summary_prompt_is_compacted_and_savings_reported(monkeypatch):
+    sent = []
+
+    def create(**kwargs):
+        sent.append(kwargs["messages"])
+        content = json.dumps({"tldr": "Итог.", "action_items": [{"text": "Отчёт", "owner": "S2", "due": None}],
+                              "decisions": [], "risks": []})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm, "_client", lambda: client)
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_CACHE", False)
+    transcript = {"segments": [
+        {"speaker": "Участник 1", "text": "Э-э, кто подготовит отчёт?"},
+        {"speaker": "Участник 2", "text": "Я я подготовлю."},
+    ]}
+    out = llm.summarize_transcript(transcript)
+
+    system, user = sent[0][0]["content"], sent[0][1]["content"]
+    assert "[S2] — Участник 2" in system
+    assert user == "[S1]: кто подготовит отчёт?\n[S2]: Я подготовлю."
+    assert out["action_items"][0]["owner"] == "Участник 2"
+    assert out["_compaction"]["tokens_saved"] == out["_compaction"]["tokens_before"] - out["_compaction"]["tokens_after"]
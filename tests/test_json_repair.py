@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from kits.kit_llm import json_repair
+from kits.kit_llm import openai_backend as llm
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('```json\n{"tldr": "Итог", "risks": ["a",]}\n```', {"tldr": "Итог", "risks": ["a"]}),
+        ("<think>нужно {подумать}</think>\nОтвет: {'tldr': 'Итог', 'done': True, 'n': -1.5e2}",
+         {"tldr": "Итог", "done": True, "n": -150.0}),
+        ('Вот JSON: {tldr: "Итог", decisions: ["d1", "d2",],} Надеюсь, помог.', {"tldr": "Итог", "decisions": ["d1", "d2"]}),
+        ("{'tldr': 'It\\'s \"ok\"'}", {"tldr": "It's \"ok\""}),
+        ('{"tldr": "строка\nс переносом"}', {"tldr": "строка\nс переносом"}),
+    ],
+)
+def test_repair_common_breakage(text, expected):
+    assert json_repair.repair_json(text) == expected
+
+
+def test_repair_truncated_output():
+    text = '{"tldr": "Итог", "action_items": [{"text": "Сделать X", "owner": "Анна"}, {"text": "Сделать Y", "ow'
+    data = json_repair.repair_json(text)
+    assert data["tldr"] == "Итог"
+    assert data["action_items"][0] == {"text": "Сделать X", "owner": "Анна"}
+
+    assert json_repair.repair_json('{"tldr": "обрыв посреди стро') == {"tldr": "обрыв посреди стро"}
+    assert json_repair.repair_json("просто текст без JSON") is None
+
+
+def test_coerce_to_schema():
+    data = {
+        "Summary": ["Первое.", "Второе."],
+        "actions": ["Позвонить", {"task": "x", "text": "Написать", "assignee": "Борис", "deadline": "пятница"}],
+        "decisions": [{"text": "Решение"}, ""],
+        "risks": "Один риск",
+    }
+    assert json_repair.coerce_to_schema(data) == {
+        "tldr": "Первое. Второе.",
+        "action_items": [
+            {"text": "Позвонить", "owner": None, "due": None},
+            {"text": "Написать", "owner": "Борис", "due": "пятница"},
+        ],
+        "decisions": ["Решение"],
+        "risks": ["Один риск"],
+    }
+
+
+def test_parse_summary_json_prefers_local_repair(monkeypatch, tmp_path):
+    from kits.kit_common import counters
+
+    monkeypatch.setattr("kits.kit_common.config.settings.DATA_DIR", str(tmp_path))
+    calls = []
+    monkeypatch.setattr(llm, "_format_text_to_json", lambda text: calls.append(text) or {"tldr": "llm"})
+
+    assert llm._parse_summary_json(json.dumps({"tldr": "ok"})) == {"tldr": "ok"}
+    assert llm._parse_summary_json('```json\n{"tldr": "ok",}\n```')["tldr"] == "ok"
+    assert llm._parse_summary_json("Встреча прошла хорошо.") == {"tldr": "llm"}
+    assert calls == ["Встреча прошла хорошо."]
+    assert counters.snapshot("llm_json_") == {
+        "llm_json_llm_repair": 1,
+        "llm_json_local_repair": 1,
+        "llm_json_strict": 1,
+    }
+
+
+def test_single_pass_summary_keeps_unparsed_text_without_extra_call(monkeypatch, tmp_path):
+    from types import SimpleNamespace
+
+    from kits.kit_common import counters
+
+    monkeypatch.setattr("kits.kit_common.config.settings.DATA_DIR", str(tmp_path))
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_CACHE", False)
+    requests = []
+
+    def create(**kwargs):
+        requests.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Встреча прошла хорошо."))],
+                               usage=None)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm, "_client", lambda: client)
+    out = llm.summarize_transcript({"segments": [{"speaker": "Анна", "text": "Всё по плану."}]})
+    assert out["tldr"] == "Встреча прошла хорошо."
+    assert len(requests) == 1
+    assert counters.snapshot("llm_json_") == {"llm_json_as_text": 1}
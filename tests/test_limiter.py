@@ -0,0 +1,126 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from openai import BadRequestError, InternalServerError, RateLimitError
+
+from kits.kit_llm import limiter
+
+
+@pytest.fixture(autouse=True)
+def local_limiter(monkeypatch, tmp_path):
+    monkeypatch.setattr("kits.kit_common.config.settings.DATA_DIR", str(tmp_path))
+    monkeypatch.setitem(limiter._state, "local", limiter.LocalLimiter())
+    monkeypatch.setattr(limiter, "_POLL_SEC", 0.005)
+    monkeypatch.setattr(limiter, "_POLL_MAX_SEC", 0.01)
+
+
+def _error(cls, status, retry_after=None):
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    return cls(f"HTTP {status}", response=SimpleNamespace(status_code=status, headers=headers, request=None), body=None)
+
+
+def test_caps_in_flight_requests(monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_MAX_INFLIGHT", 2)
+    state = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            state["now"] += 1
+            state["max"] = max(state["max"], state["now"])
+        time.sleep(0.03)
+        with lock:
+            state["now"] -= 1
+        return "ok"
+
+    threads = [threading.Thread(target=limiter.call, args=(work,)) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert state["max"] == 2
+    stats = limiter.stats()
+    assert stats["calls"] == 6 and stats["avg_wait_ms"] > 0
+
+
+def test_interactive_requests_go_first(monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_MAX_INFLIGHT", 1)
+    order = []
+    busy = limiter.slot(limiter.BATCH)
+    busy.__enter__()
+
+    def run(priority):
+        with limiter.slot(priority):
+            order.append(priority)
+
+    batch = threading.Thread(target=run, args=(limiter.BATCH,))
+    batch.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=run, args=(limiter.INTERACTIVE,))
+    interactive.start()
+    time.sleep(0.05)
+    busy.__exit__(None, None, None)
+    batch.join()
+    interactive.join()
+    assert order == [limiter.INTERACTIVE, limiter.BATCH]
+
+
+def test_token_rate_limit(monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_TOKENS_PER_SEC", 20000.0)
+    local = limiter._state["local"]
+    assert local.try_acquire("a", limiter.BATCH, 50000)  # bucket may go negative once
+    assert not local.try_acquire("b", limiter.BATCH, 10)
+    local.tokens = 1.0
+    assert local.try_acquire("c", limiter.BATCH, 10)
+
+
+def test_retries_with_backoff_on_429_and_5xx(monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_RETRY_BASE_SEC", 0.01)
+    sleeps = []
+    monkeypatch.setattr(limiter.time, "sleep", lambda s: sleeps.append(s))
+    errors = [_error(RateLimitError, 429, retry_after="0.5"), _error(InternalServerError, 503)]
+
+    def flaky():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert limiter.call(flaky) == "ok"
+    assert len(sleeps) == 2
+    assert sleeps[0] >= 0.5  # Retry-After is respected
+    assert limiter.stats()["retries"] == 2
+
+    calls = []
+
+    def bad():
+        calls.append(1)
+        raise _error(BadRequestError, 400)
+
+    with pytest.raises(BadRequestError):
+        limiter.call(bad)
+    assert calls == [1]
+
+
+def test_gives_up_after_configured_retries(monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_RETRIES", 2)
+    monkeypatch.setattr(limiter.time, "sleep", lambda s: None)
+    calls = []
+
+    def down():
+        calls.append(1)
+        raise _error(InternalServerError, 500)
+
+    with pytest.raises(InternalServerError):
+        limiter.call(down)
+    assert len(calls) == 3
+
+
+def test_falls_back_to_local_when_redis_is_down(monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_LIMITER", "redis")
+    monkeypatch.setattr("kits.kit_common.config.settings.REDIS_URL", "redis://127.0.0.1:1/0")
+    monkeypatch.setitem(limiter._state, "redis", None)
+    monkeypatch.setitem(limiter._state, "redis_down_until", 0.0)
+    assert limiter.call(lambda: "ok") == "ok"
+    assert isinstance(limiter._backend(), limiter.LocalLimiter)
@@ -0,0 +1,299 @@
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from kits.kit_llm import openai_backend as llm
+
+
+def _resp(content, tokens=10):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(total_tokens=tokens),
+    )
+
+
+class FakeClient:
+    """Answers chunk prompts with one action item and merges partial summaries"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            user = kwargs["messages"][-1]["content"]
+            if user.startswith("Сводка части"):
+                items = []
+                for block in user.split("Сводка части")[1:]:
+                    items.extend(json.loads(block.split(":\n", 1)[1])["action_items"])
+                return _resp(json.dumps({"tldr": "Итог.", "action_items": items, "decisions": [], "risks": []}))
+            first = user.splitlines()[0]
+            return _resp(json.dumps({"tldr": "Часть.", "action_items": [{"text": first, "owner": "", "due": ""}],
+                                     "decisions": [], "risks": []}))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def _transcript(n):
+    return {"segments": [{"speaker": "Участник 1", "text": f"реплика номер {i}"} for i in range(n)]}
+
+
+def test_mapreduce_runs_chunks_concurrently_and_reduces_in_tree(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(llm, "_client", lambda: client)
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_MAX_TOKENS", 400)
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_CONCURRENCY", 4)
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_REDUCE_FANIN", 4)
+    monkeypatch.setattr(llm, "chunk_by_token_budget", lambda lines, budget: lines)  # one line per chunk
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_COMPACT_TRANSCRIPT", False)  # keep 16 separate lines
+
+    out = llm.summarize_transcript_mapreduce(_transcript(16))
+
+    # 16 map calls + 4 reduces + 1 final reduce
+    assert client.calls == 21
+    assert client.max_in_flight == 4
+    assert len(out["action_items"]) == 16
+    assert out["action_items"][0]["text"] == "Участник 1: реплика номер 0"
+    assert out["_tokens_used"] == 210
+
+
+def test_strategy_depends_on_context_budget(monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_MAX_TOKENS", 1000)
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_ITERATIVE_MAX_CHUNKS", 3)
+    assert llm.choose_summary_strategy(3000, 8000) == "single"
+    assert llm.choose_summary_strategy(15000, 8000) == "iterative"
+    assert llm.choose_summary_strategy(60000, 8000) == "map_reduce"
+
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_MODEL", "small")
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_CONTEXT_BUDGETS", "small=4096, big=131072")
+    assert llm.context_budget() == 4096
+    assert llm.context_budget("big") == 131072
+    assert llm.context_budget("other") == 32768
+
+
+def test_summarize_auto_records_strategy(monkeypatch):
+    monkeypatch.setattr(llm, "summarize_transcript", lambda t, prompt=None: {"tldr": "single"})
+    monkeypatch.setattr(llm, "summarize_transcript_mapreduce", lambda t, prompt=None: {"tldr": "mapreduce"})
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_MAX_TOKENS", 256)
+
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_CONTEXT_TOKENS", 32768)
+    out = llm.summarize_auto(_transcript(10))
+    assert out["tldr"] == "single" and out["_strategy"] == "single"
+    assert out["_prompt_tokens"] > 0 and out["_context_tokens"] == 32768
+
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_CONTEXT_TOKENS", 512)
+    out = llm.summarize_auto(_transcript(500))
+    assert out["_strategy"] == "map_reduce" and out["tldr"] == "mapreduce"
+
+
+def test_strategy_and_executors_share_chunk_budget(monkeypatch):
+    client = FakeClient(delay=0)
+    monkeypatch.setattr(llm, "_client", lambda: client)
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_CACHE", False)
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_CONTEXT_TOKENS", 4096)
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_MAX_TOKENS", 1024)
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_ITERATIVE_MAX_CHUNKS", 3)
+    budgets = []
+    real_chunk = llm.chunk_by_token_budget
+
+    def spy(lines, budget):
+        budgets.append(budget)
+        return real_chunk(lines, budget)
+
+    monkeypatch.setattr(llm, "chunk_by_token_budget", spy)
+    rnd = random.Random(0)
+    vocab = "сроки релиза бюджет риски модуль оплаты заказчик отчёт тесты сервер перенос команда".split()
+    transcript = {"segments": [
+        {"speaker": ["Анна", "Борис"][i % 2], "text": " ".join(rnd.choice(vocab) for _ in range(12))}
+        for i in range(400)
+    ]}
+
+    out = llm.summarize_auto(transcript)
+    chunks = len(real_chunk(llm._transcript_prompt(transcript)["lines"], llm._map_budget()))
+    # Оценка по всему входу дала бы 3 части (iterative), исполнитель же режет на большее число
+    assert chunks > 3
+    assert out["_strategy"] == "map_reduce"
+    assert set(budgets) == {llm._map_budget()}
+    assert client.calls > chunks  # map по каждой части + reduce
+
+
+def test_iterative_splits_chunks_when_state_outgrows_reserve(monkeypatch):
+    from kits.kit_llm.token_utils import count_tokens_messages
+
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_CACHE", False)
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_CONTEXT_TOKENS", 2048)
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_MAX_TOKENS", 512)
+    sent = []
+
+    def create(**kwargs):
+        sent.append(kwargs["messages"])
+        # Состояние с длинным списком решений — больше запаса под него в _map_budget()
+        state = {"tldr": "Итог.", "action_items": [], "risks": [],
+                 "decisions": [f"решение {i}: перенести релиз и согласовать бюджет с заказчиком" for i in range(30)]}
+        return _resp(json.dumps(state, ensure_ascii=False))
+
+    monkeypatch.setattr(llm, "_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    rnd = random.Random(1)
+    vocab = "сроки релиза бюджет риски модуль оплаты заказчик отчёт тесты сервер перенос команда".split()
+    transcript = {"segments": [
+        {"speaker": ["Анна", "Борис"][i % 2], "text": " ".join(rnd.choice(vocab) for _ in range(12))}
+        for i in range(300)
+    ]}
+    initial = len(llm.chunk_by_token_budget(llm._transcript_prompt(transcript)["lines"], llm._map_budget()))
+
+    llm.summarize_transcript_iterative(transcript)
+    parts = sent[:-1]  # последний запрос — финальная «причёска» сводки
+    assert len(parts) > initial
+    assert all(count_tokens_messages(m) <= llm._input_budget() for m in parts)
+
+
+def _start_stub():
+    """Minimal OpenAI-compatible /chat/completions that counts TCP connections"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    connections = []
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            connections.append(self.client_address)
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            requests.append(body)
+            base = {"id": "c1", "created": 0, "model": body["model"]}
+            if body.get("stream"):
+                events = []
+                for t in ["Коротко ", "о встрече."]:
+                    chunk = {**base, "object": "chat.completion.chunk",
+                             "choices": [{"index": 0, "delta": {"content": t}, "finish_reason": None}]}
+                    events.append(f"data: {json.dumps(chunk)}\n\n")
+                events.append("data: [DONE]\n\n")
+                payload, ctype = "".join(events).encode(), "text/event-stream"
+            else:
+                payload = json.dumps({**base, "object": "chat.completion", "choices": [{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": '{"tldr": "ok"}'},
+                }]}).encode()
+                ctype = "application/json"
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.requests = requests
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, connections
+
+
+def test_shared_client_reuses_connections(monkeypatch):
+    server, connections = _start_stub()
+    try:
+        monkeypatch.setattr("kits.kit_common.config.settings.OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+        monkeypatch.setattr("kits.kit_common.config.settings.LLM_CACHE", False)
+        client = llm._client()
+        assert llm._client() is client
+        for _ in range(5):
+            assert llm._request_summary_json(llm._client(), [{"role": "user", "content": "x"}]) == {"tldr": "ok"}
+        assert len(connections) == 1
+
+        # Новые настройки — новый клиент
+        monkeypatch.setattr("kits.kit_common.config.settings.LLM_HTTP_POOL_SIZE", 2)
+        assert llm._client() is not client
+    finally:
+        server.shutdown()
+
+
+def test_astream_tldr_uses_async_client(monkeypatch):
+    import asyncio
+
+    server, connections = _start_stub()
+    try:
+        monkeypatch.setattr("kits.kit_common.config.settings.OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+        monkeypatch.setattr("kits.kit_common.config.settings.LLM_CACHE", False)
+
+        async def run():
+            first = [t async for t in llm.astream_tldr(_transcript(2))]
+            second = [t async for t in llm.astream_tldr(_transcript(2))]
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert "".join(first) == "Коротко о встрече." and first == second
+        assert len(connections) == 1
+    finally:
+        server.shutdown()
+
+
+def test_identical_requests_are_served_from_cache(monkeypatch, tmp_path):
+    import asyncio
+    from kits.kit_llm import response_cache
+
+    monkeypatch.setattr("kits.kit_common.config.settings.DATA_DIR", str(tmp_path))
+    server, _ = _start_stub()
+    try:
+        monkeypatch.setattr("kits.kit_common.config.settings.OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+        msgs = [{"role": "user", "content": "x"}]
+        usage = []
+        assert llm._request_summary_json(llm._client(), msgs, usage=usage) == {"tldr": "ok"}
+        assert llm._request_summary_json(llm._client(), msgs, usage=usage) == {"tldr": "ok"}
+        assert len(server.requests) == 1
+        assert usage == []  # stub reports no usage; a cached answer must not add any either
+
+        async def run():
+            return [[t async for t in llm.astream_tldr(_transcript(2))] for _ in range(2)]
+
+        first, second = asyncio.run(run())
+        assert "".join(first) == "".join(second) == "Коротко о встрече."
+        assert len(server.requests) == 2
+
+        stats = response_cache.stats()
+        assert stats["hits"] == 2 and stats["misses"] == 2 and stats["entries"] == 2
+    finally:
+        server.shutdown()
+
+
+def test_cache_key_depends_on_backend(monkeypatch):
+    from kits.kit_llm import response_cache
+
+    kwargs = {"model": "m", "messages": [{"role": "user", "content": "x"}], "temperature": 0, "max_tokens": 10}
+    monkeypatch.setattr("kits.kit_common.config.settings.OPENAI_BASE_URL", "http://a/v1")
+    key_a = response_cache.cache_key(llm._cache_params(kwargs))
+    monkeypatch.setattr("kits.kit_common.config.settings.OPENAI_BASE_URL", "http://b/v1")
+    assert response_cache.cache_key(llm._cache_params(kwargs)) != key_a
+
+
+def test_cache_evicts_old_and_least_recently_used(monkeypatch, tmp_path):
+    from contextlib import closing
+    from kits.kit_llm import response_cache
+
+    monkeypatch.setattr("kits.kit_common.config.settings.DATA_DIR", str(tmp_path))
+    for i in range(4):
+        response_cache.put(f"k{i}", "x" * 1000)
+    with closing(response_cache._connect()) as con:
+        con.execute("UPDATE responses SET created = created - 7200 WHERE key = 'k0'")
+        con.execute("UPDATE responses SET accessed = accessed - 60 WHERE key = 'k1'")
+        assert response_cache.evict(con, 2000, 3600) == 2
+
+    assert response_cache.get("k0") is None and response_cache.get("k1") is None
+    assert response_cache.get("k2") == "x" * 1000
+    assert response_cache.stats()["evictions"] == 2
@@ -0,0 +1,46 @@
+from kits.kit_asr.model_cache import ModelCache
+
+
+def test_model_cache_hits_and_lru_eviction():
+    cache = ModelCache(max_size=2)
+    loads = []
+
+    def loader(name):
+        def _load():
+            loads.append(name)
+            return f"model-{name}"
+        return _load
+
+    assert cache.get_or_load(("asr", "base", "int8", "cpu", None), loader("a")) == "model-a"
+    assert cache.get_or_load(("asr", "base", "int8", "cpu", None), loader("a")) == "model-a"
+    assert loads == ["a"]
+
+    cache.get_or_load(("align", "wav2vec2", "default", "cpu", "ru"), loader("b"))
+    # touch "a" so "b" becomes least recently used
+    cache.get_or_load(("asr", "base", "int8", "cpu", None), loader("a"))
+    cache.get_or_load(("diarize", "pyannote", "default", "cpu", None), loader("c"))
+    cache.get_or_load(("align", "wav2vec2", "default", "cpu", "ru"), loader("b"))
+
+    assert loads == ["a", "b", "c", "b"]
+    st = cache.stats()
+    assert st["hits"] == 2
+    assert st["misses"] == 4
+    assert st["evictions"] == 2
+    assert st["size"] == 2
+
+
+def test_failed_load_does_not_leak_key_lock():
+    cache = ModelCache(max_size=2)
+    key = ("asr", "broken", "int8", "cpu", None)
+
+    def fail():
+        raise RuntimeError("нет модели")
+
+    for _ in range(3):
+        try:
+            cache.get_or_load(key, fail)
+        except RuntimeError:
+            pass
+    assert cache._key_locks == {}
+    assert cache.get_or_load(key, lambda: "model") == "model"
+    assert cache._key_locks == {}
@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+from kits.kit_llm import openai_backend as llm
+from kits.kit_llm.partial_json import SummaryStreamParser
+
+ANSWER = (
+    '<think>план: {"tldr": ...}</think>```json\n'
+    '{"tldr": "Обсудили \\"релиз\\".", "action_items": [{"text": "Отчёт", "owner": "S2", "due": null, '
+    '"tags": ["a", {"b": 1}]}, "Позвонить"], "decisions": ["Релиз в пятницу", 5], '
+    '"risks": ["Нет тестов"], "extra": {"risks": ["не риск"]}}\n```'
+)
+
+
+def _feed_by(text, step):
+    parser = SummaryStreamParser()
+    events = []
+    for i in range(0, len(text), step):
+        events.extend((i, ev) for ev in parser.feed(text[i:i + step]))
+    return parser, events
+
+
+def test_events_are_emitted_as_elements_complete():
+    parser, events = _feed_by(ANSWER, 1)
+    assert [ev for _, ev in events] == [
+        ("tldr", 'Обсудили "релиз".'),
+        ("action_item", {"text": "Отчёт", "owner": "S2", "due": None}),
+        ("action_item", {"text": "Позвонить", "owner": None, "due": None}),
+        ("decision", "Релиз в пятницу"),
+        ("decision", "5"),
+        ("risk", "Нет тестов"),
+    ]
+    # The first action item is reported right after its closing brace, not at the end
+    first_item_pos = next(i for i, ev in events if ev[0] == "action_item")
+    assert first_item_pos == ANSWER.index('}, "Позвонить"')
+    assert parser.result()["risks"] == ["Нет тестов"]
+
+
+def test_chunking_does_not_change_events():
+    _, by_char = _feed_by(ANSWER, 1)
+    _, by_block = _feed_by(ANSWER, 17)
+    assert [ev for _, ev in by_char] == [ev for _, ev in by_block]
+
+
+def test_truncated_answer_still_yields_result():
+    parser, events = _feed_by('{"tldr": "Итог", "action_items": [{"text": "A"}, {"text": "Б', 5)
+    assert [kind for _, (kind, _) in events] == ["tldr", "action_item"]
+    assert parser.result()["action_items"][0]["text"] == "A"
+
+
+def test_astream_summary_restores_aliases(monkeypatch):
+    answer = json.dumps({"tldr": "[S1] доволен.", "action_items": [{"text": "Отчёт", "owner": "[S2]", "due": None}],
+                         "decisions": [], "risks": ["[S2] в отпуске"]}, ensure_ascii=False)
+
+    async def fake_stream(request, priority=None):
+        for i in range(0, len(answer), 7):
+            yield answer[i:i + 7]
+
+    monkeypatch.setattr(llm, "_astream_chat", fake_stream)
+    transcript = {"segments": [
+        {"speaker": "Иван", "text": "Всё хорошо."},
+        {"speaker": "Анна", "text": "Подготовлю отчёт."},
+    ]}
+
+    async def run():
+        return [ev async for ev in llm.astream_summary(transcript)]
+
+    events = asyncio.run(run())
+    assert events[0] == ("tldr", "Иван доволен.")
+    assert events[1] == ("action_item", {"text": "Отчёт", "owner": "Анна", "due": None})
+    assert events[2] == ("risk", "Анна в отпуске")
+    kind, summary = events[-1]
+    assert kind == "summary" and summary["action_items"][0]["owner"] == "Анна"
+
+
+def test_astream_summary_chunks_like_map_reduce(monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_CONTEXT_TOKENS", 1024)
+    monkeypatch.setattr("kits.kit_common.config.settings.LLM_MAX_TOKENS", 256)
+    budgets, sent = [], []
+    real_chunk = llm.chunk_by_token_budget
+
+    def spy(lines, budget):
+        budgets.append(budget)
+        return real_chunk(lines, budget)
+
+    async def fake_stream(request, priority=None):
+        sent.append(request)
+        yield json.dumps({"tldr": "Часть.", "action_items": [], "decisions": [], "risks": []})
+
+    monkeypatch.setattr(llm, "chunk_by_token_budget", spy)
+    monkeypatch.setattr(llm, "_astream_chat", fake_stream)
+    transcript = {"segments": [
+        {"speaker": ["Иван", "Анна"][i % 2], "text": f"Пункт {i}: " + "обсуждаем сроки и бюджет " * (i % 5 + 1)}
+        for i in range(200)
+    ]}
+
+    async def run():
+        return [ev async for ev in llm.astream_summary(transcript)]
+
+    events = asyncio.run(run())
+    assert budgets == [llm._map_budget()]
+    assert len(sent) == len(real_chunk(llm._transcript_prompt(transcript)["lines"], llm._map_budget())) > 1
+    assert events[-1][0] == "summary"
@@ -33,7 +33,7 @@ def test_pipeline_with_mocks(tmp_path, monkeypatch):
     monkeypatch.setattr(
         llm,
         "summarize_transcript",
-        lambda transcript: {
+        lambda transcript, prompt=None: {
             "tldr": "Short summary.",
             "action_items": [{"text": "Do X", "owner": None, "due": None}],
             "decisions": ["Decide Y"],
@@ -50,8 +50,12 @@ def test_pipeline_with_mocks(tmp_path, monkeypatch):
     work_wav.write_bytes(b"RIFF")
 
     # Pretend duration is small
-    from kits.utils import audio as audio_utils
-    monkeypatch.setattr(audio_utils, "probe_duration_sec", lambda p: 5.0)
+    from kits.utils import audio_info
+    monkeypatch.setattr(
+        audio_info,
+        "probe_audio_info",
+        lambda p: {"duration_sec": 5.0, "sample_rate": 16000, "channels": 1, "num_samples": 80000},
+    )
 
     # Run pipeline
     from kits.kit_pipeline.pipeline import run_pipeline
@@ -71,6 +75,199 @@ def test_pipeline_with_mocks(tmp_path, monkeypatch):
     sm = json.loads((out_dir / "summary.json").read_text(encoding="utf-8"))
     assert tr["language"] == "en"
     assert tr["segments"] and tr["segments"][0]["text"].startswith("Hello")
+    # Слова — в колоночном хранилище, не в transcript.json
+    assert "words" not in tr["segments"][0] and tr["word_store"]["count"] == 2
+    assert (out_dir / "words" / "meta.json").exists()
+    assert "Hello world" in (out_dir / "subs.srt").read_text(encoding="utf-8")
     assert sm["tldr"].startswith("Short")
     assert res["job_id"] == job_id
 
+    timings = json.loads((paths["work_dir"] / "timings.json").read_text(encoding="utf-8"))
+    assert timings["status"] == "done"
+    assert {"normalize", "asr", "postprocess", "summarize", "export"} <= set(timings["spans"])
+    assert timings["spans"]["asr"]["wall_sec"] >= 0 and timings["spans"]["asr"]["rss_peak_mb"]
+
+
+
+def test_pipeline_resumes_from_failed_stage(tmp_path, monkeypatch):
+    import shutil
+
+    from kits.kit_export import word_store
+    from kits.kit_common.config import settings
+    from kits.kit_asr import whisperx_asr as asr
+    from kits.kit_llm import openai_backend as llm
+    from kits.kit_common.paths import ensure_job_dirs
+    from kits.utils import audio_info
+    from kits.kit_pipeline.pipeline import run_pipeline
+
+    monkeypatch.setattr(settings, "ASR_CACHE", False)
+    calls = {"asr": 0, "llm": 0}
+
+    def fake_asr(wav_path, language=None):
+        calls["asr"] += 1
+        return {
+            "language": "ru",
+            "segments": [{"start": 0.0, "end": 1.0, "text": "Привет", "speaker": "Участник 1",
+                          "words": [{"start": 0.0, "end": 1.0, "text": "Привет"}]}],
+        }
+
+    def fake_summary(transcript, prompt=None):
+        calls["llm"] += 1
+        if calls["llm"] == 1:
+            raise TimeoutError("LLM timeout")
+        return {"tldr": "Итог", "action_items": [], "decisions": [], "risks": []}
+
+    monkeypatch.setattr(asr, "transcribe_with_whisperx", fake_asr)
+    monkeypatch.setattr(llm, "summarize_transcript", fake_summary)
+    monkeypatch.setattr(
+        audio_info,
+        "probe_audio_info",
+        lambda p: {"duration_sec": 5.0, "sample_rate": 16000, "channels": 1, "num_samples": 80000},
+    )
+    paths = ensure_job_dirs("job-resume")
+    (paths["work_dir"] / "normalized.wav").write_bytes(b"RIFF")
+    payload = {"job_id": "job-resume", "input_path": str(paths["in_dir"] / "input.wav"), "language": "ru"}
+
+    # Первая попытка падает на LLM; ASR уже зафиксирован
+    try:
+        run_pipeline(payload)
+        raise AssertionError("expected TimeoutError")
+    except TimeoutError:
+        pass
+    assert calls == {"asr": 1, "llm": 1}
+    assert (paths["work_dir"] / "stages" / "asr.json").exists()
+
+    # Повтор продолжает с резюмирования
+    run_pipeline(payload)
+    assert calls == {"asr": 1, "llm": 2}
+    assert (paths["out_dir"] / "minutes.md").exists()
+
+    # Контрольные точки без слов: слова лежат колонками и ссылкой word_store
+    for name in ("asr", "postprocess"):
+        saved = json.loads((paths["work_dir"] / "stages" / f"{name}.json").read_text(encoding="utf-8"))
+        assert all("words" not in seg for seg in saved["output"]["segments"])
+        assert saved["output"]["word_store"]["count"] == 1
+    assert "Привет" in (paths["out_dir"] / "subs.srt").read_text(encoding="utf-8")
+
+    # Пропавшее хранилище слов пересобирается постобработкой без повторной ASR
+    shutil.rmtree(paths["out_dir"] / "words")
+    run_pipeline(payload)
+    assert calls == {"asr": 1, "llm": 2}
+    assert word_store.open_store(paths["out_dir"]).words()[0]["text"] == "Привет"
+
+    # Ничего не изменилось — все стадии из контрольных точек
+    run_pipeline(payload)
+    assert calls == {"asr": 1, "llm": 2}
+
+    # Другая модель LLM — пересчитывается только сводка
+    monkeypatch.setattr(settings, "LLM_MODEL", "other-model")
+    run_pipeline(payload)
+    assert calls == {"asr": 1, "llm": 3}
+
+    # Удалённый выходной файл восстанавливается стадией export
+    (paths["out_dir"] / "minutes.md").unlink()
+    run_pipeline(payload)
+    assert (paths["out_dir"] / "minutes.md").exists()
+    assert calls == {"asr": 1, "llm": 3}
+
+
+def test_windows_are_summarized_while_asr_runs(monkeypatch):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    import numpy as np
+
+    from kits.kit_common.config import settings
+    from kits.kit_asr import whisperx_asr, windowed
+    from kits.kit_llm import openai_backend as llm
+    from kits.kit_common.paths import ensure_job_dirs
+    from kits.utils import audio_info
+    from kits.kit_pipeline.pipeline import run_pipeline
+
+    for name, value in {"ASR_CACHE": False, "ASR_WORKERS": 2, "ASR_WINDOW_SEC": 10,
+                        "ASR_WINDOW_SEARCH_SEC": 2, "DIARIZATION": "off", "LLM_CONCURRENCY": 2}.items():
+        monkeypatch.setattr(settings, name, value)
+
+    sr = 16000
+    t = np.arange(40 * sr) / sr
+    audio = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    audio[(t % 3.0) >= 1.0] = 0.0
+    events = []
+    lock = threading.Lock()
+
+    def fake_asr(chunk, language=None, device=None):
+        time.sleep(0.1)
+        with lock:
+            events.append("asr")
+        dur = len(chunk) / sr
+        return {"language": "ru", "segments": [{"start": 0.0, "end": dur, "text": "Сделаем отчёт",
+                                                "words": [{"start": 0.0, "end": dur, "text": "отчёт"}]}]}
+
+    def fake_map(client, chunk, index, total, usage, legend=""):
+        with lock:
+            events.append("map")
+        return {"tldr": f"Окно {index}", "action_items": [{"text": "Отчёт", "owner": "S1", "due": None}],
+                "decisions": [], "risks": []}
+
+    monkeypatch.setattr(windowed, "_load_audio", lambda p: audio)
+    monkeypatch.setattr(windowed, "get_pool", lambda workers: ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(whisperx_asr, "transcribe_and_align", fake_asr)
+    monkeypatch.setattr(llm, "_client", lambda: None)
+    monkeypatch.setattr(llm, "_map_chunk", fake_map)
+    monkeypatch.setattr(llm, "_reduce_group", lambda client, states, usage: {
+        "tldr": " ".join(s["tldr"] for s in states), "action_items": states[0]["action_items"],
+        "decisions": [], "risks": [],
+    })
+    monkeypatch.setattr(llm, "summarize_auto", lambda transcript: (_ for _ in ()).throw(AssertionError("not used")))
+    monkeypatch.setattr(
+        audio_info,
+        "probe_audio_info",
+        lambda p: {"duration_sec": 40.0, "sample_rate": sr, "channels": 1, "num_samples": 40 * sr},
+    )
+    paths = ensure_job_dirs("job-overlap")
+    (paths["work_dir"] / "normalized.wav").write_bytes(b"RIFF")
+
+    run_pipeline({"job_id": "job-overlap", "input_path": str(paths["in_dir"] / "input.wav"), "language": "ru"})
+
+    windows = events.count("asr")
+    assert windows > 1 and events.count("map") == windows
+    # Первое окно ушло в LLM раньше, чем распознано последнее
+    assert events.index("map") < len(events) - 1 - events[::-1].index("asr")
+    sm = json.loads((paths["out_dir"] / "summary.json").read_text(encoding="utf-8"))
+    assert sm["_strategy"] == "overlap_map_reduce"
+    assert sm["tldr"].startswith("Окно 0")
+    assert sm["action_items"][0]["owner"] == "Участник 1"
+
+
+def test_window_speakers_follow_whole_recording(monkeypatch):
+    from kits.kit_asr.whisperx_asr import pseudo_diarize
+    from kits.kit_llm import openai_backend as llm
+    from kits.kit_pipeline.overlap import WindowSummarizer
+
+    mapped = {}
+
+    def fake_map(segments, index, total, usage):
+        mapped[index] = [s["speaker"] for s in segments]
+        return {"states": [{"tldr": "", "action_items": [], "decisions": [], "risks": []}]}
+
+    monkeypatch.setattr(llm, "map_segments", fake_map)
+    monkeypatch.setattr(llm, "reduce_states", lambda states, usage: {"tldr": "", "action_items": [], "decisions": [], "risks": []})
+    # Граница окон приходится на середину чередования: после паузы в 3 с говорит другой участник
+    windows = [
+        [{"start": 0.0, "end": 2.0, "text": "а"}, {"start": 3.0, "end": 5.0, "text": "б"}],
+        [{"start": 8.0, "end": 9.0, "text": "в"}, {"start": 9.2, "end": 10.0, "text": "г"}],
+        [{"start": 10.1, "end": 11.0, "text": "д"}, {"start": 12.0, "end": 13.0, "text": "е"}],
+    ]
+    ws = WindowSummarizer()
+    try:
+        # Окна готовы не по порядку: разметка всё равно идёт по общей шкале
+        for i in (2, 0, 1):
+            ws.on_window(i, 3, {"segments": windows[i]})
+        assert ws.finish() is not None
+    finally:
+        ws.close()
+
+    whole = [s["speaker"] for s in pseudo_diarize([dict(s) for w in windows for s in w])]
+    assert [sp for i in range(3) for sp in mapped[i]] == whole
+    assert mapped[1][0] != pseudo_diarize([dict(s) for s in windows[1]])[0]["speaker"]
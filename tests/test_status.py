@@ -0,0 +1,158 @@
+import json
+
+from kits.kit_common import progress
+from kits.kit_pipeline import status as status_mod
+from kits.kit_pipeline.status import StatusWriter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _read(path):
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def test_status_writes_are_throttled(tmp_path, monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.DATA_DIR", str(tmp_path))
+    clock = Clock()
+    monkeypatch.setattr(status_mod.time, "monotonic", clock)
+    path = tmp_path / "status.json"
+    writes = []
+    real = status_mod.write_json_atomic
+    monkeypatch.setattr(status_mod, "write_json_atomic", lambda p, d: (writes.append(d), real(p, d)))
+
+    w = StatusWriter(path, "job-1", min_interval_sec=1.0)
+    w("asr", 0, 600, "audio_sec")  # смена стадии — пишем сразу
+    for i in range(1, 50):
+        clock.now += 0.01
+        w("asr", i, 600, "audio_sec")
+    assert len(writes) == 1
+
+    clock.now += 1.0
+    w("asr", 120, 600, "audio_sec")
+    assert len(writes) == 2
+    st = _read(path)
+    assert st["stage"] == "asr" and st["unit"] == "audio_sec"
+    assert 5 < st["progress"] < 70
+    # 120 с аудио за ~1.5 с -> оставшиеся 480 с аудио за ~6 с
+    assert 4 <= st["stage_eta_sec"] <= 8
+
+    clock.now += 0.1
+    w("asr", 600, 600, "audio_sec")  # завершение стадии — без троттлинга
+    assert len(writes) == 3 and _read(path)["progress"] == 70
+
+
+def test_eta_uses_history_before_first_measurement(tmp_path, monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.DATA_DIR", str(tmp_path))
+    clock = Clock()
+    monkeypatch.setattr(status_mod.time, "monotonic", clock)
+
+    first = StatusWriter(tmp_path / "a.json", "a", min_interval_sec=0)
+    first("asr", 0, 300, "audio_sec")
+    clock.now += 30
+    first("asr", 300, 300, "audio_sec")  # 10x realtime
+
+    second = StatusWriter(tmp_path / "b.json", "b", min_interval_sec=0)
+    second("asr", 0, 600, "audio_sec")
+    assert _read(tmp_path / "b.json")["stage_eta_sec"] == 60
+
+
+def test_pipeline_reports_stage_progress(tmp_path, monkeypatch):
+    from kits.kit_asr import whisperx_asr as asr
+    from kits.kit_llm import openai_backend as llm
+    from kits.kit_common.paths import ensure_job_dirs
+    from kits.utils import audio_info
+    from kits.kit_pipeline.pipeline import run_pipeline
+
+    monkeypatch.setattr("kits.kit_common.config.settings.ASR_CACHE", False)
+    monkeypatch.setattr(asr, "transcribe_with_whisperx", lambda wav, language=None: {
+        "language": "ru", "segments": [{"start": 0.0, "end": 1.0, "text": "Привет", "speaker": "Участник 1"}],
+    })
+
+    def fake_summary(transcript, prompt=None):
+        progress.report("summarize", 1, 1, "chunks")
+        return {"tldr": "Итог", "action_items": [], "decisions": [], "risks": []}
+
+    monkeypatch.setattr(llm, "summarize_transcript", fake_summary)
+    monkeypatch.setattr(
+        audio_info,
+        "probe_audio_info",
+        lambda p: {"duration_sec": 5.0, "sample_rate": 16000, "channels": 1, "num_samples": 80000},
+    )
+    paths = ensure_job_dirs("job-progress")
+    (paths["work_dir"] / "normalized.wav").write_bytes(b"RIFF")
+
+    events = []
+    run_pipeline(
+        {"job_id": "job-progress", "input_path": str(paths["in_dir"] / "input.wav"), "language": "ru"},
+        on_progress=lambda *e: events.append(e),
+    )
+    stages = [e[0] for e in events]
+    assert stages.index("normalize") < stages.index("asr") < stages.index("summarize") < stages.index("export")
+    assert ("asr", 5.0, 5.0, "audio_sec") in events
+    assert ("summarize", 1, 1, "chunks") in events
+
+
+def test_heartbeat_reports_progress_of_single_call_stage(tmp_path, monkeypatch):
+    import time
+
+    from kits.kit_common import counters
+
+    monkeypatch.setattr("kits.kit_common.config.settings.DATA_DIR", str(tmp_path))
+    path = tmp_path / "status.json"
+    w = StatusWriter(path, "job-hb", min_interval_sec=0)
+    seen = []
+    real = status_mod.write_json_atomic
+    monkeypatch.setattr(status_mod, "write_json_atomic", lambda p, d: (seen.append(d), real(p, d)))
+
+    # Прошлые задачи: 1000 с аудио в секунду — за 0.3 с «распознано» около 300 с
+    counters.incr_many({"progress_asr_audio_sec_milli": 300_000_000, "progress_asr_audio_sec_wall_ms": 300_000})
+    rate = status_mod.history_rate("asr", "audio_sec")
+    assert rate == 1000.0
+
+    with progress.reporting(w):
+        progress.report("asr", 0, 600, "audio_sec")
+        with progress.heartbeat("asr", 600, "audio_sec", rate=rate, interval=0.02):
+            time.sleep(0.3)
+    beats = [st for st in seen if st["stage_done"] > 0]
+    assert len(beats) >= 3
+    assert all(5 < st["progress"] < 70 for st in beats)
+    # Оценка не доходит до конца стадии и не завершает её
+    assert beats[-1]["stage_done"] <= 600 * 0.95 and beats[-1]["stage_eta_sec"] >= 0
+    assert [st["progress"] for st in beats] == sorted(st["progress"] for st in beats)
+    assert status_mod.history_rate("asr", "audio_sec") == rate  # оценки не записываются в историю
+
+
+def test_heartbeat_without_history_reports_elapsed_without_eta(tmp_path, monkeypatch):
+    import time
+
+    monkeypatch.setattr("kits.kit_common.config.settings.DATA_DIR", str(tmp_path))
+    path = tmp_path / "status.json"
+    w = StatusWriter(path, "job-first", min_interval_sec=0)
+    calls = []
+    with progress.reporting(lambda *a: (calls.append(a), w(*a))):
+        progress.report("asr", 0, 600, "audio_sec")
+        with progress.heartbeat("asr", 600, "audio_sec", rate=None, interval=0.02):
+            time.sleep(0.15)
+    assert len(calls) >= 3 and all(c[1] == 0 for c in calls)
+    st = _read(path)
+    assert st["stage"] == "asr" and "eta_sec" not in st and "stage_elapsed_sec" in st
+
+
+def test_final_state_is_not_overwritten_by_late_progress(tmp_path, monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.DATA_DIR", str(tmp_path))
+    path = tmp_path / "status.json"
+    w = StatusWriter(path, "job-2", min_interval_sec=0)
+    w.set_state("processing", progress=0)
+    assert _read(path) == {"job_id": "job-2", "status": "processing", "progress": 0}
+    w("asr", 10, 600, "audio_sec")
+    w.set_state("done", progress=100)
+    w("summarize", 1, 3, "chunks")  # поздний отчёт из потока LLM
+    w.set_state("error", error="late")
+    assert _read(path) == {"job_id": "job-2", "status": "done", "progress": 100}
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".part"] == []
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from kits.kit_common import timing
+
+
+def test_spans_aggregate_tokens_and_nesting():
+    with timing.recording() as rec:
+        with timing.span("summarize"):
+            for _ in range(3):
+                with timing.span("llm"):
+                    timing.add_tokens(100, 20)
+    spans = rec.to_dict()["spans"]
+    assert spans["summarize.llm"]["count"] == 3
+    assert spans["summarize.llm"]["tokens_prompt"] == 300
+    # Токены детей входят в родителя
+    assert spans["summarize"]["tokens_completion"] == 60
+    assert spans["summarize"]["wall_sec"] >= spans["summarize.llm"]["wall_sec"]
+
+
+def test_bind_carries_span_into_thread_pool():
+    def work(i):
+        with timing.span("llm"):
+            timing.add_tokens(10, 1)
+        return i
+
+    with timing.recording() as rec:
+        with timing.span("summarize"):
+            with ThreadPoolExecutor(max_workers=3) as ex:
+                assert list(ex.map(timing.bind(work), range(6))) == list(range(6))
+            # Без bind поток не видит спан задачи
+            with ThreadPoolExecutor(max_workers=1) as ex:
+                ex.submit(work, 0).result()
+    spans = rec.to_dict()["spans"]
+    assert spans["summarize.llm"]["count"] == 6
+    assert spans["summarize"]["tokens_prompt"] == 60
+    assert "llm" not in spans
+
+
+def test_histograms_are_cumulative(tmp_path, monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.DATA_DIR", str(tmp_path))
+    for sec in (0.05, 0.7, 3.0, 4000.0):
+        timing.observe("stage_asr", sec)
+    h = timing.histograms()["stage_asr"]
+    assert h["count"] == 4
+    assert h["buckets"]["0.1"] == 1
+    assert h["buckets"]["1"] == 2
+    assert h["buckets"]["5"] == 3
+    assert h["buckets"]["1800"] == 3 and h["buckets"]["+Inf"] == 4
+
+
+@pytest.mark.skipif(timing.rss_mb() is None, reason="нужен /proc/self/statm")
+def test_rss_peak_is_per_span():
+    import time
+
+    import numpy as np
+
+    with timing.recording() as rec:
+        with timing.span("alloc"):
+            buf = np.ones(64 * 1024 * 1024 // 8)  # 64 МБ, освобождаются до конца спана
+            time.sleep(timing.RSS_SAMPLE_SEC * 3)
+            del buf
+        with timing.span("idle"):
+            time.sleep(timing.RSS_SAMPLE_SEC * 2)
+    spans = rec.to_dict()["spans"]
+    # Пик внутри спана пойман опросом, хотя к концу спана память уже отдана
+    assert spans["alloc"]["rss_growth_mb"] >= 48
+    assert spans["idle"]["rss_growth_mb"] < 16
+    assert spans["alloc"]["rss_peak_mb"] > spans["idle"]["rss_peak_mb"] + 32
@@ -0,0 +1,51 @@
+from kits.kit_llm import token_utils
+from kits.kit_llm.chunking import chunk_by_token_budget
+
+
+class FakeEncoding:
+    """One token per word; records batch sizes"""
+
+    def __init__(self):
+        self.batches = []
+
+    def encode_ordinary_batch(self, texts):
+        self.batches.append(list(texts))
+        return [t.split() for t in texts]
+
+
+def _fake(monkeypatch):
+    enc = FakeEncoding()
+    monkeypatch.setattr(token_utils, "_ENC", enc)
+    monkeypatch.setattr(token_utils, "_MEMO", type(token_utils._MEMO)())
+    return enc
+
+
+def test_batch_counts_unique_strings_once(monkeypatch):
+    enc = _fake(monkeypatch)
+    lines = ["A: да", "B: один два три", "A: да", "C: раз два"]
+    assert token_utils.count_tokens_batch(lines) == [2, 4, 2, 3]
+    assert enc.batches == [["A: да", "B: один два три", "C: раз два"]]
+
+    # Memoized: only the new string is encoded
+    assert token_utils.count_tokens_batch(["A: да", "D: новое"]) == [2, 2]
+    assert enc.batches[-1] == ["D: новое"]
+    assert token_utils.count_tokens_text("A: да") == 2
+    assert len(enc.batches) == 2
+
+
+def test_chunking_uses_one_batch(monkeypatch):
+    enc = _fake(monkeypatch)
+    lines = [f"S{i % 3}: слово слово" for i in range(10)]
+    chunks = chunk_by_token_budget(lines, 8)  # 3 tokens + newline per line
+    assert [c.count("\n") + 1 for c in chunks] == [2, 2, 2, 2, 2]
+    assert len(enc.batches) == 1 and len(enc.batches[0]) == 3
+
+
+def test_json_state_counted_incrementally(monkeypatch):
+    enc = _fake(monkeypatch)
+    state = {"tldr": "итог встречи", "action_items": [{"text": "a b"}], "decisions": ["x y", "z"], "risks": []}
+    first = token_utils.count_tokens_json(state)
+    assert first > 0
+    state["decisions"].append("новое решение")
+    assert token_utils.count_tokens_json(state) > first
+    assert enc.batches[-1] == ['"новое решение"']
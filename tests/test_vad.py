@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from kits.kit_asr import silence
+
+SR = 16000
+
+
+def _tone(sec):
+    t = np.arange(int(sec * SR)) / SR
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def test_long_silence_is_cut_and_times_map_back():
+    # 2 s speech, 10 s silence, 2 s speech, 1 s silence (kept: shorter than threshold), 2 s speech
+    audio = np.concatenate([_tone(2), np.zeros(10 * SR, np.float32), _tone(2),
+                            np.zeros(1 * SR, np.float32), _tone(2)])
+    intervals = silence.speech_intervals(audio, SR, min_silence_sec=2.0, pad_sec=0.3)
+    assert len(intervals) == 2
+
+    compact = silence.compact_audio(audio, intervals)
+    skipped = (len(audio) - len(compact)) / SR
+    assert skipped == pytest.approx(10 - 0.6, abs=0.05)
+
+    tm = silence.build_time_map(intervals, SR)
+    # Second burst starts at 12 s on the original timeline
+    second_compact = 2 + 0.3 + 0.3
+    seg = {"start": second_compact, "end": second_compact + 2.0,
+           "words": [{"start": second_compact, "end": second_compact + 0.5, "word": "да"}]}
+    (mapped,) = silence.remap_segments([seg], tm)
+    assert mapped["start"] == pytest.approx(12.0, abs=0.04)
+    assert mapped["end"] == pytest.approx(14.0, abs=0.04)
+    assert mapped["words"][0]["end"] == pytest.approx(12.5, abs=0.04)
+
+
+def test_no_cut_when_no_long_silence():
+    audio = np.concatenate([_tone(1), np.zeros(SR // 2, np.float32), _tone(1)])
+    assert silence.speech_intervals(audio, SR, min_silence_sec=2.0) == [(0, len(audio))]
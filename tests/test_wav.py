@@ -0,0 +1,89 @@
+import wave
+
+import numpy as np
+
+from kits.utils.wav import read_wav_header, is_normalized_wav, open_pcm, pcm_to_float32
+
+
+def _write_wav(path, samples, sr=16000, channels=1):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(samples.astype("<i2").tobytes())
+
+
+def test_header_and_memmap(tmp_path):
+    samples = (np.arange(32000) % 2000 - 1000).astype(np.int16)
+    p = tmp_path / "normalized.wav"
+    _write_wav(p, samples)
+
+    h = read_wav_header(p)
+    assert h["sample_rate"] == 16000 and h["channels"] == 1 and h["bits_per_sample"] == 16
+    assert h["num_samples"] == 32000
+    assert is_normalized_wav(h)
+
+    pcm = open_pcm(p)
+    assert isinstance(pcm, np.memmap)
+    full = pcm_to_float32(pcm)
+    assert full.dtype == np.float32
+    np.testing.assert_allclose(full, samples.astype(np.float32) / 32768.0)
+    np.testing.assert_allclose(pcm_to_float32(pcm, 100, 200), full[100:200])
+
+
+def test_foreign_formats_are_not_mapped(tmp_path):
+    stereo = tmp_path / "stereo.wav"
+    _write_wav(stereo, np.zeros(200, dtype=np.int16), channels=2)
+    assert read_wav_header(stereo)["channels"] == 2
+    assert open_pcm(stereo) is None
+
+    mp3 = tmp_path / "input.mp3"
+    mp3.write_bytes(b"ID3\x03\x00" + b"\x00" * 100)
+    assert read_wav_header(mp3) is None
+    assert open_pcm(mp3) is None
+
+
+def test_probe_audio_info_reads_header_without_ffprobe(tmp_path, monkeypatch):
+    from kits.utils import audio_info
+
+    def no_ffprobe(path):
+        raise AssertionError("ffprobe must not be called for WAV")
+
+    monkeypatch.setattr(audio_info, "ffprobe_info", no_ffprobe)
+    p = tmp_path / "normalized.wav"
+    _write_wav(p, np.zeros(24000, dtype=np.int16))
+    info = audio_info.probe_audio_info(p)
+    assert info["duration_sec"] == 1.5
+    assert info["sample_rate"] == 16000 and info["channels"] == 1 and info["num_samples"] == 24000
+
+
+def test_sniff_audio_containers(tmp_path):
+    from kits.utils.audio_info import sniff_audio
+
+    wav = tmp_path / "a.wav"
+    _write_wav(wav, np.zeros(16000 * 3, dtype=np.int16))
+    s = sniff_audio(wav)
+    assert s["container"] == "wav" and s["duration_estimate_sec"] == 3.0
+
+    # CBR MPEG1 Layer III, 128 kbps, 44.1 kHz: 16000 bytes of frames ~ 1 s
+    mp3 = tmp_path / "a.mp3"
+    frame = b"\xff\xfb\x90\x00" + b"\x00" * 413
+    mp3.write_bytes(frame * (16000 // len(frame)))
+    s = sniff_audio(mp3)
+    assert s["container"] == "mp3"
+    assert abs(s["duration_estimate_sec"] - 1.0) < 0.05
+
+    # MP3 без ID3 и без синхрослова в начале файла: не распознан, но и не отклонён
+    junky = tmp_path / "b.mp3"
+    junky.write_bytes(b"\x00\x13\x8a\xc4\xff\x02" * 50 + frame * 20)
+    s = sniff_audio(junky)
+    assert s["container"] == "unknown" and s["not_audio"] is None and s["duration_estimate_sec"] is None
+
+    junk = tmp_path / "a.ogg"
+    junk.write_bytes(b"not audio at all")
+    s = sniff_audio(junk)
+    assert s["container"] is None and s["not_audio"] == "text"
+
+    pdf = tmp_path / "a.mp3"
+    pdf.write_bytes(b"%PDF-1.7\n" + bytes(range(256)))
+    assert sniff_audio(pdf)["not_audio"] == "pdf"
@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from kits.kit_asr import silence, whisperx_asr, windowed
+
+SR = 16000
+
+
+def _fixture_audio(total_sec=60, period_sec=3.0, burst_sec=1.0):
+    t = np.arange(int(total_sec * SR)) / SR
+    audio = 0.3 * np.sin(2 * np.pi * 220 * t).astype(np.float32)
+    audio[(t % period_sec) >= burst_sec] = 0.0
+    return audio.astype(np.float32)
+
+
+def _fake_transcribe(audio, language=None, device=None):
+    # One "word" per voiced region, with times on the array's own timeline
+    db = silence.frame_rms_db(audio, SR)
+    voiced = db > -30
+    hop = int(SR * silence.FRAME_SEC)
+    segments = []
+    k = 0
+    while k < len(voiced):
+        if voiced[k]:
+            j = k
+            while j < len(voiced) and voiced[j]:
+                j += 1
+            start, end = k * hop / SR, j * hop / SR
+            segments.append({"start": start, "end": end, "text": "beep",
+                             "words": [{"start": start, "end": end, "word": "beep"}]})
+            k = j
+        else:
+            k += 1
+    return {"segments": segments, "language": "ru"}
+
+
+def test_plan_windows_cuts_in_silence():
+    audio = _fixture_audio()
+    windows = silence.plan_windows(audio, SR, window_sec=10, search_sec=2)
+    assert len(windows) > 1
+    assert windows[0][0] == 0 and windows[-1][1] == len(audio)
+    for (_, end), (start, _) in zip(windows, windows[1:]):
+        assert end == start
+        assert not np.any(audio[start - 160:start + 160])
+
+
+def test_windowed_matches_single_pass(monkeypatch):
+    audio = _fixture_audio()
+    monkeypatch.setattr(windowed, "_load_audio", lambda p: audio)
+    monkeypatch.setattr(whisperx_asr, "transcribe_and_align", _fake_transcribe)
+    monkeypatch.setattr("kits.kit_common.config.settings.ASR_WINDOW_SEC", 10)
+    monkeypatch.setattr("kits.kit_common.config.settings.ASR_WINDOW_SEARCH_SEC", 2)
+
+    single = _fake_transcribe(audio)
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        res = windowed.transcribe_windowed("normalized.wav", language="auto", workers=3, executor=ex)
+
+    assert res["language"] == "ru"
+    assert len(res["segments"]) == len(single["segments"])
+    for a, b in zip(res["segments"], single["segments"]):
+        assert a["start"] == pytest.approx(b["start"], abs=1e-6)
+        assert a["end"] == pytest.approx(b["end"], abs=1e-6)
+        assert a["words"][0]["start"] == pytest.approx(b["words"][0]["start"], abs=1e-6)
+
+
+def test_windowed_reads_windows_from_memmap(tmp_path, monkeypatch):
+    import wave
+
+    audio = _fixture_audio(total_sec=30)
+    pcm = (audio * 32767).astype("<i2")
+    wav_path = tmp_path / "normalized.wav"
+    with wave.open(str(wav_path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SR)
+        w.writeframes(pcm.tobytes())
+
+    seen = []
+
+    def fake(audio_win, language=None, device=None):
+        seen.append(audio_win.dtype)
+        return _fake_transcribe(audio_win, language)
+
+    monkeypatch.setattr(whisperx_asr, "transcribe_and_align", fake)
+    monkeypatch.setattr("kits.kit_common.config.settings.ASR_WINDOW_SEC", 10)
+    monkeypatch.setattr("kits.kit_common.config.settings.ASR_WINDOW_SEARCH_SEC", 2)
+
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        res = windowed.transcribe_windowed(wav_path, language="ru", workers=2, executor=ex)
+
+    assert len(seen) > 1 and all(dt == np.float32 for dt in seen)
+    assert len(res["segments"]) == len(_fake_transcribe(audio)["segments"])
+
+
+def test_diarization_runs_alongside_windows_and_records_failure(monkeypatch):
+    import threading
+
+    audio = _fixture_audio(total_sec=30)
+    started = threading.Event()
+
+    def failing_diarize(a, device):
+        started.set()
+        raise RuntimeError("pyannote unavailable")
+
+    def fake(audio_win, language=None, device=None):
+        # windows are transcribed while diarization is already running
+        assert started.wait(5)
+        return _fake_transcribe(audio_win, language)
+
+    monkeypatch.setattr(windowed, "_load_audio", lambda p: audio)
+    monkeypatch.setattr(whisperx_asr, "transcribe_and_align", fake)
+    monkeypatch.setattr(whisperx_asr, "_diarize", failing_diarize)
+    monkeypatch.setattr(whisperx_asr, "_device", lambda: "cpu")
+    monkeypatch.setattr("kits.kit_common.config.settings.HF_TOKEN", "hf_test")
+    monkeypatch.setattr("kits.kit_common.config.settings.DIARIZATION", "on")
+    monkeypatch.setattr("kits.kit_common.config.settings.ASR_WINDOW_SEC", 10)
+    monkeypatch.setattr("kits.kit_common.config.settings.ASR_WINDOW_SEARCH_SEC", 2)
+
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        res = windowed.transcribe_windowed("normalized.wav", language="ru", workers=2, executor=ex)
+
+    assert res["diarization"]["status"] == "failed"
+    assert "pyannote" in res["diarization"]["error"]
+    assert res["segments"]
@@ -0,0 +1,87 @@
+import json
+import random
+
+import numpy as np
+
+from kits.kit_export import word_store
+
+
+def _segments():
+    return [
+        {"start": 0.0, "end": 1.0, "speaker": "Участник 1", "text": "Привет всем", "words": [
+            {"start": 0.0, "end": 0.4, "text": "Привет", "speaker": "Участник 1", "score": 0.91},
+            {"start": 0.45, "end": 1.0, "word": "всем", "speaker": "Участник 1"},
+        ]},
+        {"start": 1.2, "end": 1.5, "speaker": "Участник 2", "text": "Ок", "words": []},
+        {"start": 2.0, "end": 3.0, "speaker": "Участник 2", "text": "Начнём", "words": [
+            {"start": 2.0, "end": 3.0, "text": "Начнём"},
+        ]},
+    ]
+
+
+def test_roundtrip_and_offsets(tmp_path):
+    meta = word_store.write(tmp_path, _segments())
+    assert meta["count"] == 3
+    store = word_store.open_store(tmp_path)
+    assert store.column("start").dtype == np.float32
+    assert isinstance(store.column("start"), np.memmap)
+
+    words = store.words()
+    assert words[0] == {"start": 0.0, "end": 0.4, "text": "Привет", "speaker": "Участник 1", "score": 0.91}
+    # "word" из WhisperX читается как "text", отсутствующие оценка и спикер не выдумываются
+    assert words[1] == {"start": 0.45, "end": 1.0, "text": "всем", "speaker": "Участник 1"}
+    assert words[2] == {"start": 2.0, "end": 3.0, "text": "Начнём"}
+
+    assert store.segment_words(1) == []
+    assert [w["text"] for w in store.segment_words(2)] == ["Начнём"]
+    assert [w["text"] for w in store.range(0.3, 2.0)] == ["всем"]
+    # Строки хранятся один раз
+    assert json.loads((tmp_path / "words" / "strings.json").read_text(encoding="utf-8")).count("Участник 1") == 1
+
+
+def test_save_and_load_transcript(tmp_path):
+    transcript = {"job_id": "j", "segments": _segments()}
+    compact = word_store.save_transcript(tmp_path, transcript, source="fp1")
+    assert all("words" not in seg for seg in compact["segments"])
+    assert compact["word_store"]["count"] == 3
+
+    full = word_store.load_transcript(tmp_path, json.loads(json.dumps(compact)))
+    assert "word_store" not in full
+    assert [len(seg["words"]) for seg in full["segments"]] == [2, 0, 1]
+    assert word_store.load_transcript(tmp_path, compact, with_words=False) is compact
+
+    # Тот же транскрипт — колонки не переписываются
+    mtime = (tmp_path / "words" / "start.npy").stat().st_mtime_ns
+    word_store.save_transcript(tmp_path, transcript, source="fp1")
+    assert (tmp_path / "words" / "start.npy").stat().st_mtime_ns == mtime
+
+
+def test_empty_store(tmp_path):
+    word_store.write(tmp_path, [{"start": 0.0, "end": 1.0, "text": "..."}])
+    store = word_store.open_store(tmp_path)
+    assert len(store) == 0 and store.words() == [] and store.range(0, 10) == []
+
+
+def test_range_with_untimed_words(tmp_path):
+    rnd = random.Random(0)
+    words, t = [], 0.0
+    for i in range(400):
+        timed = rnd.random() > 0.15
+        words.append({"word": f"w{i}", "start": round(t, 3) if timed else None, "end": round(t + 0.3, 3) if timed else None})
+        t += rnd.uniform(0.1, 0.5)
+    # Первое слово без таймкода — как число в начале сегмента
+    words[0]["start"] = words[0]["end"] = None
+    segments = [{"start": 0.0, "end": t, "text": "", "words": words[i:i + 40]} for i in range(0, 400, 40)]
+    word_store.write(tmp_path, segments)
+    store = word_store.open_store(tmp_path)
+
+    first = next(w["start"] for w in words if w["start"] is not None)
+    expected_key, last = [], first
+    for w in words:
+        last = w["start"] if w["start"] is not None else last
+        expected_key.append(last)
+    for _ in range(200):
+        t0 = rnd.uniform(-1.0, t)
+        t1 = t0 + rnd.uniform(0.0, 20.0)
+        expected = [w["word"] for w, k in zip(words, expected_key) if t0 <= np.float32(k) < t1]
+        assert [w["text"] for w in store.range(t0, t1)] == expected
@@ -0,0 +1,76 @@
+import sys
+from types import ModuleType, SimpleNamespace
+
+import pytest
+
+from kits.kit_asr import model_cache
+from kits.kit_asr import whisperx_asr
+
+
+@pytest.fixture()
+def fake_whisperx(monkeypatch):
+    loads = []
+    wx = ModuleType("whisperx")
+    wx.load_model = lambda name, device, compute_type=None, language=None: loads.append(("asr", name, language)) or "asr"
+    wx.load_align_model = lambda language_code, device: loads.append(("align", language_code)) or ("align", {})
+    wx.diarize = SimpleNamespace(
+        DiarizationPipeline=lambda use_auth_token=None, device=None: loads.append(("diarize",)) or "diarize"
+    )
+    monkeypatch.setitem(sys.modules, "whisperx", wx)
+    monkeypatch.setattr(model_cache, "_cache", None)
+    monkeypatch.setattr(whisperx_asr, "_device", lambda: "cpu")
+    return loads
+
+
+def test_warm_up_loads_each_model_once(fake_whisperx, monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.ASR_LANGUAGE", "ru")
+    monkeypatch.setattr("kits.kit_common.config.settings.ASR_WARM_LANGUAGES", "ru,en")
+    monkeypatch.setattr("kits.kit_common.config.settings.DIARIZATION", "on")
+    monkeypatch.setattr("kits.kit_common.config.settings.HF_TOKEN", "token")
+
+    stats = whisperx_asr.warm_up_models()
+    assert sorted(x[0] for x in fake_whisperx) == ["align", "align", "asr", "diarize"]
+    assert stats["size"] == 4 and stats["misses"] == 4
+
+    # Повторный прогрев и задачи берут модели из кэша процесса
+    whisperx_asr.warm_up_models()
+    model_cache.get_asr_model("cpu", "ru")
+    assert len(fake_whisperx) == 4
+    assert model_cache.cache_stats()["hits"] >= 5
+
+
+def test_warm_up_skips_diarization_when_disabled(fake_whisperx, monkeypatch):
+    monkeypatch.setattr("kits.kit_common.config.settings.ASR_WARM_LANGUAGES", "ru")
+    monkeypatch.setattr("kits.kit_common.config.settings.DIARIZATION", "off")
+    whisperx_asr.warm_up_models()
+    assert ("diarize",) not in fake_whisperx
+
+
+@pytest.mark.parametrize("mode, expected, warmed", [("preload", "SimpleWorker", True), ("fork", "Worker", False)])
+def test_worker_mode_selects_worker_class(monkeypatch, mode, expected, warmed):
+    import run_worker
+
+    created, warm_calls = [], []
+
+    def fake_worker(name):
+        class FakeWorker:
+            def __init__(self, queues, connection=None):
+                created.append((name, queues))
+
+            def work(self, with_scheduler=False):
+                pass
+
+        FakeWorker.__name__ = name
+        return FakeWorker
+
+    monkeypatch.setattr("kits.kit_common.config.settings.WORKER_MODE", mode)
+    monkeypatch.setattr(run_worker, "Redis", SimpleNamespace(from_url=lambda url: object()))
+    monkeypatch.setattr(run_worker, "Worker", fake_worker("Worker"))
+    monkeypatch.setattr(run_worker, "SimpleWorker", fake_worker("SimpleWorker"))
+    monkeypatch.setattr(run_worker.os, "name", "posix")
+    monkeypatch.setattr(run_worker.platform, "system", lambda: "Linux")
+    monkeypatch.setattr(whisperx_asr, "warm_up_models", lambda: warm_calls.append(1) or {"keys": []})
+
+    run_worker.main()
+    assert created == [(expected, ["meeting_summarizer"])]
+    assert bool(warm_calls) is warmed